@@ -0,0 +1,25 @@
+"""Add last_accessed_at to video_qualities for LRU rendition eviction
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('video_qualities', sa.Column('last_accessed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True))
+    op.create_index('ix_video_qualities_last_accessed_at', 'video_qualities', ['last_accessed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_video_qualities_last_accessed_at', table_name='video_qualities')
+    op.drop_column('video_qualities', 'last_accessed_at')
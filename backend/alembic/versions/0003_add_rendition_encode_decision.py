@@ -0,0 +1,26 @@
+"""Record the rendition planning decision on video_qualities
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('video_qualities', sa.Column('encode_mode', sa.String(length=20), nullable=True))
+    op.add_column('video_qualities', sa.Column('encode_decision', postgresql.JSON(astext_type=sa.Text()), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('video_qualities', 'encode_decision')
+    op.drop_column('video_qualities', 'encode_mode')
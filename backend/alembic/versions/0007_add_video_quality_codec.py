@@ -0,0 +1,23 @@
+"""Add codec to video_qualities for alternative-codec ladders
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('video_qualities', sa.Column('codec', sa.String(length=20), server_default='h264', nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('video_qualities', 'codec')
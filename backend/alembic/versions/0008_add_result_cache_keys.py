@@ -0,0 +1,33 @@
+"""Add content hash and result cache keys
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('videos', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index('ix_videos_content_hash', 'videos', ['content_hash'])
+    op.add_column('jobs', sa.Column('cache_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_jobs_cache_key', 'jobs', ['cache_key'])
+    op.add_column('processed_videos', sa.Column('cache_key', sa.String(length=64), nullable=True))
+    op.create_index('ix_processed_videos_cache_key', 'processed_videos', ['cache_key'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_processed_videos_cache_key', table_name='processed_videos')
+    op.drop_column('processed_videos', 'cache_key')
+    op.drop_index('ix_jobs_cache_key', table_name='jobs')
+    op.drop_column('jobs', 'cache_key')
+    op.drop_index('ix_videos_content_hash', table_name='videos')
+    op.drop_column('videos', 'content_hash')
@@ -0,0 +1,25 @@
+"""Add the node holding each video's file
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('videos', sa.Column('storage_node', sa.String(length=255), nullable=True))
+    op.create_index('ix_videos_storage_node', 'videos', ['storage_node'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_videos_storage_node', table_name='videos')
+    op.drop_column('videos', 'storage_node')
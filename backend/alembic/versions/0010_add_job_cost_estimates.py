@@ -0,0 +1,33 @@
+"""Add job cost estimates and recorded timings
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('lane', sa.String(length=32), nullable=True))
+    op.add_column('jobs', sa.Column('cost_units', sa.Float(), nullable=True))
+    op.add_column('jobs', sa.Column('estimated_seconds', sa.Float(), nullable=True))
+    op.add_column('jobs', sa.Column('run_seconds', sa.Float(), nullable=True))
+    op.add_column('jobs', sa.Column('cpu_seconds', sa.Float(), nullable=True))
+    op.create_index('ix_jobs_lane', 'jobs', ['lane'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_lane', table_name='jobs')
+    op.drop_column('jobs', 'cpu_seconds')
+    op.drop_column('jobs', 'run_seconds')
+    op.drop_column('jobs', 'estimated_seconds')
+    op.drop_column('jobs', 'cost_units')
+    op.drop_column('jobs', 'lane')
@@ -0,0 +1,41 @@
+"""Add job tenants and dispatch state for fair-share scheduling
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('tenant', sa.String(length=64), nullable=True))
+    op.add_column('jobs', sa.Column('task_id', sa.String(length=255), nullable=True))
+    op.add_column('jobs', sa.Column('dispatched_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_jobs_tenant', 'jobs', ['tenant'])
+    op.create_index('ix_jobs_dispatched_at', 'jobs', ['dispatched_at'])
+    # Existing jobs were sent straight to Celery
+    op.execute("UPDATE jobs SET dispatched_at = created_at")
+
+    op.create_table(
+        'tenant_shares',
+        sa.Column('tenant', sa.String(length=64), primary_key=True),
+        sa.Column('deficit', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('last_served_at', sa.DateTime(timezone=True), nullable=True)
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tenant_shares')
+    op.drop_index('ix_jobs_dispatched_at', table_name='jobs')
+    op.drop_index('ix_jobs_tenant', table_name='jobs')
+    op.drop_column('jobs', 'dispatched_at')
+    op.drop_column('jobs', 'task_id')
+    op.drop_column('jobs', 'tenant')
@@ -0,0 +1,31 @@
+"""Add job leases for reclaiming jobs of lost workers
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0013'
+down_revision = '0012'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('jobs', sa.Column('lease_token', sa.String(length=32), nullable=True))
+    op.add_column('jobs', sa.Column('lease_owner', sa.String(length=255), nullable=True))
+    op.add_column('jobs', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('jobs', sa.Column('lease_reclaims', sa.Integer(), nullable=True, server_default='0'))
+    op.create_index('ix_jobs_lease_expires_at', 'jobs', ['lease_expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_lease_expires_at', table_name='jobs')
+    op.drop_column('jobs', 'lease_reclaims')
+    op.drop_column('jobs', 'lease_expires_at')
+    op.drop_column('jobs', 'lease_owner')
+    op.drop_column('jobs', 'lease_token')
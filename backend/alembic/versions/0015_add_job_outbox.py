@@ -0,0 +1,36 @@
+"""Add the outbox of submitted jobs awaiting their Celery task
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0015'
+down_revision = '0014'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'outbox',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('job_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('jobs.id'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('sent_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True)
+    )
+    op.create_index('ix_outbox_job_id', 'outbox', ['job_id'])
+    op.create_index('ix_outbox_sent_at', 'outbox', ['sent_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_outbox_sent_at', table_name='outbox')
+    op.drop_index('ix_outbox_job_id', table_name='outbox')
+    op.drop_table('outbox')
@@ -0,0 +1,36 @@
+"""Add job batches for bulk submissions
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0016'
+down_revision = '0015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'job_batches',
+        sa.Column('id', postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column('job_type', sa.String(length=50), nullable=False),
+        sa.Column('operation', sa.JSON(), nullable=False),
+        sa.Column('total_jobs', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('skipped', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True)
+    )
+    op.add_column('jobs', sa.Column('batch_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('job_batches.id'), nullable=True))
+    op.create_index('ix_jobs_batch_id', 'jobs', ['batch_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_jobs_batch_id', table_name='jobs')
+    op.drop_column('jobs', 'batch_id')
+    op.drop_table('job_batches')
@@ -0,0 +1,39 @@
+"""Add webhook deliveries for job completion callbacks
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-20 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '0017'
+down_revision = '0016'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'webhook_deliveries',
+        sa.Column('id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('job_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('jobs.id'), nullable=False),
+        sa.Column('url', sa.String(length=2048), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False, server_default='waiting'),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('delivered_at', sa.DateTime(timezone=True), nullable=True)
+    )
+    op.create_index('ix_webhook_deliveries_job_id', 'webhook_deliveries', ['job_id'])
+    op.create_index('ix_webhook_deliveries_status', 'webhook_deliveries', ['status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_webhook_deliveries_status', table_name='webhook_deliveries')
+    op.drop_index('ix_webhook_deliveries_job_id', table_name='webhook_deliveries')
+    op.drop_table('webhook_deliveries')
@@ -0,0 +1,33 @@
+"""Allow one pending or running job per cache key
+
+Revision ID: 0018
+Revises: 0017
+Create Date: 2026-10-20 01:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '0018'
+down_revision = '0017'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Jobs that raced past the old per-process lock keep running, just no longer keyed
+    op.execute("""
+        UPDATE jobs SET cache_key = NULL
+        WHERE status IN ('pending', 'processing') AND cache_key IS NOT NULL AND id NOT IN (
+            SELECT DISTINCT ON (cache_key) id FROM jobs
+            WHERE status IN ('pending', 'processing') AND cache_key IS NOT NULL
+            ORDER BY cache_key, created_at
+        )
+    """)
+    op.create_index('uq_jobs_inflight_cache_key', 'jobs', ['cache_key'], unique=True,
+                    postgresql_where=sa.text("status IN ('pending', 'processing')"))
+
+
+def downgrade() -> None:
+    op.drop_index('uq_jobs_inflight_cache_key', table_name='jobs')
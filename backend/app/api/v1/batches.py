@@ -0,0 +1,78 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+import uuid
+from app.config.database import get_db
+from app.models.batch import JobBatch
+from app.models.job import Job
+from app.schemas.batch import BatchCreate, BatchResponse
+from app.schemas.job import JobResponse
+from app.services.batch_service import BatchService
+
+router = APIRouter()
+
+
+def _batch_response(service: BatchService, batch: JobBatch) -> BatchResponse:
+    return BatchResponse(
+        id=batch.id,
+        job_type=batch.job_type,
+        total_jobs=batch.total_jobs,
+        skipped=batch.skipped,
+        created_at=batch.created_at,
+        **service.progress(batch)
+    )
+
+
+@router.post("/", response_model=BatchResponse)
+async def create_batch(
+    request: BatchCreate,
+    db: Session = Depends(get_db)
+):
+    """Apply one operation to a list of videos, or to every video matching a filter"""
+    try:
+        service = BatchService(db)
+        batch = service.submit(request.operation, request.video_ids, request.filter)
+        db.refresh(batch)
+        return _batch_response(service, batch)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{batch_id}", response_model=BatchResponse)
+async def get_batch(
+    batch_id: uuid.UUID,
+    db: Session = Depends(get_db)
+):
+    """Aggregate progress of a batch's jobs"""
+    try:
+        batch = db.query(JobBatch).filter(JobBatch.id == batch_id).first()
+        if not batch:
+            raise HTTPException(status_code=404, detail="Batch not found")
+
+        return _batch_response(BatchService(db), batch)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{batch_id}/jobs", response_model=List[JobResponse])
+async def list_batch_jobs(
+    batch_id: uuid.UUID,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    status: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """List the jobs of a batch, optionally by status"""
+    try:
+        query = db.query(Job).filter(Job.batch_id == batch_id)
+        if status:
+            query = query.filter(Job.status == status)
+
+        jobs = query.order_by(Job.created_at, Job.id).offset(skip).limit(limit).all()
+        return [JobResponse.from_orm(job) for job in jobs]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
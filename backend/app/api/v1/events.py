@@ -0,0 +1,105 @@
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+import asyncio
+import json
+import uuid
+from app.config.settings import settings
+from app.services.job_events import hub, is_final, last_event
+
+router = APIRouter()
+
+
+def _topic(job_id: Optional[uuid.UUID], batch_id: Optional[uuid.UUID], tenant: Optional[str]) -> Tuple[str, str]:
+    given = [(kind, str(key)) for kind, key in (("job", job_id), ("batch", batch_id), ("tenant", tenant)) if key]
+    if len(given) != 1:
+        raise HTTPException(status_code=400, detail="Give exactly one of job_id, batch_id or tenant")
+    return given[0]
+
+
+async def _events(kind: str, key: str) -> AsyncIterator[Optional[Dict[str, Any]]]:
+    """Events of one job, batch or tenant as they arrive, and None when it is time for a keepalive.
+
+    A job's stream starts with the job's last known state and ends once
+    the job has finished.
+    """
+    with hub.subscribe(kind, key) as queue:
+        if kind == "job":
+            # Read after subscribing, so nothing published in between is missed
+            last = await run_in_threadpool(last_event, key)
+            if last:
+                yield last
+                if is_final(last):
+                    return
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=settings.job_events_keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            yield event
+            if kind == "job" and is_final(event):
+                return
+
+
+@router.get("/")
+async def stream_events(
+    job_id: Optional[uuid.UUID] = Query(None),
+    batch_id: Optional[uuid.UUID] = Query(None),
+    tenant: Optional[str] = Query(None)
+):
+    """Server-Sent Events with the state changes of one job, a batch or all of a tenant's jobs"""
+    kind, key = _topic(job_id, batch_id, tenant)
+
+    async def stream():
+        async for event in _events(kind, key):
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: job\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they are written
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def websocket_events(
+    websocket: WebSocket,
+    job_id: Optional[uuid.UUID] = Query(None),
+    batch_id: Optional[uuid.UUID] = Query(None),
+    tenant: Optional[str] = Query(None)
+):
+    """The events of ``stream_events`` as JSON messages over a WebSocket"""
+    try:
+        kind, key = _topic(job_id, batch_id, tenant)
+    except HTTPException as e:
+        await websocket.close(code=1008, reason=e.detail)
+        return
+    await websocket.accept()
+
+    async def forward():
+        async for event in _events(kind, key):
+            if event is not None:
+                await websocket.send_json(event)
+
+    async def until_disconnect():
+        # Clients only listen; reading notices a closed connection between events
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender = asyncio.create_task(forward())
+    receiver = asyncio.create_task(until_disconnect())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if sender in done:
+        try:
+            sender.result()
+            await websocket.close()
+        except WebSocketDisconnect:
+            pass
@@ -1,15 +1,32 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from typing import List, Optional
+import logging
 import uuid
+from app.config.celery_config import celery_app
 from app.config.database import get_db
 from app.models.job import Job
-from app.schemas.job import JobResponse, JobStatus
+from app.schemas.job import JobResponse, JobStatus, TenantQueueStats
+from app.services.cost_estimator import CostEstimator
+from app.services.fair_share import FairShareScheduler
+from app.services.job_events import publish_on_commit
+from app.services.storage_service import StorageService
 from app.tasks.video_tasks import process_video_upload, process_video_trim, process_quality_generation
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 
+@router.get("/tenants", response_model=List[TenantQueueStats])
+async def get_tenant_queues(db: Session = Depends(get_db)):
+    """Per-tenant queue depth, running jobs and wait times"""
+    try:
+        return [TenantQueueStats(**stats) for stats in FairShareScheduler(db).stats()]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/status/{job_id}", response_model=JobStatus)
 async def get_job_status(
     job_id: uuid.UUID,
@@ -26,7 +43,8 @@ async def get_job_status(
             status=job.status,
             progress=job.progress,
             error_message=job.error_message,
-            result_path=job.result_path
+            result_path=job.result_path,
+            estimated_completion=CostEstimator(db).predicted_completion(job)
         )
     except HTTPException:
         raise
@@ -56,7 +74,7 @@ async def get_job_result(
         
         from fastapi.responses import FileResponse
         return FileResponse(
-            job.result_path,
+            StorageService().ensure_local(job.result_path),
             filename=f"processed_{job_id}.mp4",
             media_type="video/mp4"
         )
@@ -77,7 +95,9 @@ async def get_job_details(
         if not job:
             raise HTTPException(status_code=404, detail="Job not found")
         
-        return JobResponse.from_orm(job)
+        response = JobResponse.from_orm(job)
+        response.estimated_completion = CostEstimator(db).predicted_completion(job)
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -111,7 +131,13 @@ async def cancel_job(
     job_id: uuid.UUID,
     db: Session = Depends(get_db)
 ):
-    """Cancel a pending job"""
+    """Cancel a pending or running job.
+
+    A job still held by the scheduler is simply never released. A sent task
+    is revoked, so a worker that has not started it drops it; a running
+    task notices the status within ``cancel_poll_seconds``, stops its
+    ffmpeg child and removes the outputs it published.
+    """
     try:
         job = db.query(Job).filter(Job.id == job_id).first()
         if not job:
@@ -125,8 +151,16 @@ async def cancel_job(
         
         # Update job status
         job.status = "cancelled"
+        publish_on_commit(db, job)
         db.commit()
         
+        if job.dispatched_at and job.task_id:
+            try:
+                celery_app.control.revoke(job.task_id)
+            except Exception as e:
+                # The task still checks the job status before it starts
+                logger.warning("Could not revoke task %s: %s", job.task_id, e)
+        
         return {"message": "Job cancelled successfully"}
     except HTTPException:
         raise
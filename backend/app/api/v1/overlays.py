@@ -6,11 +6,36 @@ from app.config.database import get_db
 from app.models.job import Job
 from app.schemas.job import JobResponse
 from app.schemas.overlay import OverlayCreate, OverlayResponse, WatermarkRequest
-from app.tasks.video_tasks import process_overlay, process_watermark
+from app.services.encoding_profiles import get_encoding_profile
+from app.services.result_cache import ResultCache
+from app.services.storage_service import StorageService
+from app.services.webhooks import check_callback_url
 
 router = APIRouter()
 
 
+def _validate_encoding_options(encoding_profile: Optional[str], priority: str) -> None:
+    """Reject unknown priority classes and encoding profiles"""
+    if priority not in ["high", "normal", "low"]:
+        raise HTTPException(status_code=400, detail="priority must be one of: high, normal, low")
+    try:
+        get_encoding_profile(encoding_profile, priority)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _submit_job(db: Session, video_id: uuid.UUID, job_type: str, priority: str, parameters: dict,
+                upload_path: Optional[str] = None, callback_url: Optional[str] = None) -> Job:
+    """Create the job, or reuse an identical finished or running one"""
+    job, created = ResultCache(db).submit(video_id, job_type, parameters, priority, callback_url=callback_url)
+    
+    if not created and upload_path:
+        # The reused job has its own copy of the file
+        StorageService().delete_upload(upload_path)
+    
+    return job
+
+
 @router.post("/text", response_model=JobResponse)
 async def add_text_overlay(
     request: OverlayCreate,
@@ -24,31 +49,27 @@ async def add_text_overlay(
         if not request.content:
             raise HTTPException(status_code=400, detail="Text content is required")
         
-        # Create job
-        job = Job(
-            video_id=request.video_id,
-            job_type="overlay",
-            parameters={
-                "overlay_type": "text",
-                "text": request.content,
-                "position_x": request.position_x or 10,
-                "position_y": request.position_y or 10,
-                "font_size": request.font_size or 24,
-                "font_color": request.font_color or "white",
-                "language": request.language or "en"
-            }
-        )
+        _validate_encoding_options(request.encoding_profile, request.priority)
         
-        db.add(job)
-        db.commit()
-        db.refresh(job)
+        parameters = {
+            "overlay_type": "text",
+            "text": request.content,
+            "position_x": request.position_x or 10,
+            "position_y": request.position_y or 10,
+            "font_size": request.font_size or 24,
+            "font_color": request.font_color or "white",
+            "language": request.language or "en",
+            "encoding_profile": request.encoding_profile
+        }
         
-        # Start background task
-        process_overlay.delay(str(job.id))
+        job = _submit_job(db, request.video_id, "overlay", request.priority, parameters,
+                          callback_url=request.callback_url)
         
         return JobResponse.from_orm(job)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -62,6 +83,9 @@ async def add_image_overlay(
     position_y: int = Form(default=10),
     width: int = Form(default=None),
     height: int = Form(default=None),
+    encoding_profile: Optional[str] = Form(default=None),
+    priority: str = Form(default="normal"),
+    callback_url: Optional[str] = Form(default=None),
     db: Session = Depends(get_db)
 ):
     """Add image overlay to video (Level 3)"""
@@ -75,37 +99,33 @@ async def add_image_overlay(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid video_id format")
         
+        _validate_encoding_options(encoding_profile, priority)
+        check_callback_url(callback_url)
+        
         # Save overlay file
-        from app.services.storage_service import StorageService
         storage = StorageService()
         
         file_content = await overlay_file.read()
         overlay_path = storage.save_uploaded_file(file_content, overlay_file.filename)
         
-        # Create job
-        job = Job(
-            video_id=video_uuid,
-            job_type="overlay",
-            parameters={
-                "overlay_type": "image",
-                "overlay_path": overlay_path,
-                "position_x": position_x,
-                "position_y": position_y,
-                "width": width,
-                "height": height
-            }
-        )
-        
-        db.add(job)
-        db.commit()
-        db.refresh(job)
+        parameters = {
+            "overlay_type": "image",
+            "overlay_path": overlay_path,
+            "position_x": position_x,
+            "position_y": position_y,
+            "width": width,
+            "height": height,
+            "encoding_profile": encoding_profile
+        }
         
-        # Start background task
-        process_overlay.delay(str(job.id))
+        job = _submit_job(db, video_uuid, "overlay", priority, parameters, upload_path=overlay_path,
+                          callback_url=callback_url)
         
         return JobResponse.from_orm(job)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -119,6 +139,9 @@ async def add_video_overlay(
     position_y: int = Form(default=10),
     width: int = Form(default=None),
     height: int = Form(default=None),
+    encoding_profile: Optional[str] = Form(default=None),
+    priority: str = Form(default="normal"),
+    callback_url: Optional[str] = Form(default=None),
     db: Session = Depends(get_db)
 ):
     """Add video overlay to video (Level 3)"""
@@ -132,37 +155,33 @@ async def add_video_overlay(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid video_id format")
         
+        _validate_encoding_options(encoding_profile, priority)
+        check_callback_url(callback_url)
+        
         # Save overlay file
-        from app.services.storage_service import StorageService
         storage = StorageService()
         
         file_content = await overlay_file.read()
         overlay_path = storage.save_uploaded_file(file_content, overlay_file.filename)
         
-        # Create job
-        job = Job(
-            video_id=video_uuid,
-            job_type="overlay",
-            parameters={
-                "overlay_type": "video",
-                "overlay_path": overlay_path,
-                "position_x": position_x,
-                "position_y": position_y,
-                "width": width,
-                "height": height
-            }
-        )
-        
-        db.add(job)
-        db.commit()
-        db.refresh(job)
+        parameters = {
+            "overlay_type": "video",
+            "overlay_path": overlay_path,
+            "position_x": position_x,
+            "position_y": position_y,
+            "width": width,
+            "height": height,
+            "encoding_profile": encoding_profile
+        }
         
-        # Start background task
-        process_overlay.delay(str(job.id))
+        job = _submit_job(db, video_uuid, "overlay", priority, parameters, upload_path=overlay_path,
+                          callback_url=callback_url)
         
         return JobResponse.from_orm(job)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -176,6 +195,9 @@ async def add_watermark(
     size: int = Form(100),
     content: Optional[str] = Form(None),
     watermark_file: Optional[UploadFile] = File(None),
+    encoding_profile: Optional[str] = Form(None),
+    priority: str = Form("normal"),
+    callback_url: Optional[str] = Form(None),
     db: Session = Depends(get_db)
 ):
     """Add watermark to video (Level 3)"""
@@ -203,11 +225,15 @@ async def add_watermark(
         if not 0 < size <= 500:
             raise HTTPException(status_code=400, detail="size must be between 1 and 500 pixels")
         
+        _validate_encoding_options(encoding_profile, priority)
+        check_callback_url(callback_url)
+        
         parameters = {
             "watermark_type": watermark_type,
             "position": position,
             "opacity": opacity,
-            "size": size
+            "size": size,
+            "encoding_profile": encoding_profile
         }
         
         if watermark_type == "image":
@@ -215,7 +241,6 @@ async def add_watermark(
                 raise HTTPException(status_code=400, detail="Watermark file is required for image watermark")
             
             # Save watermark file
-            from app.services.storage_service import StorageService
             storage = StorageService()
             
             file_content = await watermark_file.read()
@@ -227,23 +252,14 @@ async def add_watermark(
                 raise HTTPException(status_code=400, detail="Text content is required for text watermark")
             parameters["text"] = content
         
-        # Create job
-        job = Job(
-            video_id=video_uuid,
-            job_type="watermark",
-            parameters=parameters
-        )
-        
-        db.add(job)
-        db.commit()
-        db.refresh(job)
-        
-        # Start background task
-        process_watermark.delay(str(job.id))
+        job = _submit_job(db, video_uuid, "watermark", priority, parameters, upload_path=parameters.get("watermark_path"),
+                          callback_url=callback_url)
         
         return JobResponse.from_orm(job)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
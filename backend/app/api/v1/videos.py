@@ -1,14 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Header
 from sqlalchemy.orm import Session
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from typing import List, Optional
 import uuid
 from app.config.database import get_db
+from app.config.settings import settings
 from app.services.video_service import VideoService
 from app.services.storage_service import StorageService
+from app.services.outbox import enqueue
+from app.services.rendition_cache import RenditionCache
+from app.services.ffmpeg_service import QUALITY_SETTINGS
+from app.services.encoding_profiles import CODECS
 from app.models.video import ProcessedVideo
-from app.schemas.video import VideoResponse, VideoList, TrimRequest, TrimRequestByPath, QualityRequest, QualityRequestByPath, ProcessedVideoResponse
+from app.schemas.video import VideoResponse, VideoList, TrimRequest, TrimRequestByPath, QualityRequest, QualityRequestByPath, ProcessedVideoResponse, VideoQualityResponse, PipelineRequest
 from app.schemas.job import JobResponse
-from app.tasks.video_tasks import process_video_upload, process_video_trim, process_quality_generation
 
 router = APIRouter()
 
@@ -44,12 +50,11 @@ async def upload_video(
             parameters={"filename": file.filename}
         )
         db.add(job)
+        # Its task is sent through the outbox once the job is committed
+        enqueue(db, job)
         db.commit()
         db.refresh(job)
         
-        # Start background task
-        process_video_upload.delay(str(video.id))
-        
         return JobResponse.from_orm(job)
         
     except Exception as e:
@@ -125,15 +130,13 @@ async def trim_video(
     """Trim a video (Level 2) - Exact endpoint from requirements"""
     try:
         video_service = VideoService(db)
-        job = video_service.trim_video(
+        job, _ = video_service.trim_video(
             request.video_id, 
             request.start_time, 
-            request.end_time
+            request.end_time,
+            callback_url=request.callback_url
         )
         
-        # Start background task
-        process_video_trim.delay(str(job.id))
-        
         return JobResponse.from_orm(job)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -152,7 +155,8 @@ async def trim_video_by_id(
     trim_request = TrimRequest(
         video_id=video_id,
         start_time=request.start_time,
-        end_time=request.end_time
+        end_time=request.end_time,
+        callback_url=request.callback_url
     )
     return await trim_video(trim_request, db)
 
@@ -166,10 +170,39 @@ async def generate_qualities(
     """Generate multiple quality versions (Level 5)"""
     try:
         video_service = VideoService(db)
-        job = video_service.generate_qualities(video_id, request.qualities)
+        job = video_service.generate_qualities(
+            video_id,
+            request.qualities,
+            encoding_profile=request.encoding_profile,
+            priority=request.priority,
+            per_title=request.per_title,
+            codecs=request.codecs,
+            callback_url=request.callback_url
+        )
         
-        # Start background task
-        process_quality_generation.delay(str(job.id))
+        return JobResponse.from_orm(job)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/{video_id}/pipeline", response_model=JobResponse)
+async def run_pipeline(
+    video_id: uuid.UUID,
+    request: PipelineRequest,
+    db: Session = Depends(get_db)
+):
+    """Run trim, overlay, watermark, scale and ladder steps as one job"""
+    try:
+        video_service = VideoService(db)
+        job, _ = video_service.create_pipeline(
+            video_id,
+            [op.model_dump(exclude_none=True) for op in request.operations],
+            encoding_profile=request.encoding_profile,
+            priority=request.priority,
+            mode=request.mode
+        )
         
         return JobResponse.from_orm(job)
     except ValueError as e:
@@ -192,7 +225,7 @@ async def download_video(
         
         from fastapi.responses import FileResponse
         return FileResponse(
-            video.file_path,
+            StorageService().ensure_local(video.file_path),
             filename=video.original_filename,
             media_type="video/mp4"
         )
@@ -202,24 +235,85 @@ async def download_video(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _accepted_codecs(codecs: Optional[str], x_video_codecs: Optional[str]) -> List[str]:
+    """Codecs a client advertises via ?codecs= or the X-Video-Codecs header"""
+    advertised = codecs or x_video_codecs or ""
+    return [codec.strip().lower() for codec in advertised.split(",") if codec.strip()]
+
+
+@router.get("/{video_id}/qualities", response_model=List[VideoQualityResponse])
+async def list_qualities(
+    video_id: uuid.UUID,
+    codecs: Optional[str] = Query(None, description="Comma-separated codecs the client can play"),
+    x_video_codecs: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """List the best playable rendition of each quality for this client"""
+    try:
+        video_service = VideoService(db)
+        accepted = _accepted_codecs(codecs, x_video_codecs)
+        available = sorted({q.quality for q in video_service.get_video_qualities(video_id)})
+        
+        renditions = [video_service.negotiate_quality(video_id, quality, accepted) for quality in available]
+        return [VideoQualityResponse.from_orm(r) for r in renditions if r]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/{video_id}/download/{quality}")
 async def download_quality(
     video_id: uuid.UUID,
     quality: str,
+    codecs: Optional[str] = Query(None, description="Comma-separated codecs the client can play"),
+    x_video_codecs: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
-    """Download specific quality version"""
+    """Download specific quality version in the best codec the client advertises,
+    transcoding it on first request if missing"""
     try:
         video_service = VideoService(db)
-        video_quality = video_service.get_video_quality(video_id, quality)
+        cache = RenditionCache(db)
+        accepted = _accepted_codecs(codecs, x_video_codecs)
+        
+        video_quality = video_service.negotiate_quality(video_id, quality, accepted)
+        storage = StorageService()
+        while video_quality and not storage.exists(video_quality.file_path):
+            # Stale row left behind by an out-of-band removal
+            db.delete(video_quality)
+            db.commit()
+            video_quality = video_service.negotiate_quality(video_id, quality, accepted)
+        
         if not video_quality:
-            raise HTTPException(status_code=404, detail="Quality version not found")
+            if not settings.jit_renditions_enabled or quality not in QUALITY_SETTINGS:
+                raise HTTPException(status_code=404, detail="Quality version not found")
+            
+            video = video_service.get_video(video_id)
+            if not video:
+                raise HTTPException(status_code=404, detail="Video not found")
+            if not cache.can_produce(video, quality):
+                raise HTTPException(status_code=404, detail="Quality version not found")
+            
+            # Concurrent requests attach to the same in-flight transcode.
+            # JIT renditions are H.264: the fastest encode and playable everywhere.
+            job, _ = cache.request_rendition(video, quality)
+            
+            return JSONResponse(
+                status_code=202,
+                content=jsonable_encoder(JobResponse.from_orm(job)),
+                headers={"Retry-After": "5"}
+            )
+        
+        cache.touch(video_quality)
+        
+        codec = video_quality.codec or "h264"
+        container = CODECS[codec]["container"]
         
         from fastapi.responses import FileResponse
         return FileResponse(
-            video_quality.file_path,
-            filename=f"{video_id}_{quality}.mp4",
-            media_type="video/mp4"
+            storage.ensure_local(video_quality.file_path),
+            filename=f"{video_id}_{quality}.{container}" if codec == "h264" else f"{video_id}_{quality}_{codec}.{container}",
+            media_type=f"video/{container}",
+            headers={"Vary": "X-Video-Codecs"}
         )
     except HTTPException:
         raise
@@ -240,7 +334,7 @@ async def get_thumbnail(
             raise HTTPException(status_code=404, detail="Thumbnail not found")
         
         from fastapi.responses import FileResponse
-        return FileResponse(video.thumbnail_path, media_type="image/jpeg")
+        return FileResponse(StorageService().ensure_local(video.thumbnail_path), media_type="image/jpeg")
     except HTTPException:
         raise
     except Exception as e:
@@ -279,7 +373,7 @@ async def download_processed_video(
         
         from fastapi.responses import FileResponse
         return FileResponse(
-            processed_video.file_path,
+            StorageService().ensure_local(processed_video.file_path),
             filename=processed_video.filename,
             media_type="video/mp4"
         )
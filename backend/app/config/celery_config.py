@@ -1,12 +1,28 @@
 from celery import Celery
+from celery.signals import celeryd_after_setup
+from kombu import Queue
 from .settings import settings
 
+# Queues by task cost, each served by workers with its own concurrency and limits (see start_worker.py)
+LANES = {
+    "probe": {"concurrency": 8, "soft_time_limit": 60, "time_limit": 120},
+    "remux": {"concurrency": 4, "soft_time_limit": 5 * 60, "time_limit": 6 * 60},
+    "encode_light": {"concurrency": 2, "soft_time_limit": 25 * 60, "time_limit": 30 * 60},
+    "encode_heavy": {"concurrency": 1, "soft_time_limit": 3 * 3600, "time_limit": 3 * 3600 + 300},
+    # Job completion callbacks, so a slow endpoint never holds up processing
+    "webhooks": {"concurrency": 2, "soft_time_limit": 5 * 60, "time_limit": 6 * 60},
+}
+
+# Redis keeps one list per priority, "<queue>:<priority>" (plain "<queue>" for 0), served 0 first
+PRIORITY_STEPS = list(range(10))
+PRIORITY_SEPARATOR = ":"
+
 # Create Celery instance
 celery_app = Celery(
     "dripple",
     broker=settings.celery_broker_url,
     backend=settings.celery_result_backend,
-    include=["app.tasks.video_tasks"]
+    include=["app.tasks.video_tasks", "app.tasks.scheduling", "app.tasks.webhooks"]
 )
 
 # Celery configuration
@@ -17,9 +33,49 @@ celery_app.conf.update(
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
+    # Defaults; processing tasks get limits from their cost estimate (see ProcessingTask)
     task_time_limit=30 * 60,  # 30 minutes
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
     result_expires=3600,  # 1 hour
+    broker_transport_options={
+        "priority_steps": PRIORITY_STEPS,
+        "sep": PRIORITY_SEPARATOR,
+        "queue_order_strategy": "priority",
+    },
+    task_routes=("app.tasks.routing.route_task",),
+    task_default_queue="celery",
+    beat_schedule={
+        "dispatch-pending-jobs": {
+            "task": "app.tasks.scheduling.dispatch_pending_jobs",
+            "schedule": settings.fair_share_dispatch_interval,
+        },
+        "relay-outbox": {
+            "task": "app.tasks.scheduling.relay_outbox",
+            "schedule": settings.outbox_relay_interval,
+        },
+        "reap-expired-leases": {
+            "task": "app.tasks.scheduling.reap_expired_leases",
+            "schedule": settings.lease_reaper_interval,
+        },
+        "deliver-webhooks": {
+            "task": "app.tasks.webhooks.deliver_webhooks",
+            "schedule": settings.webhook_dispatch_interval,
+            "options": {"queue": "webhooks"},
+        },
+    },
+    # Workers started without -Q consume the default queue and every lane
+    task_queues=[Queue("celery"), *(Queue(lane, routing_key=lane) for lane in LANES)],
 )
+
+
+@celeryd_after_setup.connect
+def add_node_queue(sender, instance, **kwargs):
+    """Workers also consume their node's queue for each lane they serve"""
+    if settings.affinity_routing_enabled:
+        from app.tasks.routing import current_node, node_queue
+        queues = instance.app.amqp.queues
+        consumed = list(queues.consume_from) if queues.consume_from else list(queues)
+        for lane in [None] + [q for q in consumed if q in LANES]:
+            queues.select_add(node_queue(current_node(), lane))
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 import os
 
 
@@ -19,6 +19,8 @@ class Settings(BaseSettings):
     # File Storage Settings
     upload_dir: str = "./uploads"
     processed_dir: str = "./processed"
+    scratch_dir: str = "./scratch"  # Local disk or tmpfs; outputs are encoded here, then moved into place
+    scratch_max_age_hours: float = 6.0  # Scratch files untouched this long are treated as orphaned
     max_file_size: int = 500 * 1024 * 1024  # 500MB
     allowed_extensions: List[str] = ["mp4", "avi", "mov", "mkv", "webm"]
     
@@ -43,6 +45,120 @@ class Settings(BaseSettings):
     rate_limit_requests: int = 100
     rate_limit_window: int = 60  # seconds
     
+    # Storage Backend Settings
+    storage_backend: str = "local"  # "local" or "s3"
+    storage_root: str = ""  # Local backend only: a shared directory to store into; empty stores in place
+    s3_bucket: str = "dripple"
+    s3_endpoint_url: Optional[str] = None  # For S3-compatible servers such as MinIO
+    s3_region: str = "us-east-1"
+    s3_access_key_id: Optional[str] = None
+    s3_secret_access_key: Optional[str] = None
+    s3_part_size_mb: int = 16  # Multipart upload / ranged download part size
+    s3_max_concurrency: int = 8  # Parallel parts per transfer
+    source_cache_max_bytes: int = 20 * 1024 * 1024 * 1024  # 20GB of local copies of remotely stored files
+    
+    # Rendition Cache Settings
+    jit_renditions_enabled: bool = True  # Transcode missing renditions on first download
+    rendition_cache_max_bytes: int = 50 * 1024 * 1024 * 1024  # 50GB, originals are not counted
+    
+    # Result Cache Settings
+    result_cache_enabled: bool = True  # Identical trim/overlay/watermark/pipeline jobs reuse earlier outputs
+    
+    # Encoding Profile Settings
+    default_encoding_profile: str = "balanced"
+    encoding_profiles: Dict[str, Dict[str, Any]] = {}  # Extra/overridden profiles by name
+    priority_encoding_profiles: Dict[str, str] = {"high": "fast", "normal": "balanced", "low": "quality"}
+    ladder_codecs: List[str] = ["h264"]  # Any of h264, hevc, vp9, av1
+    av1_encoder: str = "libaom-av1"  # or "libsvtav1"
+    
+    # Per-Title Encoding Settings
+    per_title_encoding_enabled: bool = False  # Default for quality jobs that don't say
+    per_title_sample_count: int = 3
+    per_title_sample_seconds: float = 4.0
+    per_title_crf: int = 23
+    per_title_target_ssim: float = 0.97
+    
+    # Crop Detection Settings
+    auto_crop_enabled: bool = False  # Detect letterbox/pillarbox bars and crop them in encodes
+    crop_sample_count: int = 3
+    crop_sample_seconds: float = 2.0
+    
+    # Pipeline Settings
+    pipeline_mode: str = "graph"  # "graph" fuses operations into one ffmpeg; "pipe" runs one ffmpeg per operation
+    
+    # Output Metadata Settings
+    verify_output_metadata: bool = False  # Also ffprobe finished outputs and log where the encode report differs
+    
+    # Lane Routing Settings
+    lane_routing_enabled: bool = True  # Send tasks to probe/remux/encode_light/encode_heavy queues
+    lane_light_max_cpu_seconds: float = 600.0  # Estimated CPU-seconds above which an encode is heavy
+    
+    # Cost Estimator Settings
+    cost_calibration_samples: int = 500  # Recent timed jobs the rates are calibrated from
+    cost_calibration_min_samples: int = 5  # Per job type and profile, before built-in rates are replaced
+    cost_calibration_ttl_seconds: int = 300  # How long calibrated rates are reused
+    task_time_limit_factor: float = 3.0  # Soft time limit as a multiple of the estimated run time
+    min_task_time_limit: int = 120  # Seconds
+    max_task_time_limit: int = 12 * 3600  # Seconds
+    
+    # Fair-Share Scheduling Settings
+    fair_share_enabled: bool = True  # Hold jobs in per-tenant queues and release them as workers free up
+    fair_share_max_in_flight: int = 16  # Jobs sent to Celery and not yet finished, across all tenants
+    fair_share_quantum_seconds: float = 300.0  # Estimated work a tenant of weight 1 may release per round
+    fair_share_dispatch_interval: float = 5.0  # Seconds between periodic dispatch runs (celery beat)
+    default_tenant_weight: float = 1.0
+    default_tenant_max_in_flight: int = 0  # 0: only fair_share_max_in_flight applies
+    tenant_weights: Dict[str, float] = {}  # Tenant (video user id) -> weight; 0 holds its jobs
+    tenant_max_in_flight: Dict[str, int] = {}  # Tenant -> concurrency cap
+    
+    # Outbox Settings
+    outbox_batch_size: int = 100  # Jobs handed to Celery per relay run
+    outbox_relay_interval: float = 1.0  # Seconds between periodic relay runs (celery beat, and the API's relay thread)
+    outbox_relay_in_api: bool = True  # Relay from a thread of each API process as soon as a submission commits
+    outbox_retention_hours: int = 24  # Sent messages are deleted after this long
+    outbox_max_attempts: int = 5  # Attempts before a message that fails on its own is given up and its job failed
+    
+    # Batch Settings
+    batch_max_videos: int = 10000  # Videos one bulk submission may cover
+    
+    # Job Lease Settings
+    job_lease_seconds: int = 60  # A running job whose lease is not renewed for this long is reclaimed
+    job_heartbeat_seconds: int = 15  # How often a running job renews its lease
+    lease_reaper_interval: float = 30.0  # Seconds between reaper runs (celery beat)
+    max_lease_reclaims: int = 2  # Reclaims before a job that keeps losing its worker is failed
+    
+    # Node Affinity Settings
+    node_name: str = ""  # This node's name; defaults to the hostname. API and workers sharing a disk must agree
+    affinity_routing_enabled: bool = False  # Route process_* tasks to the node holding the source file
+    node_queue_max_length: int = 4  # Above this many waiting tasks a node counts as overloaded
+    node_urls: Dict[str, str] = {}  # Node name -> base URL serving /uploads and /processed, for transfers
+    
+    # Cancellation Settings
+    cancel_poll_seconds: float = 1.0  # How often a running encode checks whether its job was cancelled
+    
+    # Progress Settings
+    progress_write_step: int = 5  # Percentage points of progress after which a running job's row is updated
+    progress_write_seconds: float = 10.0  # Or seconds since the last update, whichever comes first
+    
+    # Job Event Settings
+    job_events_enabled: bool = True  # Workers publish job state changes to Redis for the event streams
+    job_events_channel: str = "job-events"  # Redis pub/sub channel, also the prefix of the last-event keys
+    job_events_last_ttl_seconds: int = 3600  # How long a job's last event is kept for late subscribers
+    job_events_queue_size: int = 100  # Events buffered per subscriber; the oldest are dropped beyond this
+    job_events_keepalive_seconds: float = 15.0  # Idle time after which a stream sends a keepalive
+    
+    # Webhook Settings
+    webhook_secret: str = ""  # Signs callback payloads (HMAC-SHA256); empty uses SECRET_KEY
+    webhook_batch_size: int = 50  # Events sent to one endpoint per POST
+    webhook_concurrency: int = 8  # Endpoints posted to in parallel
+    webhook_timeout: float = 10.0  # Seconds per POST
+    webhook_max_attempts: int = 8  # Failed POSTs before a callback is given up
+    webhook_retry_base_seconds: float = 10.0  # Wait after the first failure, doubled after each further one
+    webhook_retry_max_seconds: float = 3600.0
+    webhook_dispatch_interval: float = 2.0  # Seconds between delivery runs (celery beat)
+    webhook_retention_hours: int = 72  # Delivered and failed callbacks are deleted after this long
+    webhook_allowed_hosts: List[str] = []  # Hosts exempt from the public-address check on callback URLs
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -3,7 +3,8 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from app.config.settings import settings
 from app.config.database import engine, Base
-from app.api.v1 import videos, jobs, overlays
+from app.api.v1 import videos, jobs, overlays, batches, events
+from contextlib import asynccontextmanager
 import logging
 
 # Configure logging
@@ -13,13 +14,24 @@ logger = logging.getLogger(__name__)
 # Create database tables
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Send submitted jobs to Celery from this process as soon as they commit"""
+    if settings.outbox_relay_in_api:
+        from app.tasks.scheduling import start_outbox_relay
+        start_outbox_relay()
+    yield
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="A comprehensive video processing API with upload, trimming, overlays, and quality generation",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -35,6 +47,8 @@ app.add_middleware(
 app.include_router(videos.router, prefix="/api/v1/videos", tags=["videos"])
 app.include_router(jobs.router, prefix="/api/v1/jobs", tags=["jobs"])
 app.include_router(overlays.router, prefix="/api/v1/overlays", tags=["overlays"])
+app.include_router(batches.router, prefix="/api/v1/batches", tags=["batches"])
+app.include_router(events.router, prefix="/api/v1/events", tags=["events"])
 
 # Add the exact endpoints from requirements
 from app.api.v1.videos import trim_video
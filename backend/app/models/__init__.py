@@ -1,5 +1,9 @@
 from .video import Video, VideoQuality
 from .job import Job
 from .overlay import Overlay
+from .tenant import TenantShare
+from .outbox import OutboxMessage
+from .batch import JobBatch
+from .webhook import WebhookDelivery
 
-__all__ = ["Video", "VideoQuality", "Job", "Overlay"]
+__all__ = ["Video", "VideoQuality", "Job", "Overlay", "TenantShare", "OutboxMessage", "JobBatch", "WebhookDelivery"]
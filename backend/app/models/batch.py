@@ -0,0 +1,23 @@
+from sqlalchemy import Column, String, Integer, DateTime, JSON
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+import uuid
+from app.config.database import Base
+
+
+class JobBatch(Base):
+    """One operation submitted for many videos at once (see BatchService)"""
+    __tablename__ = "job_batches"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    job_type = Column(String(50), nullable=False)
+    operation = Column(JSON, nullable=False)  # The submitted operation spec
+    total_jobs = Column(Integer, nullable=False, default=0)  # Jobs created for the batch
+    skipped = Column(Integer, nullable=False, default=0)  # Videos that already had an identical job running
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    jobs = relationship("Job", back_populates="batch")
+
+    def __repr__(self):
+        return f"<JobBatch(id={self.id}, type={self.job_type}, jobs={self.total_jobs})>"
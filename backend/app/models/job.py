@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, String, Integer, Float, DateTime, Text, ForeignKey, JSON, Index, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -8,21 +8,47 @@ from app.config.database import Base
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        # At most one pending or running job per cache key; identical requests attach to it
+        Index("uq_jobs_inflight_cache_key", "cache_key", unique=True,
+              postgresql_where=text("status IN ('pending', 'processing')"),
+              sqlite_where=text("status IN ('pending', 'processing')")),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     video_id = Column(UUID(as_uuid=True), ForeignKey("videos.id"), nullable=True)
-    job_type = Column(String(50), nullable=False)  # 'upload', 'trim', 'overlay', 'watermark', 'quality'
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("job_batches.id"), index=True)  # Bulk submission the job belongs to
+    job_type = Column(String(50), nullable=False)  # 'upload', 'trim', 'overlay', 'watermark', 'quality', 'pipeline'
     status = Column(String(20), default="pending")  # 'pending', 'processing', 'completed', 'failed'
+    priority = Column(String(20), default="normal")  # 'high', 'normal', 'low'
     progress = Column(Integer, default=0)  # 0-100
     parameters = Column(JSON)  # Job parameters
     result_path = Column(String(500))  # Path to result file
+    cache_key = Column(String(64), index=True)  # Result cache key; identical requests share it
     error_message = Column(Text)
+    checkpoint = Column(JSON)  # Stages finished so far and their outputs, so a retry resumes after them
+    tenant = Column(String(64), index=True)  # Owner of the video, for fair-share scheduling
+    task_id = Column(String(255))  # Celery task id, assigned when the job is submitted
+    dispatched_at = Column(DateTime(timezone=True), index=True)  # Sent to Celery; None while held by the scheduler
+    lease_token = Column(String(32))  # Attempt currently running the job; only it may publish outputs
+    lease_owner = Column(String(255))  # host:pid of the worker that last took the lease
+    lease_expires_at = Column(DateTime(timezone=True), index=True)  # Renewed by the running attempt's heartbeat
+    lease_reclaims = Column(Integer, default=0)  # Times the job was taken back from a lost worker
+    lane = Column(String(32), index=True)  # Queue lane the task was sent to
+    cost_units = Column(Float)  # Output megapixel-seconds, the estimator's measure of job size
+    estimated_seconds = Column(Float)  # Predicted run time at dispatch
+    run_seconds = Column(Float)  # Measured run time of the successful attempt
+    cpu_seconds = Column(Float)  # CPU time of that attempt, including ffmpeg
+    stage_seconds = Column(JSON)  # Wall-clock seconds of each stage of that attempt
     started_at = Column(DateTime(timezone=True))
     completed_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     video = relationship("Video", back_populates="jobs")
+    batch = relationship("JobBatch", back_populates="jobs")
+    outbox = relationship("OutboxMessage", back_populates="job", cascade="all, delete-orphan")
+    callbacks = relationship("WebhookDelivery", back_populates="job", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<Job(id={self.id}, type={self.job_type}, status={self.status})>"
@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, DateTime, Text, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.config.database import Base
+
+
+class OutboxMessage(Base):
+    """A submitted job whose task is yet to be sent to Celery (see OutboxRelay)"""
+    __tablename__ = "outbox"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("jobs.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), index=True)  # None until the relay has handed the job on or given it up
+    attempts = Column(Integer, nullable=False, default=0)  # Failed relay attempts
+    last_error = Column(Text)
+
+    job = relationship("Job", back_populates="outbox")
+
+    def __repr__(self):
+        return f"<OutboxMessage(id={self.id}, job_id={self.job_id}, sent_at={self.sent_at})>"
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, Float, DateTime
+from app.config.database import Base
+
+
+class TenantShare(Base):
+    """Fair-share scheduling state of one tenant (see FairShareScheduler)"""
+    __tablename__ = "tenant_shares"
+
+    tenant = Column(String(64), primary_key=True)
+    deficit = Column(Float, nullable=False, default=0.0)  # Estimated seconds of work the tenant may still release
+    last_served_at = Column(DateTime(timezone=True))
+
+    def __repr__(self):
+        return f"<TenantShare(tenant={self.tenant}, deficit={self.deficit})>"
@@ -25,6 +25,10 @@ class Video(Base):
     user_id = Column(UUID(as_uuid=True), nullable=True)  # For future user system
     status = Column(String(20), default="uploaded")
     thumbnail_path = Column(String(500))
+    encoding_ladder = Column(JSON)  # Per-title rung bitrates and the analysis behind them
+    crop = Column(JSON)  # Detected active picture: width, height, x, y
+    content_hash = Column(String(64), index=True)  # SHA-256 of the original, keys the result cache
+    storage_node = Column(String(255), index=True)  # Node whose disk holds the original, for task affinity
     
     # Relationships
     jobs = relationship("Job", back_populates="video", cascade="all, delete-orphan")
@@ -49,8 +53,9 @@ class ProcessedVideo(Base):
     resolution = Column(String(20), nullable=False)
     fps = Column(DECIMAL(5, 2))
     bitrate = Column(Integer)
-    processing_type = Column(String(50), nullable=False)  # 'trim', 'overlay', 'watermark', 'quality'
+    processing_type = Column(String(50), nullable=False)  # 'trim', 'overlay', 'watermark', 'quality', 'pipeline'
     parameters = Column(JSON)  # Store processing parameters
+    cache_key = Column(String(64), index=True)  # Result cache key of the job that produced it
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -67,10 +72,14 @@ class VideoQuality(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     video_id = Column(UUID(as_uuid=True), ForeignKey("videos.id"), nullable=False)
     quality = Column(String(10), nullable=False)  # '1080p', '720p', '480p', '360p'
+    codec = Column(String(20), default="h264")  # 'h264', 'hevc', 'vp9', 'av1'
     file_path = Column(String(500), nullable=False)
     file_size = Column(BigInteger, nullable=False)
     bitrate = Column(Integer)
     resolution = Column(String(20), nullable=False)
+    encode_mode = Column(String(20))  # 'remux', 'transcode'
+    encode_decision = Column(JSON)  # Rendition plan: codecs used and why
+    last_accessed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # LRU eviction key
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
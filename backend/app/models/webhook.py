@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from sqlalchemy.sql import func
+from app.config.database import Base
+
+
+class WebhookDelivery(Base):
+    """A completion callback: waits for its job to finish, then for delivery (see WebhookDispatcher)"""
+    __tablename__ = "webhook_deliveries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    job_id = Column(UUID(as_uuid=True), ForeignKey("jobs.id"), nullable=False, index=True)
+    url = Column(String(2048), nullable=False)
+    status = Column(String(20), nullable=False, default="waiting", index=True)  # 'waiting', 'delivered', 'failed'
+    attempts = Column(Integer, nullable=False, default=0)  # Failed delivery attempts
+    next_attempt_at = Column(DateTime(timezone=True))  # Backoff after a failed attempt; None: once the job finishes
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    delivered_at = Column(DateTime(timezone=True))
+
+    job = relationship("Job", back_populates="callbacks")
+
+    def __repr__(self):
+        return f"<WebhookDelivery(id={self.id}, job_id={self.job_id}, status={self.status})>"
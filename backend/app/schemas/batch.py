@@ -0,0 +1,60 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
+from datetime import datetime
+import uuid
+
+
+class VideoFilter(BaseModel):
+    """Videos a batch applies to; every given field must match, an empty filter matches all"""
+    user_id: Optional[uuid.UUID] = None
+    format: Optional[str] = None
+    status: Optional[str] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+    min_duration: Optional[float] = Field(None, ge=0)
+    max_duration: Optional[float] = Field(None, gt=0)
+
+
+class BatchOperation(BaseModel):
+    """The operation applied to every video of a batch; the fields used depend on ``type``"""
+    type: Literal["quality", "watermark", "overlay", "thumbnail"]
+    # quality
+    qualities: Optional[List[str]] = None
+    codecs: Optional[List[str]] = Field(None, description="Ladder codecs; defaults to the configured ladder codecs")
+    per_title: Optional[bool] = None
+    # overlay / watermark
+    overlay_type: Optional[str] = Field(None, pattern="^(text|image)$")
+    watermark_type: Optional[str] = Field(None, pattern="^(text|image)$")
+    text: Optional[str] = None
+    file_path: Optional[str] = Field(None, description="Previously uploaded image")
+    position_x: Optional[int] = Field(None, ge=0)
+    position_y: Optional[int] = Field(None, ge=0)
+    width: Optional[int] = Field(None, gt=0)
+    height: Optional[int] = Field(None, gt=0)
+    font_size: Optional[int] = Field(None, gt=0)
+    font_color: Optional[str] = None
+    language: Optional[str] = None
+    position: Optional[str] = Field(None, pattern="^(top-left|top-right|bottom-left|bottom-right|center)$")
+    opacity: Optional[float] = Field(None, ge=0.0, le=1.0)
+    size: Optional[int] = Field(None, gt=0, le=500)
+    encoding_profile: Optional[str] = Field(None, description="Named encoding profile; defaults to the profile for the priority class")
+    priority: str = Field("low", pattern="^(high|normal|low)$")
+
+
+class BatchCreate(BaseModel):
+    """Schema for applying one operation to many videos"""
+    video_ids: Optional[List[uuid.UUID]] = Field(None, min_length=1)
+    filter: Optional[VideoFilter] = None
+    operation: BatchOperation
+
+
+class BatchResponse(BaseModel):
+    """A batch and the aggregate progress of its jobs"""
+    id: uuid.UUID
+    job_type: str
+    total_jobs: int
+    skipped: int
+    created_at: datetime
+    status_counts: Dict[str, int] = {}
+    progress: float = 0.0  # Mean progress of the batch's jobs, finished ones counting as 100
+    done: bool = False  # Every job has completed, failed or been cancelled
@@ -8,6 +8,7 @@ class JobCreate(BaseModel):
     """Schema for job creation"""
     video_id: Optional[uuid.UUID] = None
     job_type: str
+    priority: str = Field("normal", pattern="^(high|normal|low)$")
     parameters: Optional[Dict[str, Any]] = None
 
 
@@ -15,8 +16,10 @@ class JobResponse(BaseModel):
     """Schema for job response"""
     id: uuid.UUID
     video_id: Optional[uuid.UUID] = None
+    batch_id: Optional[uuid.UUID] = None
     job_type: str
     status: str
+    priority: Optional[str] = None
     progress: int
     parameters: Optional[Dict[str, Any]] = None
     result_path: Optional[str] = None
@@ -24,6 +27,10 @@ class JobResponse(BaseModel):
     started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     created_at: datetime
+    estimated_seconds: Optional[float] = None  # Predicted run time
+    estimated_completion: Optional[datetime] = None  # Predicted finish of a pending or running job
+    run_seconds: Optional[float] = None  # Measured run time of a completed job
+    stage_seconds: Optional[Dict[str, float]] = None  # How long each of its stages took
 
     class Config:
         from_attributes = True
@@ -36,3 +43,15 @@ class JobStatus(BaseModel):
     progress: int
     error_message: Optional[str] = None
     result_path: Optional[str] = None
+    estimated_completion: Optional[datetime] = None
+
+
+class TenantQueueStats(BaseModel):
+    """Fair-share scheduling state of one tenant"""
+    tenant: str
+    weight: float
+    max_in_flight: int
+    queued: int  # Jobs held by the scheduler
+    in_flight: int  # Jobs sent to workers and not finished
+    oldest_wait_seconds: float  # How long the oldest held job has waited
+    average_wait_seconds: float  # Submission to dispatch, over the last hour
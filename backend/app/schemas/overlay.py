@@ -22,6 +22,9 @@ class OverlayCreate(BaseModel):
     font_size: Optional[int] = Field(None, gt=0)
     font_color: Optional[str] = Field(None, pattern="^#[0-9A-Fa-f]{6}$")
     language: Optional[str] = Field("en", description="Language for text rendering (en, hindi, tamil, telugu, bengali, gujarati, marathi, kannada, malayalam, punjabi, odia)")
+    encoding_profile: Optional[str] = Field(None, description="Named encoding profile; defaults to the profile for the priority class")
+    priority: str = Field("normal", pattern="^(high|normal|low)$")
+    callback_url: Optional[str] = Field(None, max_length=2048, description="URL POSTed to when the job finishes")
 
 
 class OverlayResponse(BaseModel):
@@ -57,3 +60,6 @@ class WatermarkRequest(BaseModel):
     position: str = Field("bottom-right", pattern="^(top-left|top-right|bottom-left|bottom-right|center)$")
     opacity: Optional[float] = Field(0.5, ge=0.0, le=1.0)
     size: Optional[int] = Field(100, gt=0, le=500)  # Size in pixels
+    encoding_profile: Optional[str] = None
+    priority: str = Field("normal", pattern="^(high|normal|low)$")
+    callback_url: Optional[str] = Field(None, max_length=2048, description="URL POSTed to when the job finishes")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
 from datetime import datetime
 from decimal import Decimal
 import uuid
@@ -24,6 +24,8 @@ class VideoResponse(BaseModel):
     upload_time: datetime
     status: str
     thumbnail_path: Optional[str] = None
+    encoding_ladder: Optional[dict] = None
+    crop: Optional[dict] = None
 
     class Config:
         from_attributes = True
@@ -61,10 +63,13 @@ class VideoQualityResponse(BaseModel):
     """Schema for video quality response"""
     id: uuid.UUID
     quality: str
+    codec: Optional[str] = None
     file_path: str
     file_size: int
     bitrate: Optional[int] = None
     resolution: str
+    encode_mode: Optional[str] = None
+    encode_decision: Optional[dict] = None
     created_at: datetime
 
     class Config:
@@ -76,20 +81,65 @@ class TrimRequest(BaseModel):
     video_id: uuid.UUID
     start_time: float = Field(..., ge=0, description="Start time in seconds")
     end_time: float = Field(..., gt=0, description="End time in seconds")
+    callback_url: Optional[str] = Field(None, max_length=2048, description="URL POSTed to when the job finishes")
 
 
 class TrimRequestByPath(BaseModel):
     """Schema for video trim request when video_id is in URL path"""
     start_time: float = Field(..., ge=0, description="Start time in seconds")
     end_time: float = Field(..., gt=0, description="End time in seconds")
+    callback_url: Optional[str] = Field(None, max_length=2048, description="URL POSTed to when the job finishes")
 
 
 class QualityRequest(BaseModel):
     """Schema for quality generation request"""
     video_id: uuid.UUID
     qualities: List[str] = Field(default=["1080p", "720p", "480p"], description="List of qualities to generate")
+    encoding_profile: Optional[str] = Field(None, description="Named encoding profile; defaults to the profile for the priority class")
+    priority: str = Field("normal", pattern="^(high|normal|low)$")
+    per_title: Optional[bool] = Field(None, description="Pick ladder bitrates from a content-complexity analysis")
+    codecs: Optional[List[str]] = Field(None, description="Ladder codecs (h264, hevc, vp9, av1); defaults to the configured ladder codecs")
+    callback_url: Optional[str] = Field(None, max_length=2048, description="URL POSTed to when the job finishes")
 
 
 class QualityRequestByPath(BaseModel):
     """Schema for quality generation request when video_id is in URL path"""
     qualities: List[str] = Field(default=["1080p", "720p", "480p"], description="List of qualities to generate")
+    encoding_profile: Optional[str] = Field(None, description="Named encoding profile; defaults to the profile for the priority class")
+    priority: str = Field("normal", pattern="^(high|normal|low)$")
+    per_title: Optional[bool] = Field(None, description="Pick ladder bitrates from a content-complexity analysis")
+    codecs: Optional[List[str]] = Field(None, description="Ladder codecs (h264, hevc, vp9, av1); defaults to the configured ladder codecs")
+    callback_url: Optional[str] = Field(None, max_length=2048, description="URL POSTed to when the job finishes")
+
+
+class PipelineOperation(BaseModel):
+    """One step of a pipeline; the fields used depend on ``type``"""
+    type: Literal["trim", "overlay", "watermark", "scale", "ladder"]
+    # trim: times are relative to the output of earlier trims
+    start_time: Optional[float] = Field(None, ge=0)
+    end_time: Optional[float] = Field(None, gt=0)
+    # overlay / watermark
+    overlay_type: Optional[str] = Field(None, pattern="^(text|image)$")
+    watermark_type: Optional[str] = Field(None, pattern="^(text|image)$")
+    text: Optional[str] = None
+    file_path: Optional[str] = Field(None, description="Previously uploaded image")
+    position_x: Optional[int] = Field(None, ge=0)
+    position_y: Optional[int] = Field(None, ge=0)
+    width: Optional[int] = Field(None, gt=0)
+    height: Optional[int] = Field(None, gt=0)  # Image size for overlays, target height for scale
+    font_size: Optional[int] = Field(None, gt=0)
+    font_color: Optional[str] = None
+    language: Optional[str] = None
+    position: Optional[str] = Field(None, pattern="^(top-left|top-right|bottom-left|bottom-right|center)$")
+    opacity: Optional[float] = Field(None, ge=0.0, le=1.0)
+    # scale / ladder
+    quality: Optional[str] = None
+    qualities: Optional[List[str]] = None
+
+
+class PipelineRequest(BaseModel):
+    """Schema for a chain of operations processed as one job"""
+    operations: List[PipelineOperation] = Field(..., min_length=1)
+    encoding_profile: Optional[str] = Field(None, description="Named encoding profile; defaults to the profile for the priority class")
+    priority: str = Field("normal", pattern="^(high|normal|low)$")
+    mode: Optional[str] = Field(None, pattern="^(graph|pipe)$", description="Defaults to the configured pipeline mode")
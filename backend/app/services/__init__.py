@@ -1,5 +1,7 @@
 from .ffmpeg_service import FFmpegService
 from .video_service import VideoService
 from .storage_service import StorageService
+from .rendition_cache import RenditionCache
+from .encoding_profiles import EncodingProfile
 
-__all__ = ["FFmpegService", "VideoService", "StorageService"]
+__all__ = ["FFmpegService", "VideoService", "StorageService", "RenditionCache", "EncodingProfile"]
@@ -0,0 +1,210 @@
+import os
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
+from app.config.settings import settings
+from app.models.batch import JobBatch
+from app.models.job import Job
+from app.models.video import Video
+from app.schemas.batch import BatchOperation, VideoFilter
+from app.services.encoding_profiles import get_encoding_profile, CODECS
+from app.services.fair_share import ACTIVE_STATUSES, FINISHED_STATUSES
+from app.services.ffmpeg_service import QUALITY_SETTINGS
+from app.services.outbox import enqueue_many
+from app.services.result_cache import ResultCache
+
+
+class BatchService:
+    """Applies one operation to many videos as a single submission.
+
+    All of a batch's jobs and their outbox messages are written with one
+    bulk insert each and committed together, so a catalog-wide operation
+    costs one request and one transaction instead of one per video. The
+    outbox relay then hands them to Celery in batches.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def select_videos(self, video_ids: Optional[List[uuid.UUID]] = None,
+                      video_filter: Optional[VideoFilter] = None) -> List[Video]:
+        """Videos named by id or matching the filter, loading only what submission needs"""
+        if video_ids is None and video_filter is None:
+            raise ValueError("Give video_ids or a filter")
+        query = self.db.query(Video).options(load_only(Video.id, Video.content_hash))
+        if video_ids is not None:
+            query = query.filter(Video.id.in_(video_ids))
+        if video_filter is not None:
+            if video_filter.user_id:
+                query = query.filter(Video.user_id == video_filter.user_id)
+            if video_filter.format:
+                query = query.filter(Video.format == video_filter.format)
+            if video_filter.status:
+                query = query.filter(Video.status == video_filter.status)
+            if video_filter.uploaded_after:
+                query = query.filter(Video.upload_time >= video_filter.uploaded_after)
+            if video_filter.uploaded_before:
+                query = query.filter(Video.upload_time < video_filter.uploaded_before)
+            if video_filter.min_duration is not None:
+                query = query.filter(Video.duration >= video_filter.min_duration)
+            if video_filter.max_duration is not None:
+                query = query.filter(Video.duration <= video_filter.max_duration)
+        return query.order_by(Video.created_at).limit(settings.batch_max_videos + 1).all()
+
+    def job_for(self, operation: BatchOperation) -> Tuple[str, Dict[str, Any]]:
+        """Job type and parameters of an operation, as the single-video endpoints build them.
+
+        Raises ValueError for an invalid operation.
+        """
+        # Raises ValueError for unknown profiles
+        get_encoding_profile(operation.encoding_profile, operation.priority)
+
+        if operation.type == "thumbnail":
+            # The upload task probes the video again and replaces its thumbnail
+            return "upload", {"regenerate_thumbnail": True}
+
+        if operation.type == "quality":
+            if not operation.qualities:
+                raise ValueError("qualities are required")
+            unknown = [q for q in operation.qualities if q not in QUALITY_SETTINGS]
+            if unknown:
+                raise ValueError(f"Unsupported qualities: {', '.join(unknown)}")
+            codecs = operation.codecs or settings.ladder_codecs
+            unknown = [codec for codec in codecs if codec not in CODECS]
+            if unknown:
+                raise ValueError(f"Unsupported codecs: {', '.join(unknown)}")
+            return "quality", {
+                "qualities": operation.qualities,
+                "encoding_profile": operation.encoding_profile,
+                "per_title": settings.per_title_encoding_enabled if operation.per_title is None else operation.per_title,
+                "codecs": codecs
+            }
+
+        if operation.type == "watermark":
+            if not operation.watermark_type:
+                raise ValueError("watermark_type is required")
+            parameters = {
+                "watermark_type": operation.watermark_type,
+                "position": operation.position or "bottom-right",
+                "opacity": 0.5 if operation.opacity is None else operation.opacity,
+                "size": operation.size or 100,
+                "encoding_profile": operation.encoding_profile
+            }
+            if operation.watermark_type == "image":
+                parameters["watermark_path"] = self._upload(operation.file_path)
+            else:
+                parameters["text"] = self._text(operation.text)
+            return "watermark", parameters
+
+        if not operation.overlay_type:
+            raise ValueError("overlay_type is required")
+        parameters = {
+            "overlay_type": operation.overlay_type,
+            "position_x": 10 if operation.position_x is None else operation.position_x,
+            "position_y": 10 if operation.position_y is None else operation.position_y,
+            "encoding_profile": operation.encoding_profile
+        }
+        if operation.overlay_type == "image":
+            parameters.update(overlay_path=self._upload(operation.file_path),
+                              width=operation.width, height=operation.height)
+        else:
+            parameters.update(text=self._text(operation.text), font_size=operation.font_size or 24,
+                              font_color=operation.font_color or "white", language=operation.language or "en")
+        return "overlay", parameters
+
+    def _text(self, text: Optional[str]) -> str:
+        if not text:
+            raise ValueError("Text content is required")
+        return text
+
+    def _upload(self, file_path: Optional[str]) -> str:
+        """An image from an earlier upload; arbitrary server paths are refused"""
+        upload_dir = os.path.realpath(settings.upload_dir)
+        path = os.path.realpath(file_path) if file_path else None
+        if not path or os.path.commonpath([path, upload_dir]) != upload_dir or not os.path.exists(path):
+            raise ValueError(f"Unknown upload: {file_path}")
+        return path
+
+    def submit(self, operation: BatchOperation, video_ids: Optional[List[uuid.UUID]] = None,
+               video_filter: Optional[VideoFilter] = None) -> JobBatch:
+        """Create one job per selected video and queue them all, in one transaction.
+
+        Videos with an identical job already pending or running, in or
+        outside the batch, are skipped, as a repeated single request would
+        attach to that job.
+        """
+        job_type, parameters = self.job_for(operation)
+        videos = self.select_videos(video_ids, video_filter)
+        if not videos:
+            raise ValueError("No videos match")
+        if len(videos) > settings.batch_max_videos:
+            raise ValueError(f"A batch may cover at most {settings.batch_max_videos} videos")
+
+        keys = {}
+        if settings.result_cache_enabled and job_type != "upload":
+            keys = ResultCache(self.db).cache_keys(videos, job_type, parameters, operation.priority)
+
+        # A job created meanwhile by a single request trips the unique index on
+        # in-flight cache keys; the batch is then built again without its video
+        for attempt in range(3):
+            try:
+                return self._insert(operation, job_type, parameters, videos, keys)
+            except IntegrityError:
+                self.db.rollback()
+                if attempt == 2:
+                    raise
+
+    def _insert(self, operation: BatchOperation, job_type: str, parameters: Dict[str, Any],
+                videos: List[Video], keys: Dict[Any, str]) -> JobBatch:
+        claimed = {key for (key,) in self.db.query(Job.cache_key).filter(
+            Job.cache_key.in_(list(keys.values())),
+            Job.status.in_(ACTIVE_STATUSES)
+        )} if keys else set()
+
+        batch = JobBatch(id=uuid.uuid4(), job_type=job_type, operation=operation.model_dump(exclude_none=True))
+        rows = []
+        for video in videos:
+            key = keys.get(video.id)
+            if key in claimed:
+                continue  # Identical to a pending or running job, or to one earlier in the batch
+            if key:
+                claimed.add(key)
+            rows.append({
+                "id": uuid.uuid4(),
+                "video_id": video.id,
+                "batch_id": batch.id,
+                "job_type": job_type,
+                "status": "pending",
+                "priority": operation.priority,
+                "progress": 0,
+                "parameters": parameters,
+                "cache_key": key
+            })
+        batch.total_jobs = len(rows)
+        batch.skipped = len(videos) - len(rows)
+
+        self.db.add(batch)
+        self.db.flush()
+        if rows:
+            self.db.execute(insert(Job), rows)
+            enqueue_many(self.db, [row["id"] for row in rows])
+        self.db.commit()
+        return batch
+
+    def progress(self, batch: JobBatch) -> Dict[str, Any]:
+        """Status counts and mean progress of a batch's jobs, from one grouped query"""
+        counts = {}
+        progress = 0.0
+        for status, count, total_progress in self.db.query(
+            Job.status, func.count(Job.id), func.sum(Job.progress)
+        ).filter(Job.batch_id == batch.id).group_by(Job.status):
+            counts[status] = count
+            progress += 100.0 * count if status in FINISHED_STATUSES else float(total_progress or 0)
+        jobs = sum(counts.values())
+        return {
+            "status_counts": counts,
+            "progress": round(progress / jobs, 1) if jobs else 100.0,
+            "done": all(status in FINISHED_STATUSES for status in counts)
+        }
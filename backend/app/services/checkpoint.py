@@ -0,0 +1,74 @@
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.models.job import Job
+from app.services.storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+class Checkpoint:
+    """Stages of a job that finished durably, so a retry resumes after them.
+
+    ``job.checkpoint`` maps each finished stage to the data needed to skip
+    it and the files it produced, with their size and SHA-256. A stage only
+    counts as done while every one of its files still matches; otherwise
+    the retry runs it again.
+    """
+
+    def __init__(self, db: Session, job: Job, storage: Optional[StorageService] = None):
+        self.db = db
+        self.job = job
+        self.storage = storage or StorageService()
+
+    @property
+    def stages(self) -> Dict[str, Dict[str, Any]]:
+        return (self.job.checkpoint or {}).get("stages", {})
+
+    def get(self, stage: str) -> Optional[Dict[str, Any]]:
+        """Data saved with a finished stage, or None if the stage has to run"""
+        saved = self.stages.get(stage)
+        if saved is None:
+            return None
+        for name, artifact in saved["artifacts"].items():
+            if not self._intact(artifact):
+                logger.warning("Checkpointed %s of job %s changed or is gone; redoing %s", name, self.job.id, stage)
+                return None
+        return saved["data"]
+
+    def _intact(self, artifact: Dict[str, Any]) -> bool:
+        path = self.storage.ensure_local(artifact["path"])
+        return (
+            os.path.exists(path)
+            and os.path.getsize(path) == artifact["size"]
+            and self.storage.file_hash(path) == artifact["sha256"]
+        )
+
+    def save(self, stage: str, data: Optional[Dict[str, Any]] = None,
+             artifacts: Optional[Dict[str, str]] = None) -> None:
+        """Record a finished stage and its output files, committing so it outlives a later failure"""
+        stages = dict(self.stages)
+        stages[stage] = {
+            "data": data or {},
+            "artifacts": {
+                name: {"path": path, "size": os.path.getsize(path), "sha256": self.storage.file_hash(path)}
+                for name, path in (artifacts or {}).items()
+            },
+            "completed_at": datetime.now(timezone.utc).isoformat()
+        }
+        # Assign a new dict; in-place changes to a JSON column are not tracked
+        self.job.checkpoint = {"stages": stages}
+        self.db.commit()
+
+    def artifact_paths(self) -> List[str]:
+        return [artifact["path"] for saved in self.stages.values() for artifact in saved["artifacts"].values()]
+
+    def discard(self) -> None:
+        """Delete every checkpointed file and forget the stages, for a job that will not be resumed"""
+        for path in self.artifact_paths():
+            self.storage.delete_file(path)
+        if self.job.checkpoint is not None:
+            self.job.checkpoint = None
+            self.db.commit()
@@ -0,0 +1,209 @@
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import Video
+
+# Relative encoder cost per output pixel; the ladder codecs other than H.264 are much slower
+CODEC_COST = {"h264": 1.0, "hevc": 3.0, "vp9": 3.0, "av1": 6.0}
+
+# Relative cost of the x264 presets; other encoders are mapped onto them (see encoding_profiles)
+PRESET_COST = {
+    "ultrafast": 0.2, "superfast": 0.3, "veryfast": 0.45, "faster": 0.65, "fast": 0.8,
+    "medium": 1.0, "slow": 1.6, "slower": 2.6, "veryslow": 4.5,
+}
+
+# Uncalibrated CPU-seconds per output megapixel-second at the medium preset
+DEFAULT_CPU_RATES = {
+    "upload": 0.01,  # Probe and thumbnail only
+    "trim": 0.02,  # Stream copy
+    "quality": 1.0,
+    "overlay": 1.1,
+    "watermark": 1.1,
+    "pipeline": 1.1,
+}
+
+# Uncalibrated CPU-seconds used per wall-clock second; x264 keeps a few cores busy
+DEFAULT_PARALLELISM = {"upload": 1.0, "trim": 1.0}
+DEFAULT_ENCODER_PARALLELISM = 4.0
+
+# Wall-clock seconds every task spends outside the estimated work (DB, probing, publishing)
+TASK_OVERHEAD_SECONDS = 2.0
+
+# Redis broker priorities: 0 is taken first
+PRIORITY_CLASSES = {"high": 0, "normal": 3, "low": 6}
+
+# Calibrated (CPU, wall) seconds per unit by (job type, profile), refreshed every cost_calibration_ttl_seconds
+_calibration = {"at": 0.0, "rates": {}}
+
+
+class CostEstimate(BaseModel):
+    """Predicted cost of one job"""
+    units: float  # Output megapixel-seconds
+    cpu_seconds: float
+    wall_seconds: float
+    calibrated: bool = False  # Rates came from recorded timings rather than defaults
+
+
+def output_megapixel_seconds(job: Job, video: Video) -> float:
+    """Pixels a job encodes: output duration x frame size, summed over outputs and codecs"""
+    from app.services.ffmpeg_service import QUALITY_SETTINGS
+    from app.services.pipeline import Pipeline
+
+    width, height = (int(v) for v in video.resolution.split("x"))
+    duration = float(video.duration)
+    parameters = job.parameters or {}
+    megapixels = width * height / 1_000_000
+
+    if job.job_type == "quality":
+        codecs = parameters.get("codecs") or ["h264"]
+        total = 0.0
+        for quality in parameters.get("qualities", []):
+            rung = int(QUALITY_SETTINGS.get(quality, {}).get("height", height))
+            if rung <= height:
+                total += megapixels * (rung / height) ** 2 * duration * sum(CODEC_COST.get(c, 1.0) for c in codecs)
+        return total
+    if job.job_type == "pipeline":
+        try:
+            pipeline = Pipeline(parameters.get("operations", []), width, height, duration)
+        except ValueError:
+            return megapixels * duration
+        return sum(
+            int(output["resolution"].split("x")[0]) * int(output["resolution"].split("x")[1]) / 1_000_000
+            for output in pipeline.outputs()
+        ) * pipeline.duration
+    if job.job_type == "trim":
+        return megapixels * max(parameters.get("end_time", duration) - parameters.get("start_time", 0), 0)
+    return megapixels * duration
+
+
+def profile_name(job: Job) -> Optional[str]:
+    """Encoding profile a job runs with, None for jobs that do not encode"""
+    from app.services.encoding_profiles import get_encoding_profile
+
+    if job.job_type in ("upload", "trim"):
+        return None
+    try:
+        return get_encoding_profile((job.parameters or {}).get("encoding_profile"), job.priority).name
+    except ValueError:
+        return None
+
+
+def profile_cost(name: Optional[str]) -> float:
+    """Relative cost of an encoding profile, 1.0 for the medium preset"""
+    from app.services.encoding_profiles import list_profiles
+
+    profile = list_profiles().get(name) if name else None
+    if not profile:
+        return 1.0
+    cost = PRESET_COST.get(profile.preset, 1.0)
+    return cost * 1.6 if profile.two_pass else cost
+
+
+class CostEstimator:
+    """Predicts how long jobs take from what they encode.
+
+    A job's size is its output megapixel-seconds. Seconds per unit come from
+    the timings recorded for recent jobs of the same type and profile, and
+    fall back to built-in rates until enough jobs have run.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def rates(self) -> Dict[Tuple[str, Optional[str]], Tuple[float, float]]:
+        """Calibrated (CPU, wall) seconds per unit by (job type, profile)"""
+        if time.monotonic() - _calibration["at"] < settings.cost_calibration_ttl_seconds:
+            return _calibration["rates"]
+
+        jobs = self.db.query(Job).filter(
+            Job.run_seconds.isnot(None),
+            Job.cost_units > 0
+        ).order_by(Job.created_at.desc()).limit(settings.cost_calibration_samples).all()
+
+        samples = {}
+        for job in jobs:
+            totals = samples.setdefault((job.job_type, profile_name(job)), [0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += job.cost_units
+            totals[2] += job.cpu_seconds or 0.0
+            totals[3] += max(job.run_seconds - TASK_OVERHEAD_SECONDS, 0.0)
+
+        rates = {
+            key: (cpu / units, wall / units)
+            for key, (count, units, cpu, wall) in samples.items()
+            if count >= settings.cost_calibration_min_samples
+        }
+        _calibration.update(at=time.monotonic(), rates=rates)
+        return rates
+
+    def estimate(self, job: Job, video: Optional[Video]) -> CostEstimate:
+        """Predicted CPU and wall-clock seconds for a job"""
+        if video is None or not video.resolution or not video.duration:
+            units = 0.0
+        else:
+            units = output_megapixel_seconds(job, video)
+
+        profile = profile_name(job)
+        calibrated = self.rates().get((job.job_type, profile))
+        if calibrated:
+            cpu_rate, wall_rate = calibrated
+        else:
+            cpu_rate = DEFAULT_CPU_RATES.get(job.job_type, 1.0) * profile_cost(profile)
+            wall_rate = cpu_rate / DEFAULT_PARALLELISM.get(job.job_type, DEFAULT_ENCODER_PARALLELISM)
+
+        return CostEstimate(
+            units=units,
+            cpu_seconds=units * cpu_rate,
+            wall_seconds=TASK_OVERHEAD_SECONDS + units * wall_rate,
+            calibrated=calibrated is not None
+        )
+
+    def time_limits(self, estimate: CostEstimate) -> Tuple[int, int]:
+        """``(soft, hard)`` time limits in seconds for a task with this estimate"""
+        soft = estimate.wall_seconds * settings.task_time_limit_factor
+        soft = int(min(max(soft, settings.min_task_time_limit), settings.max_task_time_limit))
+        return soft, soft + max(60, soft // 10)
+
+    def priority(self, estimate: CostEstimate, priority_class: Optional[str]) -> int:
+        """Broker priority: the job's class first, then shorter jobs first within it"""
+        base = PRIORITY_CLASSES.get(priority_class or "normal", PRIORITY_CLASSES["normal"])
+        # +0 under a minute, +1 under ten minutes, +2 beyond
+        size = 0 if estimate.wall_seconds < 60 else 1 if estimate.wall_seconds < 600 else 2
+        return min(base + size, 9)
+
+    def record(self, job: Job, run_seconds: float, cpu_seconds: float) -> None:
+        """Store how long a finished job took, for later calibration; the caller commits"""
+        job.run_seconds = run_seconds
+        job.cpu_seconds = cpu_seconds
+
+    def predicted_completion(self, job: Job) -> Optional[datetime]:
+        """When a pending or running job should finish, None when unknown or done.
+
+        Running jobs finish after the unfinished part of their estimate.
+        Pending jobs also wait for the jobs queued before them in the same
+        lane, shared across the lane's worker concurrency.
+        """
+        from app.config.celery_config import LANES
+
+        if job.status not in ("pending", "processing") or job.estimated_seconds is None:
+            return None
+        now = datetime.now(timezone.utc)
+        remaining = job.estimated_seconds * (1 - (job.progress or 0) / 100)
+        if job.status == "processing":
+            return now + timedelta(seconds=remaining)
+
+        ahead = self.db.query(Job).filter(
+            Job.id != job.id,
+            Job.lane == job.lane,
+            Job.status.in_(("pending", "processing")),
+            Job.created_at < job.created_at,
+            Job.estimated_seconds.isnot(None)
+        ).all()
+        backlog = sum(other.estimated_seconds * (1 - (other.progress or 0) / 100) for other in ahead)
+        concurrency = LANES.get(job.lane, {}).get("concurrency", 1)
+        return now + timedelta(seconds=math.ceil(backlog / concurrency + remaining))
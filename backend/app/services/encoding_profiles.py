@@ -0,0 +1,144 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+from app.config.settings import settings
+
+
+class EncodingProfile(BaseModel):
+    """Named set of encoder options shared by ladder, overlay and watermark encodes"""
+    name: str
+    preset: str = "medium"
+    tune: Optional[str] = None
+    crf: Optional[int] = Field(None, ge=0, le=51)  # None means bitrate-driven (ABR)
+    gop_seconds: Optional[float] = Field(None, gt=0)  # Keyframe interval
+    threads: int = Field(0, ge=0)  # 0 lets the encoder decide
+    two_pass: bool = False  # Only used when a target bitrate is given
+    bufsize_factor: float = Field(2.0, gt=0)  # VBV buffer relative to the bitrate cap
+
+    def uses_two_pass(self, bitrate: Optional[str], codec: str = "h264") -> bool:
+        """Two-pass only makes sense for bitrate-driven encodes on encoders that support it"""
+        if codec == "av1" and settings.av1_encoder == "libsvtav1":
+            return False
+        return self.two_pass and self.crf is None and bitrate is not None and CODECS[codec]["two_pass"]
+
+    def video_args(self, bitrate: Optional[str] = None, pass_number: Optional[int] = None,
+                   passlog: Optional[str] = None, codec: str = "h264") -> List[str]:
+        """Build ffmpeg video encoder arguments.
+
+        With a CRF the rung bitrate becomes a cap (capped VBR); without one the
+        bitrate is the average target. Without either, CRF 23 is used. For
+        codecs other than H.264 the preset and CRF are translated to the
+        equivalent encoder options.
+        """
+        spec = CODECS[codec]
+        encoder = settings.av1_encoder if codec == "av1" else spec["encoder"]
+        args = ["-c:v", encoder, *_speed_args(encoder, self.preset)]
+        if self.tune and encoder == "libx264":
+            args += ["-tune", self.tune]
+
+        if self.crf is not None or bitrate is None:
+            crf = min((self.crf if self.crf is not None else 23) + spec["crf_offset"], spec["max_crf"])
+            args += ["-crf", str(crf)]
+            if bitrate and encoder in ("libvpx-vp9", "libaom-av1"):
+                # Constrained quality: -b:v is the ceiling for these encoders
+                args += ["-b:v", bitrate]
+            elif bitrate:
+                args += ["-maxrate", bitrate, "-bufsize", _scale_bitrate(bitrate, self.bufsize_factor)]
+            elif encoder in ("libvpx-vp9", "libaom-av1"):
+                args += ["-b:v", "0"]
+        else:
+            args += ["-b:v", bitrate]
+            if pass_number:
+                args += ["-pass", str(pass_number)]
+                if passlog:
+                    args += ["-passlogfile", passlog]
+
+        if self.gop_seconds:
+            args += ["-force_key_frames", f"expr:gte(t,n_forced*{self.gop_seconds})"]
+        if self.threads:
+            args += ["-threads", str(self.threads)]
+
+        args += [*spec["extra_args"], "-pix_fmt", "yuv420p"]
+        return args
+
+
+# Software encoders available for ladders. Keys are ffprobe codec names;
+# crf_offset maps an x264 CRF onto the encoder's scale for similar quality
+# and bitrate_factor scales ladder bitrates for the codec's efficiency.
+CODECS = {
+    "h264": {
+        "encoder": "libx264", "container": "mp4", "audio_encoder": "aac", "audio_codec": "aac",
+        "crf_offset": 0, "max_crf": 51, "bitrate_factor": 1.0, "two_pass": True,
+        "extra_args": []
+    },
+    "hevc": {
+        "encoder": "libx265", "container": "mp4", "audio_encoder": "aac", "audio_codec": "aac",
+        "crf_offset": 5, "max_crf": 51, "bitrate_factor": 0.6, "two_pass": False,
+        "extra_args": ["-tag:v", "hvc1"]
+    },
+    "vp9": {
+        "encoder": "libvpx-vp9", "container": "webm", "audio_encoder": "libopus", "audio_codec": "opus",
+        "crf_offset": 10, "max_crf": 63, "bitrate_factor": 0.65, "two_pass": True,
+        "extra_args": ["-row-mt", "1"]
+    },
+    "av1": {
+        "encoder": "libaom-av1", "container": "mp4", "audio_encoder": "aac", "audio_codec": "aac",
+        "crf_offset": 10, "max_crf": 63, "bitrate_factor": 0.5, "two_pass": True,
+        "extra_args": []
+    },
+}
+
+# Most efficient first; used when negotiating with clients
+CODEC_PREFERENCE = ["av1", "hevc", "vp9", "h264"]
+
+# x264 preset names from fastest to slowest, used to translate speed to other encoders
+_SPEED_LEVELS = ["ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow"]
+
+
+def _speed_args(encoder: str, preset: str) -> List[str]:
+    """Encoder speed options equivalent to an x264 preset"""
+    if encoder in ("libx264", "libx265"):
+        return ["-preset", preset]
+
+    level = _SPEED_LEVELS.index(preset) if preset in _SPEED_LEVELS else _SPEED_LEVELS.index("medium")
+    if encoder == "libvpx-vp9":
+        return ["-deadline", "good", "-cpu-used", str(min(5, 8 - level))]
+    if encoder == "libaom-av1":
+        return ["-cpu-used", str(min(8, 9 - level)), "-row-mt", "1"]
+    if encoder == "libsvtav1":
+        return ["-preset", str(12 - level)]
+    return []
+
+
+# Built-in profiles; settings.encoding_profiles can override or add to these
+BUILTIN_PROFILES = {
+    "fast": {"preset": "veryfast", "crf": 26, "gop_seconds": 2},
+    "balanced": {"preset": "medium", "crf": 23, "gop_seconds": 2},
+    "quality": {"preset": "slow", "crf": 20, "gop_seconds": 2},
+    "archive": {"preset": "slower", "two_pass": True, "gop_seconds": 4},
+}
+
+
+def _scale_bitrate(bitrate: str, factor: float) -> str:
+    """Scale an ffmpeg bitrate string such as '2500k'"""
+    if bitrate.endswith("k"):
+        return f"{int(int(bitrate[:-1]) * factor)}k"
+    return str(int(int(bitrate) * factor))
+
+
+def list_profiles() -> Dict[str, EncodingProfile]:
+    """All available profiles by name"""
+    definitions = {**BUILTIN_PROFILES, **settings.encoding_profiles}
+    return {name: EncodingProfile(name=name, **options) for name, options in definitions.items()}
+
+
+def get_encoding_profile(name: Optional[str] = None, priority: Optional[str] = None) -> EncodingProfile:
+    """Resolve a profile by explicit name, else by priority class, else the default"""
+    profiles = list_profiles()
+
+    if not name and priority:
+        name = settings.priority_encoding_profiles.get(priority)
+    name = name or settings.default_encoding_profile
+
+    if name not in profiles:
+        raise ValueError(f"Unknown encoding profile: {name}")
+    return profiles[name]
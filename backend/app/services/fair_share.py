@@ -0,0 +1,204 @@
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session, joinedload
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.tenant import TenantShare
+from app.models.video import Video
+from app.services.cost_estimator import CostEstimator
+
+logger = logging.getLogger(__name__)
+
+# Tenant of videos without an owner
+DEFAULT_TENANT = "default"
+
+# Job statuses that hold a worker slot once dispatched
+ACTIVE_STATUSES = ("pending", "processing")
+
+# Job statuses after which a job no longer changes
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+# Postgres advisory lock serializing dispatch runs across processes
+DISPATCH_LOCK_KEY = 0x64726970
+
+# Jobs submitted to the scheduler and not yet released; jobs that were never submitted have no task id
+HELD = (Job.task_id.isnot(None), Job.dispatched_at.is_(None), Job.status == "pending")
+
+# Period over which the average wait of dispatched jobs is reported
+WAIT_WINDOW = timedelta(hours=1)
+
+
+def tenant_for(video: Optional[Video]) -> str:
+    """Tenant a video's jobs are scheduled under"""
+    return str(video.user_id) if video is not None and video.user_id else DEFAULT_TENANT
+
+
+def _aware(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive timestamps (SQLite) as UTC"""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+class FairShareScheduler:
+    """Per-tenant job queues between the API and Celery.
+
+    Submitted jobs are held (a task id but no ``dispatched_at``) instead
+    of being sent. Each dispatch run fills the free worker slots, at most
+    ``fair_share_max_in_flight`` jobs overall and each tenant's cap, by
+    weighted deficit round robin: every round a tenant with held jobs earns
+    its weight x ``fair_share_quantum_seconds`` and releases up to its
+    weight in jobs, in submission order, while their estimated run time
+    fits its deficit. Tenants therefore share workers by estimated work,
+    not job count, and a bulk import only ever occupies its share.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def weight(self, tenant: str) -> float:
+        return settings.tenant_weights.get(tenant, settings.default_tenant_weight)
+
+    def max_in_flight(self, tenant: str) -> int:
+        cap = settings.tenant_max_in_flight.get(tenant, settings.default_tenant_max_in_flight)
+        return cap or settings.fair_share_max_in_flight
+
+    def hold(self, job: Job, video: Optional[Video], task_id: str) -> None:
+        """Queue a submitted job under its tenant; the caller commits"""
+        job.tenant = tenant_for(video)
+        job.task_id = task_id
+        job.dispatched_at = None
+        job.estimated_seconds = CostEstimator(self.db).estimate(job, video).wall_seconds
+
+    def in_flight(self) -> Dict[str, int]:
+        """Dispatched, unfinished jobs by tenant"""
+        rows = self.db.query(Job.tenant, func.count(Job.id)).filter(
+            Job.dispatched_at.isnot(None),
+            Job.status.in_(ACTIVE_STATUSES)
+        ).group_by(Job.tenant).all()
+        return {tenant or DEFAULT_TENANT: count for tenant, count in rows}
+
+    def queued(self) -> Dict[str, int]:
+        """Held jobs by tenant"""
+        rows = self.db.query(Job.tenant, func.count(Job.id)).filter(
+            *HELD
+        ).group_by(Job.tenant).all()
+        return {tenant or DEFAULT_TENANT: count for tenant, count in rows}
+
+    def _held(self, tenant: str, limit: int) -> List[Job]:
+        tenant_filter = Job.tenant == tenant if tenant != DEFAULT_TENANT else (
+            (Job.tenant == tenant) | Job.tenant.is_(None))
+        # Videos come with the jobs, as releasing them plans their tasks
+        return self.db.query(Job).options(joinedload(Job.video)).filter(
+            tenant_filter,
+            *HELD
+        ).order_by(Job.created_at).limit(limit).all()
+
+    def _lock(self) -> bool:
+        """Take the dispatch lock for this transaction; False if another run holds it"""
+        if self.db.get_bind().dialect.name != "postgresql":
+            return True
+        return bool(self.db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                    {"key": DISPATCH_LOCK_KEY}).scalar())
+
+    def dispatch(self, release: Callable[[Job], None]) -> int:
+        """Release held jobs into free slots with ``release``; returns how many were sent.
+
+        ``release`` sends a job and marks it dispatched in this session (see
+        TaskPlanner), so the jobs and the deficits are committed together.
+        """
+        if not self._lock():
+            return 0
+        in_flight = self.in_flight()
+        free = settings.fair_share_max_in_flight - sum(in_flight.values())
+        queued = self.queued()
+        if free <= 0 or not queued:
+            self.db.commit()
+            return 0
+
+        shares = {share.tenant: share for share in self.db.query(TenantShare).filter(
+            TenantShare.tenant.in_(list(queued))).all()}
+        for tenant in queued:
+            if tenant not in shares:
+                shares[tenant] = TenantShare(tenant=tenant, deficit=0.0)
+                self.db.add(shares[tenant])
+
+        # Longest-unserved tenants first, so leftover slots rotate between runs
+        epoch = datetime.min.replace(tzinfo=timezone.utc)
+        tenants = sorted(queued, key=lambda t: _aware(shares[t].last_served_at) or epoch)
+        # A tenant weighted 0 or less never earns deficit, so its jobs stay held
+        room = {t: self.max_in_flight(t) - in_flight.get(t, 0) if self.weight(t) > 0 else 0 for t in tenants}
+        heads = {t: deque(self._held(t, min(free, room[t]))) if room[t] > 0 else deque() for t in tenants}
+        emptied = {t for t in tenants if len(heads[t]) >= queued[t]}  # Every held job is loaded
+
+        now = datetime.now(timezone.utc)
+        sent = 0
+        while free > 0:
+            eligible = [t for t in tenants if heads[t] and room[t] > 0]
+            if not eligible:
+                break
+            for tenant in eligible:
+                share = shares[tenant]
+                share.deficit = (share.deficit or 0.0) + settings.fair_share_quantum_seconds * self.weight(tenant)
+                queue = heads[tenant]
+                turn = max(1, round(self.weight(tenant)))
+                while queue and turn > 0 and free > 0 and room[tenant] > 0:
+                    cost = max(queue[0].estimated_seconds or 0.0, 1.0)
+                    if cost > share.deficit:
+                        break
+                    job = queue.popleft()
+                    try:
+                        release(job)
+                    except Exception as e:
+                        logger.error("Could not dispatch job %s: %s", job.id, e)
+                        self.db.commit()
+                        return sent
+                    share.deficit -= cost
+                    share.last_served_at = now
+                    free -= 1
+                    room[tenant] -= 1
+                    turn -= 1
+                    sent += 1
+                if free <= 0:
+                    break
+
+        # A tenant whose queue emptied starts from zero next time, as in DRR
+        for tenant in emptied:
+            if not heads[tenant]:
+                shares[tenant].deficit = 0.0
+        self.db.commit()
+        return sent
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Queue depth, running jobs and wait times per tenant"""
+        now = datetime.now(timezone.utc)
+        queued, in_flight = self.queued(), self.in_flight()
+
+        oldest = {tenant or DEFAULT_TENANT: created_at for tenant, created_at in self.db.query(
+            Job.tenant, func.min(Job.created_at)
+        ).filter(
+            *HELD
+        ).group_by(Job.tenant).all()}
+        waits = {}
+        for tenant, created_at, dispatched_at in self.db.query(Job.tenant, Job.created_at, Job.dispatched_at).filter(
+            Job.dispatched_at >= now - WAIT_WINDOW
+        ).all():
+            waits.setdefault(tenant or DEFAULT_TENANT, []).append(
+                max((_aware(dispatched_at) - _aware(created_at)).total_seconds(), 0.0))
+
+        stats = []
+        for tenant in sorted(set(queued) | set(in_flight) | set(waits)):
+            oldest_at = _aware(oldest.get(tenant))
+            stats.append({
+                "tenant": tenant,
+                "weight": self.weight(tenant),
+                "max_in_flight": self.max_in_flight(tenant),
+                "queued": queued.get(tenant, 0),
+                "in_flight": in_flight.get(tenant, 0),
+                "oldest_wait_seconds": (now - oldest_at).total_seconds() if oldest_at else 0.0,
+                "average_wait_seconds": sum(waits[tenant]) / len(waits[tenant]) if tenant in waits else 0.0,
+            })
+        return stats
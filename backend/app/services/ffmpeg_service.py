@@ -1,20 +1,222 @@
 import subprocess
 import json
 import os
-from typing import Dict, Any, Optional, List
+import re
+import tempfile
+from typing import Callable, Dict, Any, Optional, List
 from pathlib import Path
+from pydantic import BaseModel
 from app.config.settings import settings
+from app.services.encoding_profiles import EncodingProfile, get_encoding_profile, CODECS
+from app.services.storage_service import StorageService
+
+
+# Rendition ladder used for quality generation
+QUALITY_SETTINGS = {
+    "1080p": {"height": "1080", "bitrate": "5000k", "audio_bitrate": "128k"},
+    "720p": {"height": "720", "bitrate": "2500k", "audio_bitrate": "128k"},
+    "480p": {"height": "480", "bitrate": "1000k", "audio_bitrate": "96k"},
+    "360p": {"height": "360", "bitrate": "500k", "audio_bitrate": "64k"}
+}
+
+# A source may exceed a rung's bitrate by this factor and still be remuxed
+BITRATE_TOLERANCE = 1.1
+
+# Containers whose index can be moved to the front for progressive playback
+FASTSTART_EXTENSIONS = (".mp4", ".mov", ".m4v")
+
+
+def _kbps(value) -> Optional[int]:
+    """Convert an ffprobe bit_rate (bps) or ladder bitrate ("2500k") to kbps"""
+    if value in (None, "", "N/A"):
+        return None
+    value = str(value)
+    if value.endswith("k"):
+        return int(value[:-1])
+    return int(value) // 1000
+
+
+def sample_windows(duration: float, count: int, length: float) -> List[tuple]:
+    """Evenly spaced (start, length) windows across a title"""
+    if duration <= length:
+        return [(0.0, duration)]
+    
+    windows = []
+    for i in range(count):
+        center = duration * (i + 0.5) / count
+        start = min(max(center - length / 2, 0.0), duration - length)
+        windows.append((round(start, 3), length))
+    return windows
+
+
+def crop_filter(crop: Optional[Dict[str, int]]) -> Optional[str]:
+    """ffmpeg crop filter for a stored crop rectangle"""
+    if not crop:
+        return None
+    return f"crop={crop['width']}:{crop['height']}:{crop['x']}:{crop['y']}"
+
+
+def adjust_position_for_crop(position: tuple, crop: Optional[Dict[str, int]]) -> tuple:
+    """Map overlay coordinates given on the source frame onto the cropped frame"""
+    if not crop:
+        return position
+    x, y = position
+    x = min(max(int(x) - crop["x"], 0), crop["width"] - 1)
+    y = min(max(int(y) - crop["y"], 0), crop["height"] - 1)
+    return (x, y)
+
+
+# Watermark placement as overlay coordinates
+WATERMARK_POSITIONS = {
+    "top-left": "10:10",
+    "top-right": "W-w-10:10",
+    "bottom-left": "10:H-h-10",
+    "bottom-right": "W-w-10:H-h-10",
+    "center": "(W-w)/2:(H-h)/2"
+}
+
+# Languages rendered through an ASS subtitle file for proper shaping
+UNICODE_LANGUAGES = ["hindi", "tamil", "telugu", "bengali", "gujarati", "marathi", "kannada", "malayalam", "punjabi", "odia"]
+
+
+def faststart_args(output_path: str) -> List[str]:
+    """Muxer flags placing the MP4 index before the media so playback can start early"""
+    if Path(output_path).suffix.lower() in FASTSTART_EXTENSIONS:
+        return ["-movflags", "+faststart"]
+    return []
+
+
+def _scaled_width(width: int, height: int, target_height: int) -> int:
+    """Width produced by scale=-2:<target_height>"""
+    if not height:
+        return 0
+    # Same as ffmpeg: rescale to half width rounding half up, then double
+    return int(width * target_height / (height * 2) + 0.5) * 2
+
+
+class EncodeResult(BaseModel):
+    """What an ffmpeg run wrote, collected while it ran instead of probing the file afterwards.
+
+    Resolution and frame rate come from ffmpeg's output header, duration and
+    frame count from the progress stream, and size from the finished file.
+    """
+    path: str
+    format: Optional[str] = None
+    size: int = 0
+    duration: float = 0.0
+    resolution: Optional[str] = None
+    fps: Optional[float] = None
+    bitrate: int = 0
+    frames: Optional[int] = None
+    speed: Optional[float] = None  # Realtime multiple over the whole run
+    
+    @property
+    def complete(self) -> bool:
+        """Whether every field of ``get_video_metadata`` could be filled"""
+        return bool(self.format and self.size and self.duration and self.resolution and self.fps)
+    
+    def metadata(self) -> Dict[str, Any]:
+        """Same shape as ``FFmpegService.get_video_metadata``"""
+        return {
+            "duration": self.duration,
+            "size": self.size,
+            "format": self.format,
+            "resolution": self.resolution,
+            "fps": self.fps,
+            "bitrate": self.bitrate
+        }
+
+
+def parse_outputs(stderr: str) -> List[Dict[str, Any]]:
+    """Output files with their container, video resolution and frame rate from ffmpeg's log"""
+    outputs = []
+    for match in re.finditer(r"^Output #\d+, ([\w,]+), to '(.*)':\n((?:[ \t].*\n?)*)", stderr, re.M):
+        container, path, details = match.groups()
+        video = re.search(r"Stream #\d+:\d+.*: Video: (.*)", details)
+        size = re.search(r"[ ,](\d{2,5})x(\d{2,5})[ ,\]]", video.group(1)) if video else None
+        fps = re.search(r"([\d.]+) fps", video.group(1)) if video else None
+        outputs.append({
+            "format": container,
+            "path": path,
+            "resolution": f"{size.group(1)}x{size.group(2)}" if size else None,
+            "fps": float(fps.group(1)) if fps else None
+        })
+    return outputs
+
+
+# ``ffmpeg -version`` banners by binary path, read once per process
+_encoder_versions: Dict[str, str] = {}
+
+
+class JobCancelled(Exception):
+    """The job was cancelled while it ran; its ffmpeg child has been stopped"""
 
 
 class FFmpegService:
     """Service for handling FFmpeg operations"""
     
-    def __init__(self):
+    def __init__(self, cancelled: Optional[Callable[[], bool]] = None):
         self.ffmpeg_path = settings.ffmpeg_path
         self.ffprobe_path = settings.ffprobe_path
+        self.storage = StorageService()
+        # Polled while ffmpeg runs; returning True stops the encode
+        self.cancelled = cancelled
     
-    def get_video_metadata(self, video_path: str) -> Dict[str, Any]:
-        """Extract video metadata using ffprobe"""
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if the job this service works for was cancelled"""
+        if self.cancelled and self.cancelled():
+            raise JobCancelled()
+    
+    def _stop(self, process: subprocess.Popen) -> None:
+        """Kill ffmpeg if it is still running.
+
+        SIGTERM would let x264 drain its lookahead for seconds; the output
+        is a scratch file that is thrown away, so there is nothing to save.
+        """
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    
+    def run(self, cmd: List[str], text: bool = False) -> subprocess.CompletedProcess:
+        """``subprocess.run(cmd, check=True, capture_output=True)`` that stops when the job is cancelled.
+
+        Output is spooled to temporary files while the process is polled,
+        so a cancelled encode frees its CPU within about a second.
+        """
+        mode = "w+" if text else "w+b"
+        with tempfile.TemporaryFile(mode=mode) as stdout, tempfile.TemporaryFile(mode=mode) as stderr:
+            process = subprocess.Popen(cmd, stdout=stdout, stderr=stderr, text=text)
+            try:
+                while True:
+                    try:
+                        process.wait(timeout=0.5)
+                        break
+                    except subprocess.TimeoutExpired:
+                        self.check_cancelled()
+            finally:
+                self._stop(process)
+            stdout.seek(0)
+            stderr.seek(0)
+            result = subprocess.CompletedProcess(cmd, process.returncode, stdout.read(), stderr.read())
+        result.check_returncode()
+        return result
+    
+    def encoder_version(self) -> str:
+        """First line of ``ffmpeg -version``; part of result cache keys"""
+        if self.ffmpeg_path not in _encoder_versions:
+            try:
+                result = subprocess.run([self.ffmpeg_path, "-version"], capture_output=True, text=True, check=True)
+                _encoder_versions[self.ffmpeg_path] = result.stdout.splitlines()[0]
+            except (OSError, subprocess.CalledProcessError, IndexError):
+                return "unknown"
+        return _encoder_versions[self.ffmpeg_path]
+    
+    def probe(self, video_path: str) -> Dict[str, Any]:
+        """Return the full ffprobe format and stream data for a file.
+
+        A file ffprobe cannot read raises ValueError: it is bad input, which
+        a retry would only fail on again.
+        """
         try:
             cmd = [
                 self.ffprobe_path,
@@ -26,7 +228,14 @@ class FFmpegService:
             ]
             
             result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            metadata = json.loads(result.stdout)
+            return json.loads(result.stdout)
+        except subprocess.CalledProcessError as e:
+            raise ValueError(f"FFprobe error: {e.stderr}")
+    
+    def get_video_metadata(self, video_path: str) -> Dict[str, Any]:
+        """Extract video metadata using ffprobe"""
+        try:
+            metadata = self.probe(video_path)
             
             # Extract relevant information
             video_stream = next(
@@ -47,210 +256,475 @@ class FFmpegService:
                 "fps": eval(video_stream.get("r_frame_rate", "0/1")),
                 "bitrate": int(format_info.get("bit_rate", 0))
             }
-        except subprocess.CalledProcessError as e:
-            raise Exception(f"FFprobe error: {e.stderr}")
+        except (ValueError, KeyError, TypeError, ZeroDivisionError) as e:
+            # Unreadable, corrupt or incomplete input stays a ValueError, so tasks do not retry it
+            raise ValueError(f"Error extracting metadata: {str(e)}") from e
         except Exception as e:
             raise Exception(f"Error extracting metadata: {str(e)}")
     
     def generate_thumbnail(self, video_path: str, output_path: str, timestamp: float = 1.0) -> str:
         """Generate thumbnail from video"""
         try:
-            cmd = [
-                self.ffmpeg_path,
-                "-i", video_path,
-                "-ss", str(timestamp),
-                "-vframes", "1",
-                "-q:v", "2",
-                "-y",  # Overwrite output file
-                output_path
-            ]
-            
-            subprocess.run(cmd, check=True, capture_output=True)
+            with self.storage.staged_outputs(output_path) as (scratch_path,):
+                cmd = [
+                    self.ffmpeg_path,
+                    "-i", video_path,
+                    "-ss", str(timestamp),
+                    "-vframes", "1",
+                    "-q:v", "2",
+                    "-y",  # Overwrite output file
+                    scratch_path
+                ]
+                
+                self.run(cmd)
             return output_path
         except subprocess.CalledProcessError as e:
             raise Exception(f"Thumbnail generation failed: {e.stderr}")
     
-    def trim_video(self, input_path: str, output_path: str, start_time: float, end_time: float) -> str:
+    def trim_video(self, input_path: str, output_path: str, start_time: float, end_time: float) -> EncodeResult:
         """Trim video to specified time range"""
         try:
             duration = end_time - start_time
-            cmd = [
-                self.ffmpeg_path,
-                "-i", input_path,
-                "-ss", str(start_time),
-                "-t", str(duration),
-                "-c", "copy",  # Copy without re-encoding for speed
-                "-avoid_negative_ts", "make_zero",
-                "-y",
-                output_path
-            ]
-            
-            subprocess.run(cmd, check=True, capture_output=True)
-            return output_path
+            with self.storage.staged_outputs(output_path) as (scratch_path,):
+                cmd = [
+                    self.ffmpeg_path,
+                    "-i", input_path,
+                    "-ss", str(start_time),
+                    "-t", str(duration),
+                    "-c", "copy",  # Copy without re-encoding for speed
+                    "-avoid_negative_ts", "make_zero",
+                    *faststart_args(output_path),
+                    "-y",
+                    scratch_path
+                ]
+                
+                result = self.run_with_progress(cmd, duration)[0]
+            return result.model_copy(update={"path": output_path})
         except subprocess.CalledProcessError as e:
             raise Exception(f"Video trimming failed: {e.stderr}")
     
+    def text_overlay_filter(self, text: str, position: tuple, font_size: int = 24,
+                            font_color: str = "white", language: str = "en") -> tuple:
+        """Video filter drawing text at a position.
+
+        Returns ``(filter, subtitle_file)``; the caller removes the temporary
+        subtitle file (``None`` for drawtext) once the encode is done.
+        """
+        # Get font path based on language
+        font_path = self._get_font_path(language)
+        
+        x, y = position
+        
+        # For Hindi and other Unicode languages, use a different approach
+        if language in UNICODE_LANGUAGES:
+            try:
+                # Try subtitle approach first (better Unicode support)
+                subtitle_file = self._create_subtitle_file(text, font_path, font_size, font_color, x, y)
+                return f"subtitles={subtitle_file}", subtitle_file
+            except Exception as e:
+                # Fallback to drawtext with proper font path escaping
+                print(f"Subtitle approach failed, using drawtext fallback: {e}")
+                escaped_text = text.replace("'", "\\'").replace(":", "\\:")
+                # Escape Windows path separators for FFmpeg
+                escaped_font_path = font_path.replace("\\", "\\\\").replace(":", "\\:")
+                return f"drawtext=text='{escaped_text}':fontfile='{escaped_font_path}':fontsize={font_size}:x={x}:y={y}:fontcolor={font_color}", None
+        
+        # Standard text overlay for English
+        escaped_text = text.replace("'", "\\'").replace(":", "\\:")
+        return f"drawtext=text='{escaped_text}':fontfile={font_path}:fontsize={font_size}:x={x}:y={y}:fontcolor={font_color}", None
+    
     def add_text_overlay(self, input_path: str, output_path: str, text: str, 
                         position: tuple, font_size: int = 24, 
-                        font_color: str = "white", language: str = "en") -> str:
-        """Add text overlay to video"""
+                        font_color: str = "white", language: str = "en",
+                        profile: Optional[EncodingProfile] = None,
+                        crop: Optional[Dict[str, int]] = None) -> EncodeResult:
+        """Add text overlay to video; position is on the (cropped) output frame"""
+        video_filter, subtitle_file = self.text_overlay_filter(text, position, font_size, font_color, language)
         try:
-            # Get font path based on language
-            font_path = self._get_font_path(language)
-            
-            x, y = position
-            
-            # For Hindi and other Unicode languages, use a different approach
-            if language in ["hindi", "tamil", "telugu", "bengali", "gujarati", "marathi", "kannada", "malayalam", "punjabi", "odia"]:
-                try:
-                    # Try subtitle approach first (better Unicode support)
-                    subtitle_file = self._create_subtitle_file(text, font_path, font_size, font_color, x, y)
-                    
-                    cmd = [
-                        self.ffmpeg_path,
-                        "-i", input_path,
-                        "-vf", f"subtitles={subtitle_file}",
-                        "-c:a", "copy",
-                        "-y",
-                        output_path
-                    ]
-                except Exception as e:
-                    # Fallback to drawtext with proper font path escaping
-                    print(f"Subtitle approach failed, using drawtext fallback: {e}")
-                    escaped_text = text.replace("'", "\\'").replace(":", "\\:")
-                    # Escape Windows path separators for FFmpeg
-                    escaped_font_path = font_path.replace("\\", "\\\\").replace(":", "\\:")
-                    
-                    cmd = [
-                        self.ffmpeg_path,
-                        "-i", input_path,
-                        "-vf", f"drawtext=text='{escaped_text}':fontfile='{escaped_font_path}':fontsize={font_size}:x={x}:y={y}:fontcolor={font_color}",
-                        "-c:a", "copy",
-                        "-y",
-                        output_path
-                    ]
-            else:
-                # Standard text overlay for English
-                escaped_text = text.replace("'", "\\'").replace(":", "\\:")
-                cmd = [
-                    self.ffmpeg_path,
-                    "-i", input_path,
-                    "-vf", f"drawtext=text='{escaped_text}':fontfile={font_path}:fontsize={font_size}:x={x}:y={y}:fontcolor={font_color}",
-                    "-c:a", "copy",
-                    "-y",
-                    output_path
-                ]
+            if crop:
+                video_filter = f"{crop_filter(crop)},{video_filter}"
             
-            subprocess.run(cmd, check=True, capture_output=True)
-            
-            # Clean up temporary subtitle file if it was created
-            if language in ["hindi", "tamil", "telugu", "bengali", "gujarati", "marathi", "kannada", "malayalam", "punjabi", "odia"]:
-                import os
-                try:
-                    if 'subtitle_file' in locals() and os.path.exists(subtitle_file):
-                        os.remove(subtitle_file)
-                except:
-                    pass  # Ignore cleanup errors
-            
-            return output_path
+            return self._encode(["-i", input_path], output_path, profile, filter_args=["-vf", video_filter])
         except subprocess.CalledProcessError as e:
             raise Exception(f"Text overlay failed: {e.stderr}")
+        finally:
+            # Clean up temporary subtitle file if it was created
+            if subtitle_file and os.path.exists(subtitle_file):
+                os.remove(subtitle_file)
     
     def add_image_overlay(self, input_path: str, output_path: str, overlay_path: str,
-                         position: tuple, size: Optional[tuple] = None) -> str:
-        """Add image overlay to video"""
+                         position: tuple, size: Optional[tuple] = None,
+                         profile: Optional[EncodingProfile] = None,
+                         crop: Optional[Dict[str, int]] = None) -> EncodeResult:
+        """Add image overlay to video; position is on the (cropped) output frame"""
         try:
             x, y = position
+            base = f"[0:v]{crop_filter(crop)}[base];" if crop else ""
+            base_label = "[base]" if crop else "[0:v]"
             if size:
                 width, height = size
-                filter_complex = f"[1:v]scale={width}:{height}[scaled];[0:v][scaled]overlay={x}:{y}"
+                filter_complex = f"{base}[1:v]scale={width}:{height}[scaled];{base_label}[scaled]overlay={x}:{y}"
             else:
-                filter_complex = f"[0:v][1:v]overlay={x}:{y}"
+                filter_complex = f"{base}{base_label}[1:v]overlay={x}:{y}"
             
-            cmd = [
-                self.ffmpeg_path,
-                "-i", input_path,
-                "-i", overlay_path,
-                "-filter_complex", filter_complex,
-                "-c:a", "copy",
-                "-y",
-                output_path
-            ]
-            
-            subprocess.run(cmd, check=True, capture_output=True)
-            return output_path
+            return self._encode(
+                ["-i", input_path, "-i", overlay_path],
+                output_path,
+                profile,
+                filter_args=["-filter_complex", filter_complex]
+            )
         except subprocess.CalledProcessError as e:
             raise Exception(f"Image overlay failed: {e.stderr}")
     
     def add_watermark(self, input_path: str, output_path: str, watermark_path: str,
-                     position: str = "bottom-right", opacity: float = 0.5) -> str:
+                     position: str = "bottom-right", opacity: float = 0.5,
+                     profile: Optional[EncodingProfile] = None,
+                     crop: Optional[Dict[str, int]] = None) -> EncodeResult:
         """Add watermark to video"""
         try:
             # Calculate position based on string
-            position_map = {
-                "top-left": "10:10",
-                "top-right": "W-w-10:10",
-                "bottom-left": "10:H-h-10",
-                "bottom-right": "W-w-10:H-h-10",
-                "center": "(W-w)/2:(H-h)/2"
-            }
+            pos = WATERMARK_POSITIONS.get(position, WATERMARK_POSITIONS["bottom-right"])
             
-            pos = position_map.get(position, "W-w-10:H-h-10")
+            return self._encode(
+                ["-i", input_path, "-i", watermark_path],
+                output_path,
+                profile,
+                filter_args=["-filter_complex", f"[1:v]format=rgba,colorchannelmixer=aa={opacity}[watermark];[0:v]{crop_filter(crop) or 'null'}[base];[base][watermark]overlay={pos}"]
+            )
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Watermark addition failed: {e.stderr}")
+    
+    def detect_crop(self, input_path: str, windows: List[tuple],
+                    width: int, height: int) -> Dict[str, int]:
+        """Detect letterbox/pillarbox bars with cropdetect over sampled windows.
+
+        The union of the per-window rectangles is returned so that content
+        visible in any window is never cropped away.
+        """
+        rects = []
+        for start, length in windows:
+            try:
+                cmd = [
+                    self.ffmpeg_path,
+                    "-ss", str(start),
+                    "-t", str(length),
+                    "-i", input_path,
+                    "-vf", "cropdetect=limit=24:round=2",
+                    "-an",
+                    "-f", "null",
+                    "-"
+                ]
+                result = self.run(cmd, text=True)
+            except subprocess.CalledProcessError as e:
+                raise Exception(f"Crop detection failed: {e.stderr}")
             
-            cmd = [
+            # cropdetect refines its estimate as it sees frames; the last one is the settled value
+            matches = re.findall(r"crop=(\d+):(\d+):(\d+):(\d+)", result.stderr)
+            if matches:
+                rects.append(tuple(int(v) for v in matches[-1]))
+        
+        if not rects:
+            return {"width": width, "height": height, "x": 0, "y": 0}
+        
+        left = min(r[2] for r in rects)
+        top = min(r[3] for r in rects)
+        right = max(r[2] + r[0] for r in rects)
+        bottom = max(r[3] + r[1] for r in rects)
+        
+        return {"width": right - left, "height": bottom - top, "x": left, "y": top}
+    
+    def measure_sample(self, input_path: str, output_path: str, start: float, length: float,
+                       height: int, crf: int = 23, preset: str = "veryfast") -> Dict[str, float]:
+        """CRF test-encode one segment and measure its bitrate, SSIM and PSNR against the source"""
+        try:
+            encode_cmd = [
                 self.ffmpeg_path,
+                "-ss", str(start),
+                "-t", str(length),
                 "-i", input_path,
-                "-i", watermark_path,
-                "-filter_complex", f"[1:v]format=rgba,colorchannelmixer=aa={opacity}[watermark];[0:v][watermark]overlay={pos}",
-                "-c:a", "copy",
+                "-vf", f"scale=-2:{height}",
+                "-c:v", "libx264",
+                "-preset", preset,
+                "-crf", str(crf),
+                "-an",
                 "-y",
                 output_path
             ]
+            self.run(encode_cmd)
             
-            subprocess.run(cmd, check=True, capture_output=True)
-            return output_path
+            # Compare against the source segment scaled to the same height
+            compare_cmd = [
+                self.ffmpeg_path,
+                "-i", output_path,
+                "-ss", str(start),
+                "-t", str(length),
+                "-i", input_path,
+                "-lavfi", f"[1:v]scale=-2:{height}[ref];[0:v]split[d0][d1];[ref]split[r0][r1];[d0][r0]ssim;[d1][r1]psnr",
+                "-f", "null",
+                "-"
+            ]
+            result = self.run(compare_cmd, text=True)
+            
+            ssim = re.search(r"SSIM .*All:([\d.]+)", result.stderr)
+            psnr = re.search(r"PSNR .*average:([\d.]+|inf)", result.stderr)
+            size = os.path.getsize(output_path)
+            
+            return {
+                "start": start,
+                "kbps": size * 8 / 1000 / length,
+                "ssim": float(ssim.group(1)) if ssim else None,
+                "psnr": float(psnr.group(1)) if psnr else None
+            }
         except subprocess.CalledProcessError as e:
-            raise Exception(f"Watermark addition failed: {e.stderr}")
+            raise Exception(f"Complexity sample at {start}s failed: {e.stderr}")
+        finally:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+    
+    def plan_quality_versions(self, probe: Dict[str, Any], qualities: List[str],
+                              ladder: Optional[Dict[str, str]] = None,
+                              crop: Optional[Dict[str, int]] = None,
+                              codec: str = "h264") -> Dict[str, Dict[str, Any]]:
+        """Decide per rung whether to skip, remux or transcode, based on full probe data.
+
+        ``ladder`` maps rungs to per-title bitrates that replace the fixed ones.
+        With a ``crop`` the cropped frame is the source, and remuxing is ruled out.
+        ``codec`` selects the output codec; its bitrate factor scales the rungs.
+        """
+        codec_spec = CODECS[codec]
+        streams = probe.get("streams", [])
+        video_stream = next((s for s in streams if s.get("codec_type") == "video"), None)
+        audio_stream = next((s for s in streams if s.get("codec_type") == "audio"), None)
+        if not video_stream:
+            raise ValueError("No video stream found")
+        
+        source_width = int(crop["width"]) if crop else int(video_stream.get("width", 0))
+        source_height = int(crop["height"]) if crop else int(video_stream.get("height", 0))
+        # Stream bitrate is missing for some containers; fall back to the overall bitrate
+        source_video_kbps = _kbps(video_stream.get("bit_rate") or probe.get("format", {}).get("bit_rate"))
+        source_audio_kbps = _kbps(audio_stream.get("bit_rate")) if audio_stream else None
+        
+        plans = {}
+        for quality in qualities:
+            if quality not in QUALITY_SETTINGS:
+                continue
+            
+            target = QUALITY_SETTINGS[quality]
+            target_height = int(target["height"])
+            target_kbps = int(_kbps((ladder or {}).get(quality, target["bitrate"])) * codec_spec["bitrate_factor"])
+            target_audio_kbps = _kbps(target["audio_bitrate"])
+            
+            if source_height < target_height:
+                plans[quality] = {
+                    "action": "skip",
+                    "reason": f"source height {source_height} is below {target_height}, not upscaling"
+                }
+                continue
+            
+            video_fits = (
+                not crop
+                and video_stream.get("codec_name") == codec
+                and video_stream.get("pix_fmt", "yuv420p") == "yuv420p"
+                and source_height == target_height
+                and source_video_kbps is not None
+                and source_video_kbps <= target_kbps * BITRATE_TOLERANCE
+            )
+            
+            if not audio_stream:
+                audio_codec = None
+            elif (
+                audio_stream.get("codec_name") == codec_spec["audio_codec"]
+                and int(audio_stream.get("channels", 2)) <= 2
+                and (source_audio_kbps is None or source_audio_kbps <= target_audio_kbps * BITRATE_TOLERANCE)
+            ):
+                audio_codec = "copy"
+            else:
+                audio_codec = codec_spec["audio_encoder"]
+            
+            if video_fits:
+                plans[quality] = {
+                    "action": "remux",
+                    "codec": codec,
+                    "video_codec": "copy",
+                    "audio_codec": audio_codec,
+                    "resolution": f"{source_width}x{source_height}",
+                    "bitrate": source_video_kbps,
+                    "reason": f"source is {codec} at target resolution within bitrate budget"
+                }
+            else:
+                plans[quality] = {
+                    "action": "transcode",
+                    "codec": codec,
+                    "video_codec": settings.av1_encoder if codec == "av1" else codec_spec["encoder"],
+                    "audio_codec": audio_codec,
+                    "resolution": f"{_scaled_width(source_width, source_height, target_height)}x{target_height}",
+                    "bitrate": target_kbps,
+                    "target_bitrate": f"{target_kbps}k",
+                    "crop": crop,
+                    "reason": "cropping bars" if crop else "source codec, resolution or bitrate does not fit the rung"
+                }
+        
+        return plans
     
     def generate_quality_versions(self, input_path: str, output_dir: str, 
-                                 qualities: List[str]) -> Dict[str, str]:
-        """Generate multiple quality versions of video"""
+                                 qualities: List[str],
+                                 plans: Optional[Dict[str, Dict[str, Any]]] = None,
+                                 profile: Optional[EncodingProfile] = None,
+                                 codec: str = "h264") -> Dict[str, str]:
+        """Generate multiple quality versions of video, remuxing or skipping rungs where possible"""
         results = {}
+        codec_spec = CODECS[codec]
         
-        quality_settings = {
-            "1080p": {"height": "1080", "bitrate": "5000k", "audio_bitrate": "128k"},
-            "720p": {"height": "720", "bitrate": "2500k", "audio_bitrate": "128k"},
-            "480p": {"height": "480", "bitrate": "1000k", "audio_bitrate": "96k"},
-            "360p": {"height": "360", "bitrate": "500k", "audio_bitrate": "64k"}
-        }
+        if plans is None:
+            plans = self.plan_quality_versions(self.probe(input_path), qualities, codec=codec)
         
         for quality in qualities:
-            if quality not in quality_settings:
+            plan = plans.get(quality)
+            if not plan or plan["action"] == "skip":
                 continue
+            self.check_cancelled()
                 
-            settings = quality_settings[quality]
-            output_path = os.path.join(output_dir, f"{quality}.mp4")
+            settings = QUALITY_SETTINGS[quality]
+            # H.264 keeps the original naming; other codecs get their own variant file
+            variant = quality if codec == "h264" else f"{quality}_{codec}"
+            output_path = os.path.join(output_dir, f"{variant}.{codec_spec['container']}")
             
             try:
-                cmd = [
-                    self.ffmpeg_path,
-                    "-i", input_path,
-                    "-vf", f"scale=-2:{settings['height']}",  # -2 preserves aspect ratio
-                    "-c:v", "libx264",
-                    "-b:v", settings["bitrate"],
-                    "-c:a", "aac",
-                    "-b:a", settings["audio_bitrate"],
-                    "-y",
-                    output_path
-                ]
+                if plan["audio_codec"] == "copy":
+                    audio_args = ["-c:a", "copy"]
+                elif plan["audio_codec"]:
+                    audio_args = ["-c:a", plan["audio_codec"], "-b:a", settings["audio_bitrate"]]
+                else:
+                    audio_args = []
                 
-                subprocess.run(cmd, check=True, capture_output=True)
+                if plan["action"] == "remux":
+                    with self.storage.staged_outputs(output_path) as (scratch_path,):
+                        cmd = [
+                            self.ffmpeg_path, "-i", input_path, "-c:v", "copy", *audio_args,
+                            *faststart_args(output_path), "-y", scratch_path
+                        ]
+                        self.run(cmd)
+                else:
+                    self._encode(
+                        ["-i", input_path],
+                        output_path,
+                        profile,
+                        # -2 preserves aspect ratio
+                        filter_args=["-vf", ",".join(f for f in [crop_filter(plan.get("crop")), f"scale=-2:{settings['height']}"] if f)],
+                        audio_args=audio_args,
+                        bitrate=plan.get("target_bitrate", settings["bitrate"]),
+                        codec=codec
+                    )
                 results[quality] = output_path
             except subprocess.CalledProcessError as e:
                 raise Exception(f"Quality {quality} generation failed: {e.stderr}")
         
         return results
     
+    def run_with_progress(self, cmd: List[str], duration: float,
+                          on_progress: Optional[Callable[[float], None]] = None,
+                          stdin=None) -> List[EncodeResult]:
+        """Run an ffmpeg command, reporting the fraction of ``duration`` processed so far.
+
+        Progress comes from ``-progress pipe:1``; stderr is spooled to a temporary
+        file so a chatty encode can never block on a full pipe. Returns one
+        result per file written (null outputs are left out). ``duration`` is
+        the expected output length and caps the measured one, since stream
+        copies report the seek end as their output time. It never stands in
+        for a measurement: an output ffmpeg reported no time for is left at
+        zero duration, so it is probed rather than trusted.
+        """
+        cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+        stats = {}
+        with tempfile.TemporaryFile(mode="w+") as stderr:
+            process = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr, text=True)
+            try:
+                # ffmpeg writes a progress block every half second, which doubles as the cancellation poll
+                for line in process.stdout:
+                    key, _, value = line.strip().partition("=")
+                    stats[key] = value
+                    if key in ("out_time_us", "out_time_ms") and value.isdigit() and on_progress and duration:
+                        on_progress(min(int(value) / 1_000_000 / duration, 1.0))
+                    if key == "progress":
+                        self.check_cancelled()
+                process.wait()
+            finally:
+                self._stop(process)
+            
+            stderr.seek(0)
+            log = stderr.read()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, cmd, stderr=log)
+        
+        out_time = stats.get("out_time_us", stats.get("out_time_ms", ""))
+        frames = int(stats["frame"]) if stats.get("frame", "").isdigit() else None
+        speed = stats.get("speed", "").rstrip("x")
+        
+        results = []
+        for output in parse_outputs(log):
+            if output["format"] == "null" or not os.path.exists(output["path"]):
+                continue
+            # out_time stops at the last frame's timestamp, so prefer counting whole frames
+            if frames and output["fps"]:
+                measured = frames / output["fps"]
+            else:
+                measured = int(out_time) / 1_000_000 if out_time.isdigit() else 0.0
+            output_duration = min(measured, duration) if duration and measured else measured
+            size = os.path.getsize(output["path"])
+            results.append(EncodeResult(
+                path=output["path"],
+                format=output["format"],
+                size=size,
+                duration=round(output_duration, 3),
+                resolution=output["resolution"],
+                fps=output["fps"],
+                bitrate=int(size * 8 / output_duration) if output_duration else 0,
+                frames=frames,
+                speed=float(speed) if re.fullmatch(r"[\d.e+-]+", speed or "") else None
+            ))
+        return results
+    
+    def _encode(self, input_args: List[str], output_path: str,
+                profile: Optional[EncodingProfile] = None,
+                filter_args: Optional[List[str]] = None,
+                audio_args: Optional[List[str]] = None,
+                bitrate: Optional[str] = None,
+                codec: str = "h264",
+                duration: Optional[float] = None) -> EncodeResult:
+        """Run a video encode with the given profile, as two passes when the profile asks for it"""
+        profile = profile or get_encoding_profile()
+        filter_args = filter_args or []
+        audio_args = ["-c:a", "copy"] if audio_args is None else audio_args
+        
+        with self.storage.staged_outputs(output_path) as (scratch_path,):
+            if profile.uses_two_pass(bitrate, codec):
+                passlog = f"{scratch_path}.passlog"
+                try:
+                    first_pass = [
+                        self.ffmpeg_path, *input_args, *filter_args,
+                        *profile.video_args(bitrate, pass_number=1, passlog=passlog, codec=codec),
+                        "-an", "-f", "null", "-y", os.devnull
+                    ]
+                    self.run(first_pass)
+                    
+                    second_pass = [
+                        self.ffmpeg_path, *input_args, *filter_args,
+                        *profile.video_args(bitrate, pass_number=2, passlog=passlog, codec=codec),
+                        *audio_args, *faststart_args(output_path), "-y", scratch_path
+                    ]
+                    result = self.run_with_progress(second_pass, duration)[0]
+                finally:
+                    for stats_file in Path(scratch_path).parent.glob(f"{Path(passlog).name}*"):
+                        stats_file.unlink(missing_ok=True)
+            else:
+                cmd = [
+                    self.ffmpeg_path, *input_args, *filter_args,
+                    *profile.video_args(bitrate, codec=codec),
+                    *audio_args, *faststart_args(output_path), "-y", scratch_path
+                ]
+                result = self.run_with_progress(cmd, duration)[0]
+        return result.model_copy(update={"path": output_path})
+    
     def _get_font_path(self, language: str) -> str:
         """Get font path for specific language"""
         # Get the absolute path to the backend directory
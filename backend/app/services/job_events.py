@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional
+import redis
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import Video
+from app.services.fair_share import FINISHED_STATUSES, tenant_for
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def _redis() -> redis.Redis:
+    global _client
+    if _client is None:
+        # Short timeouts: an unreachable Redis must not hold up the job that reports
+        _client = redis.Redis.from_url(settings.redis_url, socket_connect_timeout=1, socket_timeout=1)
+    return _client
+
+
+def _last_key(job_id) -> str:
+    return f"{settings.job_events_channel}:last:{job_id}"
+
+
+def event_for(job: Job, video: Optional[Video] = None, **fields) -> Dict[str, Any]:
+    """A job's current state as published to subscribers"""
+    if video is None:
+        video = job.video
+    event = {
+        "job_id": str(job.id),
+        "video_id": str(job.video_id) if job.video_id else None,
+        "batch_id": str(job.batch_id) if job.batch_id else None,
+        "tenant": job.tenant or tenant_for(video),
+        "job_type": job.job_type,
+        "status": job.status,
+        "progress": job.progress or 0,
+        "error_message": job.error_message,
+        "result_path": job.result_path,
+        "at": datetime.now(timezone.utc).isoformat()
+    }
+    event.update(fields)
+    return event
+
+
+def publish(event: Dict[str, Any]) -> None:
+    """Send an event to every API process; failures are logged, never raised"""
+    if not settings.job_events_enabled:
+        return
+    try:
+        data = json.dumps(event)
+        pipe = _redis().pipeline(transaction=False)
+        # The last event of a job lets a late subscriber start from its current state
+        pipe.set(_last_key(event["job_id"]), data, ex=settings.job_events_last_ttl_seconds)
+        pipe.publish(settings.job_events_channel, data)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Could not publish the %s event of job %s: %s", event.get("status"), event.get("job_id"), e)
+
+
+def publish_on_commit(db: Session, job: Job, video: Optional[Video] = None, **fields) -> None:
+    """Publish the job's state once the caller's transaction commits; dropped on rollback"""
+    db.info.setdefault("job_events", []).append(event_for(job, video, **fields))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    for job_event in session.info.pop("job_events", ()):
+        publish(job_event)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_events(session: Session) -> None:
+    session.info.pop("job_events", None)
+
+
+def last_event(job_id) -> Optional[Dict[str, Any]]:
+    """The last event published for a job, if it is still kept"""
+    try:
+        data = _redis().get(_last_key(job_id))
+    except Exception as e:
+        logger.warning("Could not read the last event of job %s: %s", job_id, e)
+        return None
+    return json.loads(data) if data else None
+
+
+def is_final(event: Dict[str, Any]) -> bool:
+    return event["status"] in FINISHED_STATUSES
+
+
+class JobEventHub:
+    """Fans the job events of all workers out to the subscribers of this process.
+
+    Each API process holds a single Redis subscription, however many
+    clients are connected, and routes every event to the subscribers of
+    its job, its batch and its tenant. Streaming progress this way reads
+    nothing from the database. A subscriber that falls behind loses its
+    oldest events rather than holding up the others.
+    """
+
+    def __init__(self):
+        self.subscribers = {}  # (kind, key) -> {(loop, queue)}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self) -> None:
+        """Start listening to Redis, once per process"""
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._listen, name="job-event-hub", daemon=True)
+                self.thread.start()
+
+    def _listen(self) -> None:
+        delay = 1.0
+        while True:
+            try:
+                # No socket timeout: the connection idles until an event arrives
+                pubsub = redis.Redis.from_url(settings.redis_url).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(settings.job_events_channel)
+                delay = 1.0
+                for message in pubsub.listen():
+                    self.dispatch(json.loads(message["data"]))
+            except Exception as e:
+                logger.warning("Job event subscription lost, reconnecting in %.0fs: %s", delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def dispatch(self, job_event: Dict[str, Any]) -> None:
+        """Hand an event to every subscriber of its job, batch or tenant"""
+        topics = (("job", job_event["job_id"]), ("batch", job_event.get("batch_id")), ("tenant", job_event.get("tenant")))
+        with self.lock:
+            receivers = [receiver for topic in topics for receiver in self.subscribers.get(topic, ())]
+        for loop, queue in receivers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, job_event)
+            except RuntimeError:
+                pass  # The subscriber's event loop has closed
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, job_event: Dict[str, Any]) -> None:
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(job_event)
+
+    @contextmanager
+    def subscribe(self, kind: str, key: str) -> Iterator[asyncio.Queue]:
+        """A queue receiving the events of one job, batch or tenant while the block runs"""
+        self.start()
+        queue = asyncio.Queue(maxsize=settings.job_events_queue_size)
+        receiver = (asyncio.get_running_loop(), queue)
+        with self.lock:
+            self.subscribers.setdefault((kind, key), set()).add(receiver)
+        try:
+            yield queue
+        finally:
+            with self.lock:
+                receivers = self.subscribers.get((kind, key), set())
+                receivers.discard(receiver)
+                if not receivers:
+                    self.subscribers.pop((kind, key), None)
+
+
+hub = JobEventHub()
@@ -0,0 +1,186 @@
+import logging
+import os
+import socket
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+from app.config.settings import settings
+from app.models.job import Job
+from app.services.fair_share import ACTIVE_STATUSES
+from app.services.ffmpeg_service import JobCancelled
+from app.services.job_events import event_for, publish
+
+logger = logging.getLogger(__name__)
+
+# Leases held by attempts running in this process, by job id
+_held: Dict[str, "JobLease"] = {}
+
+
+class LeaseLost(JobCancelled):
+    """The job was reclaimed from this attempt, which must not publish anything"""
+
+
+def held_lease(job_id) -> Optional["JobLease"]:
+    """Lease of the attempt running ``job_id`` in this process, if any"""
+    return _held.get(str(job_id))
+
+
+def _expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(seconds=settings.job_lease_seconds)
+
+
+class JobLease:
+    """One task attempt's claim on its job, kept alive by a heartbeat thread.
+
+    Only the attempt holding the lease may publish files or complete the
+    job. When a worker dies its lease runs out and ``reap_expired`` gives
+    the job to a new attempt; a slow attempt that comes back finds its
+    token gone and stops without publishing.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = uuid.UUID(str(job_id))
+        self.token = uuid.uuid4().hex
+        self.lost = False
+        self._stop = threading.Event()
+
+    @classmethod
+    def acquire(cls, job_id) -> Optional["JobLease"]:
+        """Take a job's lease and start renewing it; None if the job is finished or a live attempt holds it"""
+        from app.config.database import SessionLocal
+
+        lease = cls(job_id)
+        db = SessionLocal()
+        try:
+            taken = db.query(Job).filter(
+                Job.id == lease.job_id,
+                Job.status.in_(ACTIVE_STATUSES),
+                Job.lease_token.is_(None) | (Job.lease_expires_at < datetime.now(timezone.utc))
+            ).update({
+                "lease_token": lease.token,
+                "lease_owner": f"{socket.gethostname()}:{os.getpid()}",
+                "lease_expires_at": _expiry()
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        if not taken:
+            return None
+
+        _held[str(lease.job_id)] = lease
+        threading.Thread(target=lease._heartbeat, name=f"lease-{lease.job_id}", daemon=True).start()
+        return lease
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(settings.job_heartbeat_seconds):
+            if not self.renew():
+                logger.warning("Lost the lease of job %s; stopping this attempt", self.job_id)
+                return
+
+    def renew(self) -> bool:
+        """Extend the lease; False once the job has been reclaimed"""
+        from app.config.database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            renewed = db.query(Job).filter(
+                Job.id == self.job_id,
+                Job.lease_token == self.token
+            ).update({"lease_expires_at": _expiry()}, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            # A missed beat is covered by the lease length; try again on the next one
+            logger.warning("Could not renew the lease of job %s: %s", self.job_id, e)
+            return not self.lost
+        finally:
+            db.close()
+        if not renewed:
+            self.lost = True
+        return bool(renewed)
+
+    def verify(self) -> None:
+        """Raise LeaseLost unless this attempt still holds the lease; checked before files are published"""
+        if self.lost or not self.renew():
+            raise LeaseLost()
+
+    def fence(self, db: Session) -> None:
+        """Renew the lease in the caller's transaction, raising LeaseLost if the job was reclaimed.
+
+        On Postgres the job row then stays locked until the caller commits,
+        so the reaper cannot take the job between this check and the commit.
+        """
+        held = db.query(Job).filter(
+            Job.id == self.job_id,
+            Job.lease_token == self.token
+        ).update({"lease_expires_at": _expiry()}, synchronize_session=False)
+        if not held:
+            self.lost = True
+            raise LeaseLost()
+
+    def release(self) -> None:
+        """Stop the heartbeat and give the lease up, if this attempt still holds it"""
+        from app.config.database import SessionLocal
+
+        self._stop.set()
+        _held.pop(str(self.job_id), None)
+        db = SessionLocal()
+        try:
+            db.query(Job).filter(
+                Job.id == self.job_id,
+                Job.lease_token == self.token
+            ).update({"lease_token": None, "lease_expires_at": None}, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.warning("Could not release the lease of job %s: %s", self.job_id, e)
+        finally:
+            db.close()
+
+
+def reap_expired(db: Session) -> List[Job]:
+    """Take back jobs whose attempt stopped renewing its lease; returns the jobs to run again.
+
+    Each job is claimed with a compare-and-set on its expired token, so a
+    late renewal, a finishing attempt or a concurrent reaper wins cleanly
+    and the job is never handed out twice. Reclaimed jobs go back to
+    ``pending`` and out of the dispatched set; a job that has lost its
+    worker more than ``max_lease_reclaims`` times is failed instead.
+    """
+    from app.services.checkpoint import Checkpoint
+
+    now = datetime.now(timezone.utc)
+    requeued = []
+    for job in db.query(Job).filter(
+        Job.status.in_(ACTIVE_STATUSES),
+        Job.lease_expires_at < now
+    ).all():
+        reclaims = (job.lease_reclaims or 0) + 1
+        give_up = reclaims > settings.max_lease_reclaims
+        claimed = db.query(Job).filter(
+            Job.id == job.id,
+            Job.lease_token == job.lease_token,
+            Job.lease_expires_at < now
+        ).update({
+            "lease_token": None,
+            "lease_expires_at": None,
+            "lease_reclaims": reclaims,
+            "status": "failed" if give_up else "pending",
+            "error_message": f"Worker {job.lease_owner} stopped renewing its lease",
+            # Back into the scheduler's queue, under the task id it was sent with
+            "dispatched_at": None,
+            "task_id": job.task_id or str(job.id)
+        }, synchronize_session=False)
+        db.commit()
+        if not claimed:
+            continue
+
+        db.refresh(job)
+        publish(event_for(job))
+        if give_up:
+            logger.error("Job %s lost its worker %d times; failing it", job.id, reclaims)
+            Checkpoint(db, job).discard()
+        else:
+            logger.warning("Job %s lost its worker %s; requeueing it", job.id, job.lease_owner)
+            requeued.append(job)
+    return requeued
@@ -0,0 +1,154 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, List
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session, joinedload
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.outbox import OutboxMessage
+
+logger = logging.getLogger(__name__)
+
+# Set when a transaction that added outbox messages commits, waking the relay in this process
+_committed = threading.Event()
+
+
+def enqueue(db: Session, job: Job) -> None:
+    """Have the job's task sent once the caller's transaction commits"""
+    db.add(OutboxMessage(job=job))
+    db.info["outbox"] = True
+
+
+def enqueue_many(db: Session, job_ids: List[Any]) -> None:
+    """``enqueue`` for jobs inserted in bulk, with one insert for all their messages"""
+    if job_ids:
+        db.execute(insert(OutboxMessage), [{"job_id": job_id} for job_id in job_ids])
+        db.info["outbox"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_relay(session: Session) -> None:
+    if session.info.pop("outbox", False):
+        _committed.set()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_messages(session: Session) -> None:
+    session.info.pop("outbox", None)
+
+
+def wait_for_messages(timeout: float) -> bool:
+    """Block until a transaction in this process commits outbox messages, or ``timeout`` passes"""
+    woken = _committed.wait(timeout)
+    _committed.clear()
+    return woken
+
+
+class OutboxRelay:
+    """Hands submitted jobs from the outbox on to Celery in batches.
+
+    The API writes a job and its outbox message in one transaction and
+    never waits on the broker, so a broker outage delays jobs instead of
+    stranding them in ``pending``. Each run takes up to
+    ``outbox_batch_size`` unsent messages, oldest first (on Postgres
+    skipping rows another relay has locked), passes their jobs to
+    ``publish`` and marks them sent in one commit. A batch that fails to
+    publish is retried one message at a time, so a bad message cannot
+    hold up the ones behind it. A message that keeps failing on its own
+    with a permanent error (see ``is_retryable``) is given up after
+    ``outbox_max_attempts`` attempts and its job failed; other failures,
+    such as the broker being down, leave it in the outbox for the next
+    run. Delivery is at least once: a task sent twice runs once, since
+    its second copy finds the job leased or finished.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def unsent(self, limit: int) -> List[OutboxMessage]:
+        # Jobs and videos come with the messages, as publishing needs both
+        query = self.db.query(OutboxMessage).options(
+            joinedload(OutboxMessage.job).joinedload(Job.video)
+        ).filter(
+            OutboxMessage.sent_at.is_(None)
+        ).order_by(OutboxMessage.id).limit(limit)
+        if self.db.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True, of=OutboxMessage)
+        return query.all()
+
+    def relay(self, publish: Callable[[List[Job]], None]) -> int:
+        """Publish one batch; returns how many messages were handed on (sent or given up)"""
+        messages = self.unsent(settings.outbox_batch_size)
+        if not messages:
+            self.db.commit()
+            return 0
+        ids = [message.id for message in messages]
+        try:
+            publish([message.job for message in messages])
+        except Exception as e:
+            self.db.rollback()
+            logger.warning("Could not relay %d outbox messages, retrying them one by one: %s", len(messages), e)
+            return self._relay_each(ids, publish)
+
+        now = datetime.now(timezone.utc)
+        for message in messages:
+            message.sent_at = now
+        self.db.commit()
+        return len(messages)
+
+    def _relay_each(self, ids: List[int], publish: Callable[[List[Job]], None]) -> int:
+        """Publish a failed batch one message per commit, giving up messages that fail permanently"""
+        from app.services.job_events import publish_on_commit
+        from app.tasks.base import is_retryable
+
+        relayed = 0
+        for index, message_id in enumerate(ids):
+            message = self.db.get(OutboxMessage, message_id)
+            try:
+                publish([message.job])
+            except Exception as e:
+                self.db.rollback()
+                if is_retryable(e):
+                    # Not this message's fault (the broker is down, say): the rest wait for the next run
+                    logger.error("Could not relay %d outbox messages: %s", len(ids) - index, e)
+                    self.db.query(OutboxMessage).filter(
+                        OutboxMessage.id.in_(ids[index:])
+                    ).update({
+                        "attempts": OutboxMessage.attempts + 1,
+                        "last_error": str(e)
+                    }, synchronize_session=False)
+                    self.db.commit()
+                    return relayed
+                message = self.db.get(OutboxMessage, message_id)
+                message.attempts += 1
+                message.last_error = f"{type(e).__name__}: {e}"
+                if message.attempts >= settings.outbox_max_attempts:
+                    logger.error("Giving up outbox message %d for job %s: %s", message.id, message.job_id, e)
+                    now = datetime.now(timezone.utc)
+                    message.sent_at = now
+                    job = message.job
+                    job.status = "failed"
+                    job.error_message = f"Could not be queued: {message.last_error}"
+                    job.completed_at = now
+                    publish_on_commit(self.db, job, job.video)
+                    relayed += 1
+                self.db.commit()
+                continue
+            message.sent_at = datetime.now(timezone.utc)
+            self.db.commit()
+            relayed += 1
+        return relayed
+
+    def backlog(self) -> int:
+        """Messages still waiting to be sent"""
+        return self.db.query(OutboxMessage).filter(OutboxMessage.sent_at.is_(None)).count()
+
+    def prune(self) -> int:
+        """Delete messages sent more than ``outbox_retention_hours`` ago"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.outbox_retention_hours)
+        deleted = self.db.query(OutboxMessage).filter(
+            OutboxMessage.sent_at < cutoff
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
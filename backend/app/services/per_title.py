@@ -0,0 +1,93 @@
+import os
+import uuid
+from typing import Any, Dict, List
+from app.config.settings import settings
+from app.services.ffmpeg_service import FFmpegService, QUALITY_SETTINGS, _kbps, sample_windows
+
+# Per-title bitrates stay within these multiples of the fixed ladder
+MIN_LADDER_FACTOR = 0.3
+MAX_LADDER_FACTOR = 1.5
+
+# Bitrate grows roughly with pixel count ** 0.75, i.e. height ** 1.5
+HEIGHT_EXPONENT = 1.5
+
+# Extra bitrate per point of SSIM below the target
+SSIM_CORRECTION = 10
+
+
+class PerTitleAnalyzer:
+    """Content-complexity probe that picks ladder bitrates for one title.
+
+    A few segments are test-encoded at a fixed CRF; the bitrate the encoder
+    needed (and the SSIM it reached) tells us how hard the content is.
+    """
+
+    def __init__(self, ffmpeg: FFmpegService = None):
+        self.ffmpeg = ffmpeg or FFmpegService()
+        self.sample_count = settings.per_title_sample_count
+        self.sample_seconds = settings.per_title_sample_seconds
+        self.crf = settings.per_title_crf
+        self.target_ssim = settings.per_title_target_ssim
+
+    def sample_windows(self, duration: float) -> List[tuple]:
+        """Evenly spaced (start, length) windows across the title"""
+        return sample_windows(duration, self.sample_count, self.sample_seconds)
+
+    def analyze(self, video_path: str, probe: Dict[str, Any], work_dir: str) -> Dict[str, Any]:
+        """Run the sample encodes and return the per-title ladder.
+
+        A probe without a video height or a duration leaves nothing to
+        sample, so the title gets the fixed ladder instead.
+        """
+        video_stream = next((s for s in probe.get("streams", []) if s.get("codec_type") == "video"), {})
+        duration = float(probe.get("format", {}).get("duration") or 0)
+        height = int(video_stream.get("height") or 0)
+        if height <= 0 or duration <= 0:
+            return self.fixed_ladder("no video height or duration in the probe")
+        reference_height = min(int(QUALITY_SETTINGS["720p"]["height"]), height)
+
+        samples = []
+        for index, (start, length) in enumerate(self.sample_windows(duration)):
+            sample_path = os.path.join(work_dir, f"complexity_{uuid.uuid4()}_{index}.mp4")
+            samples.append(
+                self.ffmpeg.measure_sample(video_path, sample_path, start, length, reference_height, self.crf)
+            )
+
+        return self.build_ladder(samples, reference_height)
+
+    def fixed_ladder(self, reason: str) -> Dict[str, Any]:
+        """The fixed ladder's bitrates, for a title that could not be analysed"""
+        return {
+            "rungs": {quality: rung["bitrate"] for quality, rung in QUALITY_SETTINGS.items()},
+            "analysis": {"skipped": reason}
+        }
+
+    def build_ladder(self, samples: List[Dict[str, Any]], reference_height: int) -> Dict[str, Any]:
+        """Turn sample measurements into per-rung bitrates"""
+        if not samples or reference_height <= 0:
+            return self.fixed_ladder("no samples to measure")
+        # The hardest sample drives the ladder so high-motion scenes are not starved
+        reference_kbps = max(sample["kbps"] for sample in samples)
+
+        ssims = [sample["ssim"] for sample in samples if sample.get("ssim") is not None]
+        worst_ssim = min(ssims) if ssims else None
+        if worst_ssim is not None and worst_ssim < self.target_ssim:
+            reference_kbps *= min(1 + (self.target_ssim - worst_ssim) * SSIM_CORRECTION, 2.0)
+
+        rungs = {}
+        for quality, rung in QUALITY_SETTINGS.items():
+            fixed_kbps = _kbps(rung["bitrate"])
+            kbps = reference_kbps * (int(rung["height"]) / reference_height) ** HEIGHT_EXPONENT
+            kbps = min(max(kbps, fixed_kbps * MIN_LADDER_FACTOR), fixed_kbps * MAX_LADDER_FACTOR)
+            rungs[quality] = f"{int(round(kbps / 50.0) * 50)}k"
+
+        return {
+            "rungs": rungs,
+            "analysis": {
+                "crf": self.crf,
+                "reference_height": reference_height,
+                "reference_kbps": round(reference_kbps),
+                "worst_ssim": worst_ssim,
+                "samples": samples
+            }
+        }
@@ -0,0 +1,314 @@
+import os
+import subprocess
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from app.services.encoding_profiles import EncodingProfile, get_encoding_profile
+from app.services.ffmpeg_service import (
+    EncodeResult, FFmpegService, QUALITY_SETTINGS, WATERMARK_POSITIONS, crop_filter, adjust_position_for_crop,
+    faststart_args, _scaled_width
+)
+
+PIPELINE_OPERATIONS = ["trim", "overlay", "watermark", "scale", "ladder"]
+
+# Uncompressed hand-off between piped stages, so no stage pays for an extra encode
+PIPE_OUTPUT_ARGS = ["-c:v", "rawvideo", "-c:a", "pcm_s16le", "-f", "nut", "pipe:1"]
+
+
+class Pipeline:
+    """Ordered chain of operations compiled into ffmpeg filter graphs.
+
+    Trims commute with every frame operation, so they fold into a single
+    input seek. The remaining operations become nodes of one filter graph
+    (``fused``) or, as a fallback, one ffmpeg process each connected by NUT
+    over pipes. Either way no intermediate file is written. A ``ladder``
+    must come last and fans the graph out into one output per rung.
+    """
+
+    def __init__(self, operations: List[Dict[str, Any]], width: int, height: int,
+                 duration: float, crop: Optional[Dict[str, int]] = None,
+                 ffmpeg: FFmpegService = None):
+        self.operations = operations
+        self.crop = crop
+        self.ffmpeg = ffmpeg or FFmpegService()
+        self.width = int(crop["width"]) if crop else width
+        self.height = int(crop["height"]) if crop else height
+        self.start, self.duration = self._fold_trims(operations, duration)
+        self.frame_ops = [op for op in operations if op["type"] != "trim"]
+        self._validate()
+
+    @staticmethod
+    def _fold_trims(operations: List[Dict[str, Any]], duration: float) -> tuple:
+        """Combine trims, each relative to the timeline left by earlier ones"""
+        start, end = 0.0, float(duration)
+        for op in operations:
+            if op["type"] not in PIPELINE_OPERATIONS:
+                raise ValueError(f"Unknown pipeline operation: {op['type']}")
+            if op["type"] != "trim":
+                continue
+            if op.get("start_time") is None or op.get("end_time") is None:
+                raise ValueError("trim needs start_time and end_time")
+            if op["start_time"] >= op["end_time"]:
+                raise ValueError("Start time must be less than end time")
+            if start + op["start_time"] >= end:
+                raise ValueError("Trim starts after the end of the video")
+            start, end = start + op["start_time"], min(start + op["end_time"], end)
+        return start, end - start
+
+    def _validate(self) -> None:
+        """Reject unknown operations, a misplaced ladder and upscaling"""
+        if not self.operations:
+            raise ValueError("Pipeline needs at least one operation")
+
+        height = self.height
+        for index, op in enumerate(self.operations):
+            kind = op["type"]
+            if kind == "overlay" and op.get("overlay_type") not in ("text", "image"):
+                raise ValueError("overlay_type must be 'text' or 'image'")
+            if kind == "watermark" and op.get("watermark_type") not in ("text", "image"):
+                raise ValueError("watermark_type must be 'text' or 'image'")
+            if kind in ("overlay", "watermark"):
+                text = "text" in (op.get("overlay_type"), op.get("watermark_type"))
+                if text and not op.get("text"):
+                    raise ValueError(f"Text is required for a text {kind}")
+                if not text and not op.get("file_path"):
+                    raise ValueError(f"file_path is required for an image {kind}")
+            if kind == "scale":
+                by_quality = op.get("quality") in QUALITY_SETTINGS
+                by_height = not op.get("quality") and op.get("height") and op["height"] > 0 and op["height"] % 2 == 0
+                if not (by_quality or by_height):
+                    raise ValueError("scale needs a known quality or an even height")
+            if kind == "ladder":
+                if index != len(self.operations) - 1:
+                    raise ValueError("ladder must be the last operation")
+                unknown = [q for q in op.get("qualities") or [] if q not in QUALITY_SETTINGS]
+                if unknown or not op.get("qualities"):
+                    raise ValueError(f"ladder needs qualities from: {', '.join(QUALITY_SETTINGS)}")
+            if kind == "scale":
+                target = self._scale_height(op)
+                if target > height:
+                    raise ValueError(f"Cannot scale up from {height}p to {target}p")
+                height = target
+        if not self.outputs():
+            raise ValueError(f"No ladder rung fits a {height}p picture")
+
+    @staticmethod
+    def _scale_height(op: Dict[str, Any]) -> int:
+        if op.get("quality"):
+            return int(QUALITY_SETTINGS[op["quality"]]["height"])
+        return int(op["height"])
+
+    def _frame_size(self, ops: List[Dict[str, Any]]) -> tuple:
+        """Frame size after the given frame operations"""
+        width, height = self.width, self.height
+        for op in ops:
+            if op["type"] == "scale":
+                target = self._scale_height(op)
+                width, height = _scaled_width(width, height, target), target
+        return width, height
+
+    def outputs(self) -> List[Dict[str, Any]]:
+        """One output per ladder rung that fits the picture, or a single output"""
+        ladder = self.frame_ops[-1] if self.frame_ops and self.frame_ops[-1]["type"] == "ladder" else None
+        width, height = self._frame_size(self.frame_ops)
+        if not ladder:
+            return [{"name": "output", "resolution": f"{width}x{height}", "bitrate": None, "audio_bitrate": "128k"}]
+
+        outputs = []
+        for quality in ladder["qualities"]:
+            rung = QUALITY_SETTINGS[quality]
+            if int(rung["height"]) > height:
+                continue  # Never upscale
+            outputs.append({
+                "name": quality,
+                "resolution": f"{_scaled_width(width, height, int(rung['height']))}x{rung['height']}",
+                "height": int(rung["height"]),
+                "bitrate": rung["bitrate"],
+                "audio_bitrate": rung["audio_bitrate"]
+            })
+        return outputs
+
+    def stages(self, fused: bool = True) -> List[Dict[str, Any]]:
+        """ffmpeg stages: extra inputs, filter graph and output labels of each process.
+
+        Returns a single stage when fused; otherwise one stage per frame
+        operation, where every stage but the first reads the previous one's
+        NUT stream on stdin.
+        """
+        groups = [self.frame_ops] if fused or len(self.frame_ops) < 2 else [[op] for op in self.frame_ops]
+        stages = []
+        scaled = False
+        for index, ops in enumerate(groups):
+            stage = {"inputs": [], "filters": [], "subtitle_files": []}
+            label = "[0:v]"
+            if index == 0 and self.crop:
+                label = self._add_filter(stage, label, crop_filter(self.crop))
+
+            for op in ops:
+                label, scaled = self._add_operation(stage, label, op, scaled)
+
+            if index == len(groups) - 1 and ops and ops[-1]["type"] == "ladder":
+                # The ladder node already produced one labelled output per rung
+                stage["outputs"] = stage.pop("ladder_outputs")
+            else:
+                if label == "[0:v]":
+                    label = self._add_filter(stage, label, "null")
+                stage["outputs"] = [label]
+            stages.append(stage)
+        return stages
+
+    def _add_filter(self, stage: Dict[str, Any], label: str, node: str) -> str:
+        """Append ``label -> node -> new label`` and return the new label"""
+        output = f"[v{len(stage['filters'])}]"
+        stage["filters"].append(f"{label}{node}{output}")
+        return output
+
+    def _add_input(self, stage: Dict[str, Any], path: str) -> str:
+        """Add an extra input (image) and return its stream label"""
+        stage["inputs"].append(path)
+        return f"[{len(stage['inputs'])}:v]"
+
+    def _position(self, op: Dict[str, Any], scaled: bool) -> tuple:
+        """Positions are on the source frame until the first scale, then on the current frame"""
+        position = (
+            10 if op.get("position_x") is None else op["position_x"],
+            10 if op.get("position_y") is None else op["position_y"],
+        )
+        return position if scaled else adjust_position_for_crop(position, self.crop)
+
+    def _add_operation(self, stage: Dict[str, Any], label: str, op: Dict[str, Any], scaled: bool) -> tuple:
+        """Compile one frame operation into filter graph nodes"""
+        kind = op["type"]
+        if kind == "scale":
+            return self._add_filter(stage, label, f"scale=-2:{self._scale_height(op)}"), True
+
+        if kind == "overlay" and op["overlay_type"] == "text" or kind == "watermark" and op["watermark_type"] == "text":
+            if kind == "overlay":
+                text_filter, subtitle_file = self.ffmpeg.text_overlay_filter(
+                    op["text"], self._position(op, scaled), op.get("font_size") or 24,
+                    op.get("font_color") or "white", op.get("language") or "en"
+                )
+            else:
+                # Same styling as the standalone text watermark
+                text_filter, subtitle_file = self.ffmpeg.text_overlay_filter(op["text"], (10, 10), 16, "white@0.5")
+            if subtitle_file:
+                stage["subtitle_files"].append(subtitle_file)
+            return self._add_filter(stage, label, text_filter), scaled
+
+        if kind == "overlay":
+            image = self._add_input(stage, op["file_path"])
+            if op.get("width") and op.get("height"):
+                image = self._add_filter(stage, image, f"scale={op['width']}:{op['height']}")
+            x, y = self._position(op, scaled)
+            return self._add_filter(stage, f"{label}{image}", f"overlay={x}:{y}"), scaled
+
+        if kind == "watermark":
+            image = self._add_input(stage, op["file_path"])
+            image = self._add_filter(stage, image, f"format=rgba,colorchannelmixer=aa={op.get('opacity', 0.5)}")
+            position = WATERMARK_POSITIONS.get(op.get("position"), WATERMARK_POSITIONS["bottom-right"])
+            return self._add_filter(stage, f"{label}{image}", f"overlay={position}"), scaled
+
+        # ladder: split once, scale each branch to its rung
+        outputs = self.outputs()
+        branches = [f"[r{i}]" for i in range(len(outputs))]
+        stage["filters"].append(f"{label}split={len(outputs)}{''.join(branches)}")
+        stage["ladder_outputs"] = [
+            self._add_filter(stage, branch, f"scale=-2:{output['height']}")
+            for branch, output in zip(branches, outputs)
+        ]
+        return label, scaled
+
+    def _stage_command(self, stage: Dict[str, Any], source: Optional[str]) -> List[str]:
+        """ffmpeg input and filter arguments for a stage; ``source`` None reads stdin"""
+        if source:
+            cmd = [self.ffmpeg.ffmpeg_path, "-ss", str(self.start), "-t", str(self.duration), "-i", source]
+        else:
+            cmd = [self.ffmpeg.ffmpeg_path, "-f", "nut", "-i", "pipe:0"]
+        for path in stage["inputs"]:
+            cmd += ["-i", path]
+        return cmd + ["-filter_complex", ";".join(stage["filters"])]
+
+    def _output_args(self, stage: Dict[str, Any], output_paths: List[str], profile: EncodingProfile,
+                     pass_number: Optional[int] = None) -> List[str]:
+        """Encoder arguments for every output of the final stage"""
+        args = []
+        for label, output, path in zip(stage["outputs"], self.outputs(), output_paths):
+            video_args = profile.video_args(output["bitrate"], pass_number=pass_number, passlog=f"{path}.passlog")
+            if pass_number == 1:
+                # Same stream layout as pass 2: x264 names each stats file by output stream index
+                args += ["-map", label, "-map", "0:a?", *video_args, "-c:a", "copy", "-f", "null", os.devnull]
+            else:
+                args += ["-map", label, "-map", "0:a?", *video_args,
+                         "-c:a", "aac", "-b:a", output["audio_bitrate"], *faststart_args(path), "-y", path]
+        return args
+
+    def run(self, input_path: str, output_paths: List[str], profile: Optional[EncodingProfile] = None,
+            fused: bool = True, on_progress: Optional[Callable[[float], None]] = None) -> List[EncodeResult]:
+        """Run the pipeline, writing one file per entry of ``outputs()``, and describe what was written"""
+        profile = profile or get_encoding_profile()
+        stages = self.stages(fused)
+        # Every ladder rung shares one graph, so two-pass applies to all or none
+        passes = [1, 2] if any(profile.uses_two_pass(o["bitrate"]) for o in self.outputs()) else [None]
+
+        results = []
+        try:
+            with self.ffmpeg.storage.staged_outputs(*output_paths) as scratch_paths:
+                try:
+                    for index, pass_number in enumerate(passes):
+                        def report(fraction, index=index):
+                            if on_progress:
+                                on_progress((index + fraction) / len(passes))
+
+                        results = self._run_stages(stages, input_path, scratch_paths, profile, pass_number, report)
+                finally:
+                    for path in scratch_paths:
+                        for stats_file in Path(path).parent.glob(f"{Path(path).name}.passlog*"):
+                            stats_file.unlink(missing_ok=True)
+        except subprocess.CalledProcessError as e:
+            raise Exception(f"Pipeline failed: {e.stderr}")
+        finally:
+            for stage in stages:
+                for subtitle_file in stage["subtitle_files"]:
+                    if os.path.exists(subtitle_file):
+                        os.remove(subtitle_file)
+        # Report the published paths rather than the scratch copies
+        published = dict(zip(scratch_paths, output_paths))
+        return [result.model_copy(update={"path": published.get(result.path, result.path)}) for result in results]
+
+    def _run_stages(self, stages: List[Dict[str, Any]], input_path: str, output_paths: List[str],
+                    profile: EncodingProfile, pass_number: Optional[int],
+                    on_progress: Callable[[float], None]) -> List[EncodeResult]:
+        """Start the producer stages piped into each other, then run the encoding stage"""
+        producers = []
+        stdin = None
+        try:
+            for index, stage in enumerate(stages[:-1]):
+                cmd = self._stage_command(stage, input_path if index == 0 else None)
+                cmd += ["-map", stage["outputs"][0], "-map", "0:a?", *PIPE_OUTPUT_ARGS]
+                stderr = tempfile.TemporaryFile(mode="w+")
+                process = subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=stderr)
+                if stdin:
+                    stdin.close()  # The child holds its own copy; closing ours lets EOF propagate
+                producers.append((process, cmd, stderr))
+                stdin = process.stdout
+
+            final = stages[-1]
+            cmd = self._stage_command(final, input_path if len(stages) == 1 else None)
+            cmd += self._output_args(final, output_paths, profile, pass_number)
+            try:
+                results = self.ffmpeg.run_with_progress(cmd, self.duration, on_progress, stdin=stdin)
+            finally:
+                if stdin:
+                    stdin.close()
+
+            for process, cmd, stderr in producers:
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    raise subprocess.CalledProcessError(process.returncode, cmd, stderr=stderr.read())
+            return results
+        finally:
+            for process, _, stderr in producers:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                stderr.close()
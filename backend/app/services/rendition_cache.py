@@ -0,0 +1,130 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.video import Video, VideoQuality
+from app.models.job import Job
+from app.services.ffmpeg_service import QUALITY_SETTINGS
+from app.services.outbox import enqueue
+from app.services.storage_service import StorageService
+from app.config.settings import settings
+
+
+def rendition_key(video_id, quality: str) -> str:
+    """Cache key of the JIT job for a rendition; one may be in flight per key (see Job)"""
+    return f"jit:{video_id}:{quality}"
+
+
+class RenditionCache:
+    """Disk-budgeted cache of quality renditions with LRU eviction.
+
+    Only ``VideoQuality`` files are managed here; original uploads are
+    never counted against the budget and never evicted.
+    """
+
+    def __init__(self, db: Session, max_bytes: Optional[int] = None):
+        self.db = db
+        self.max_bytes = settings.rendition_cache_max_bytes if max_bytes is None else max_bytes
+        self.storage = StorageService()
+
+    def touch(self, video_quality: VideoQuality) -> None:
+        """Record an access to a rendition"""
+        video_quality.last_accessed_at = datetime.now(timezone.utc)
+        self.db.commit()
+
+    def total_size(self) -> int:
+        """Total bytes currently held by renditions"""
+        return int(self.db.query(func.coalesce(func.sum(VideoQuality.file_size), 0)).scalar())
+
+    def evict_to_budget(self, keep_ids: Tuple = ()) -> List[VideoQuality]:
+        """Evict least recently accessed renditions until the cache fits its budget"""
+        total = self.total_size()
+        if total <= self.max_bytes:
+            return []
+
+        candidates = self.db.query(VideoQuality).order_by(
+            VideoQuality.last_accessed_at.asc()
+        ).all()
+
+        evicted = []
+        for quality in candidates:
+            if total <= self.max_bytes:
+                break
+            if quality.id in keep_ids:
+                continue
+
+            if not self.storage.delete_file(quality.file_path) and self.storage.exists(quality.file_path):
+                continue  # Keep the row if the file cannot be removed
+
+            total -= quality.file_size or 0
+            self.db.delete(quality)
+            evicted.append(quality)
+
+        self.db.commit()
+        return evicted
+
+    def can_produce(self, video: Video, quality: str) -> bool:
+        """Whether a transcode would write this rung; rungs above the (cropped) source are skipped, never upscaled"""
+        if quality not in QUALITY_SETTINGS:
+            return False
+        crop = video.crop if settings.auto_crop_enabled else None
+        if crop:
+            source_height = int(crop["height"])
+        else:
+            _, _, height = (video.resolution or "").partition("x")
+            source_height = int(height) if height.isdigit() else 0
+        # An unknown size is left to the probe in the task
+        return not source_height or int(QUALITY_SETTINGS[quality]["height"]) <= source_height
+
+    def find_inflight_job(self, video_id, quality: str) -> Optional[Job]:
+        """Find a pending or running job that will produce this H.264 rendition"""
+        jobs = self.db.query(Job).filter(
+            Job.video_id == video_id,
+            Job.job_type == "quality",
+            Job.status.in_(["pending", "processing"])
+        ).all()
+
+        for job in jobs:
+            parameters = job.parameters or {}
+            # Ladders without codecs are H.264 only (see process_quality_generation)
+            if quality in parameters.get("qualities", []) and "h264" in (parameters.get("codecs") or ["h264"]):
+                return job
+        return None
+
+    def request_rendition(self, video: Video, quality: str) -> Tuple[Job, bool]:
+        """Get or create the JIT transcode job for a missing rendition.
+
+        Returns ``(job, created)``; only a created job has its task sent
+        (through the outbox), so concurrent requests share one transcode,
+        across processes too: the JIT job's cache key is unique while it is
+        in flight, and the request that loses the race takes the winner's.
+        """
+        job = self.find_inflight_job(video.id, quality)
+        if job:
+            return job, False
+
+        job = Job(
+            video_id=video.id,
+            job_type="quality",
+            cache_key=rendition_key(video.id, quality),
+            parameters={
+                "qualities": [quality],
+                "codecs": ["h264"],  # Downloads fall back to H.264, whatever the ladder codecs
+                "per_title": settings.per_title_encoding_enabled,
+                "jit": True
+            }
+        )
+        self.db.add(job)
+        enqueue(self.db, job)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            self.db.rollback()
+            # The winner may have finished meanwhile; its client retries the download either way
+            job = self.find_inflight_job(video.id, quality) or self.db.query(Job).filter(
+                Job.cache_key == rendition_key(video.id, quality)
+            ).order_by(Job.created_at.desc()).first()
+            return job, False
+        self.db.refresh(job)
+        return job, True
@@ -0,0 +1,202 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models.video import Video, ProcessedVideo
+from app.models.job import Job
+from app.services.ffmpeg_service import FFmpegService
+from app.services.outbox import enqueue
+from app.services.storage_service import StorageService
+from app.services.encoding_profiles import get_encoding_profile
+from app.services.webhooks import check_callback_url, register_callback
+from app.config.settings import settings
+
+# Bump when a change to the processing code alters outputs for the same inputs
+RESULT_CACHE_VERSION = 1
+
+# Parameters naming uploaded files; their content, not their path, defines the output
+FILE_PARAMETERS = ("overlay_path", "watermark_path", "file_path")
+
+# Parameters that never change the output
+IGNORED_PARAMETERS = ("mode",)
+
+class ResultCache:
+    """Derivative cache so identical jobs on identical sources share one output.
+
+    Entries are keyed by (source content hash, operation, canonical
+    parameters, encoder version). A repeat of a finished job completes at
+    once with the earlier result; a repeat of a running one attaches to it.
+    A unique index allows one pending or running job per key, so requests
+    racing in other processes attach to whichever job was created first.
+    """
+
+    def __init__(self, db: Session, ffmpeg: FFmpegService = None):
+        self.db = db
+        self.ffmpeg = ffmpeg or FFmpegService()
+        self.storage = StorageService()
+
+    def source_hash(self, video: Video) -> Optional[str]:
+        """Content hash of the original, computed once for videos uploaded before hashing"""
+        if not video.content_hash:
+            if not os.path.exists(self.storage.ensure_local(video.file_path)):
+                return None  # Nothing to key on; the job itself will report the missing file
+            video.content_hash = self.storage.file_hash(video.file_path)
+            self.db.commit()
+        return video.content_hash
+
+    def canonical_parameters(self, parameters: Dict[str, Any], priority: str = "normal") -> Dict[str, Any]:
+        """Parameters normalised so that equivalent requests compare equal"""
+        canonical = self._canonical(parameters)
+        if "encoding_profile" in parameters:
+            # A missing profile name means "whatever the priority picks", so key on the result
+            profile = get_encoding_profile(parameters.get("encoding_profile"), priority)
+            canonical["encoding_profile"] = profile.model_dump()
+            canonical["auto_crop"] = settings.auto_crop_enabled
+        return canonical
+
+    def _canonical(self, value: Any, key: Optional[str] = None) -> Any:
+        if isinstance(value, dict):
+            return {
+                k: self._canonical(v, k) for k, v in sorted(value.items())
+                if v is not None and k not in IGNORED_PARAMETERS
+            }
+        if isinstance(value, list):
+            return [self._canonical(v) for v in value]
+        if key in FILE_PARAMETERS and isinstance(value, str) and os.path.exists(value):
+            return f"sha256:{self.storage.file_hash(value)}"
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)  # 5 and 5.0 are the same trim point
+        return value
+
+    def cache_key(self, video: Video, job_type: str, parameters: Dict[str, Any],
+                  priority: str = "normal") -> Optional[str]:
+        """Stable key for a derivative of this source, None when the source cannot be hashed"""
+        source_hash = self.source_hash(video)
+        if not source_hash:
+            return None
+        return self._key(source_hash, job_type, self.canonical_parameters(parameters, priority))
+
+    def cache_keys(self, videos: Iterable[Video], job_type: str, parameters: Dict[str, Any],
+                   priority: str = "normal") -> Dict[Any, str]:
+        """Keys of one operation on many videos, by video id.
+
+        Parameters are canonicalised once. Videos whose content hash is
+        not known yet are left out rather than hashed here.
+        """
+        canonical = self.canonical_parameters(parameters, priority)
+        return {
+            video.id: self._key(video.content_hash, job_type, canonical)
+            for video in videos if video.content_hash
+        }
+
+    def _key(self, source_hash: str, job_type: str, canonical: Dict[str, Any]) -> str:
+        material = {
+            "version": RESULT_CACHE_VERSION,
+            "source": source_hash,
+            "operation": job_type,
+            "parameters": canonical,
+            "encoder": self.ffmpeg.encoder_version()
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def find_result(self, cache_key: str) -> Optional[Job]:
+        """Most recent completed job for this key whose outputs are all still on disk"""
+        outputs = self.db.query(ProcessedVideo).filter(
+            ProcessedVideo.cache_key == cache_key
+        ).order_by(ProcessedVideo.created_at.desc()).all()
+
+        by_job = {}
+        for output in outputs:
+            by_job.setdefault(output.job_id, []).append(output)
+
+        for job_id, rows in by_job.items():
+            if all(self.storage.exists(row.file_path) for row in rows):
+                job = self.db.query(Job).filter(Job.id == job_id, Job.status == "completed").first()
+                if job:
+                    return job
+        return None
+
+    def find_inflight_job(self, cache_key: str) -> Optional[Job]:
+        """A pending or running job that will produce this result"""
+        return self.db.query(Job).filter(
+            Job.cache_key == cache_key,
+            Job.status.in_(["pending", "processing"])
+        ).order_by(Job.created_at.asc()).first()
+
+    def submit(self, video_id, job_type: str, parameters: Dict[str, Any],
+               priority: str = "normal", callback_url: Optional[str] = None) -> Tuple[Job, bool]:
+        """Get or create the job for a derivative.
+
+        Returns ``(job, created)``; a created job's task is sent through
+        the outbox. A cache hit is a new job that is already completed and
+        points at the earlier output. ``callback_url`` is called when the
+        returned job finishes, whichever it is.
+        """
+        check_callback_url(callback_url)
+        video = self.db.query(Video).filter(Video.id == video_id).first()
+        if not video:
+            raise ValueError("Video not found")
+
+        cache_key = self.cache_key(video, job_type, parameters, priority) if settings.result_cache_enabled else None
+
+        if cache_key:
+            job = self.find_inflight_job(cache_key)
+            if job:
+                return self._attach(job, callback_url), False
+
+            source_job = self.find_result(cache_key)
+            if source_job:
+                now = datetime.now(timezone.utc)
+                job = Job(
+                    video_id=video.id,
+                    job_type=job_type,
+                    priority=priority,
+                    status="completed",
+                    progress=100,
+                    # The source job's parameters name the files its output was made from
+                    parameters={**(source_job.parameters or {}), "cached_from": str(source_job.id)},
+                    result_path=source_job.result_path,
+                    cache_key=cache_key,
+                    started_at=now,
+                    completed_at=now
+                )
+                self.db.add(job)
+                register_callback(self.db, job, callback_url)
+                self.db.commit()
+                self.db.refresh(job)
+                return job, False
+
+        job = Job(
+            video_id=video.id,
+            job_type=job_type,
+            priority=priority,
+            parameters=parameters,
+            cache_key=cache_key
+        )
+        self.db.add(job)
+        enqueue(self.db, job)
+        register_callback(self.db, job, callback_url)
+        try:
+            self.db.commit()
+        except IntegrityError:
+            # An identical request elsewhere created the job first
+            self.db.rollback()
+            if not cache_key:
+                raise
+            job = self.find_inflight_job(cache_key)
+            if job is None:
+                # ...and it has finished already: take its result
+                return self.submit(video_id, job_type, parameters, priority, callback_url)
+            return self._attach(job, callback_url), False
+        self.db.refresh(job)
+        return job, True
+
+    def _attach(self, job: Job, callback_url: Optional[str]) -> Job:
+        """Share a running job with another request"""
+        if callback_url:
+            register_callback(self.db, job, callback_url)
+            self.db.commit()
+        return job
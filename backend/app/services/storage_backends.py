@@ -0,0 +1,174 @@
+import os
+import shutil
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from app.config.settings import settings
+
+
+class StorageBackend(ABC):
+    """Where stored files really live, addressed by ``/``-separated keys.
+
+    Keys mirror the local layout relative to the storage root, e.g.
+    ``uploads/ab/cd/<id>/<id>.mp4`` or ``processed/ab/cd/<id>/720p.mp4``.
+    """
+
+    # Whether the local upload/processed directories are the storage itself
+    is_local = False
+
+    @abstractmethod
+    def put_file(self, local_path: str, key: str) -> None:
+        """Store a local file under ``key``, replacing any existing object"""
+
+    @abstractmethod
+    def get_file(self, key: str, local_path: str) -> None:
+        """Copy the object at ``key`` to ``local_path``"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Whether an object is stored under ``key``"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete one object; missing objects are ignored"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        """Delete every object whose key starts with ``prefix``"""
+
+
+class LocalStorageBackend(StorageBackend):
+    """Files on a filesystem.
+
+    Without a root the upload and processed directories are the storage,
+    so nothing is copied and every node must share them. With a root
+    (e.g. a shared mount) it behaves like an object store: files are
+    copied there and read back into the local directories on demand.
+    """
+
+    def __init__(self, root: str = None):
+        self.root = Path(root) if root else None
+        self.is_local = self.root is None
+
+    def path(self, key: str) -> Path:
+        if self.root:
+            return self.root / key
+        prefix, _, rest = key.partition("/")
+        return Path(settings.upload_dir if prefix == "uploads" else settings.processed_dir) / rest
+
+    def put_file(self, local_path: str, key: str) -> None:
+        target = self.path(key)
+        if os.path.realpath(local_path) == os.path.realpath(target):
+            return
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.partial")
+        shutil.copyfile(local_path, partial)
+        os.replace(partial, target)
+
+    def get_file(self, key: str, local_path: str) -> None:
+        source = self.path(key)
+        if os.path.realpath(local_path) == os.path.realpath(source):
+            return
+        if not source.exists():
+            raise FileNotFoundError(key)
+        shutil.copyfile(source, local_path)
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).exists()
+
+    def delete(self, key: str) -> None:
+        self.path(key).unlink(missing_ok=True)
+
+    def delete_prefix(self, prefix: str) -> None:
+        target = self.path(prefix)
+        if target.is_dir():
+            shutil.rmtree(target, ignore_errors=True)
+        elif target.exists():
+            target.unlink()
+
+
+class S3StorageBackend(StorageBackend):
+    """Objects in an S3-compatible bucket (AWS S3, MinIO, Ceph RGW, ...).
+
+    Transfers go through boto3's transfer manager: files above the part
+    size are uploaded as parallel multipart uploads and downloaded as
+    parallel ranged GETs.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: str = None, region: str = None,
+                 access_key_id: str = None, secret_access_key: str = None,
+                 part_size: int = None, max_concurrency: int = None):
+        try:
+            import boto3
+            from boto3.s3.transfer import TransferConfig
+        except ImportError:
+            raise RuntimeError("The s3 storage backend needs boto3 (pip install boto3)")
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key
+        )
+        part_size = part_size or settings.s3_part_size_mb * 1024 * 1024
+        self.transfer_config = TransferConfig(
+            multipart_threshold=part_size,
+            multipart_chunksize=part_size,
+            max_concurrency=max_concurrency or settings.s3_max_concurrency,
+            use_threads=True
+        )
+
+    def put_file(self, local_path: str, key: str) -> None:
+        self.client.upload_file(local_path, self.bucket, key, Config=self.transfer_config)
+
+    def get_file(self, key: str, local_path: str) -> None:
+        self.client.download_file(self.bucket, key, local_path, Config=self.transfer_config)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            keys = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True})
+
+
+# Backends by configuration, so clients and their connection pools are shared per process
+_backends = {}
+
+
+def get_storage_backend() -> StorageBackend:
+    """The backend selected by ``STORAGE_BACKEND``"""
+    if settings.storage_backend == "local":
+        config = ("local", settings.storage_root)
+    elif settings.storage_backend == "s3":
+        config = ("s3", settings.s3_bucket, settings.s3_endpoint_url, settings.s3_region)
+    else:
+        raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
+    
+    if config not in _backends:
+        if settings.storage_backend == "local":
+            _backends[config] = LocalStorageBackend(settings.storage_root or None)
+        else:
+            _backends[config] = S3StorageBackend(
+                settings.s3_bucket,
+                endpoint_url=settings.s3_endpoint_url,
+                region=settings.s3_region,
+                access_key_id=settings.s3_access_key_id,
+                secret_access_key=settings.s3_secret_access_key
+            )
+    return _backends[config]
@@ -1,9 +1,55 @@
 import os
+import time
 import uuid
+import hashlib
 import shutil
+import socket
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterator, List, Optional
+import httpx
 from app.config.settings import settings
+from app.services.storage_backends import get_storage_backend
+
+# Local copies of remote files touched more recently than this are never evicted (a task may be using them)
+CACHE_MIN_IDLE_SECONDS = 30 * 60
+
+
+def _fsync_directory(directory: Path) -> None:
+    """Persist a rename in ``directory``; not every platform can open directories"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # Exists, owned by someone else
+    except OSError:
+        return False
+    return True
+
+
+def shard_dir(root, item_id) -> Path:
+    """``root/ab/cd/<id>``, where ``abcd`` starts a hash of the id so entries spread evenly"""
+    digest = hashlib.md5(str(item_id).encode()).hexdigest()
+    return Path(root) / digest[:2] / digest[2:4] / str(item_id)
+
+
+def _host_tag() -> str:
+    """Short stable tag for this machine, in case a scratch directory is ever shared"""
+    return hashlib.sha1(socket.gethostname().encode()).hexdigest()[:8]
 
 
 class StorageService:
@@ -12,23 +58,35 @@ class StorageService:
     def __init__(self):
         self.upload_dir = Path(settings.upload_dir)
         self.processed_dir = Path(settings.processed_dir)
+        self.scratch_dir = Path(settings.scratch_dir)
+        self.backend = get_storage_backend()
         self.max_file_size = settings.max_file_size
         self.allowed_extensions = settings.allowed_extensions
+        # Final paths published by staged_outputs, so a cancelled job can remove them
+        self.published: List[str] = []
+        # Called before staged_outputs publishes; raising keeps the final paths untouched
+        self.before_publish: Optional[Callable[[], None]] = None
+    
+    def upload_path(self, upload_id, filename: str) -> Path:
+        """Where an upload lives: its own shard directory, named by id"""
+        return shard_dir(self.upload_dir, upload_id) / f"{upload_id}{Path(filename).suffix.lower()}"
+    
+    def video_dir(self, video_id) -> Path:
+        """Shard directory holding every derivative of one video"""
+        return shard_dir(self.processed_dir, video_id)
     
     def save_uploaded_file(self, file_content: bytes, filename: str) -> str:
         """Save uploaded file to storage"""
-        # Generate unique filename
-        file_extension = Path(filename).suffix.lower()
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = self.upload_dir / unique_filename
+        file_path = self.upload_path(uuid.uuid4(), filename)
         
         # Ensure directory exists
-        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
         
         # Save file
         with open(file_path, "wb") as f:
             f.write(file_content)
         
+        self.persist(str(file_path))
         return str(file_path)
     
     def validate_file(self, filename: str, file_size: int) -> bool:
@@ -46,7 +104,7 @@ class StorageService:
     
     def get_file_path(self, filename: str) -> Optional[str]:
         """Get full path for a file"""
-        file_path = self.upload_dir / filename
+        file_path = self.upload_path(Path(filename).stem, filename)
         if file_path.exists():
             return str(file_path)
         return None
@@ -54,6 +112,9 @@ class StorageService:
     def delete_file(self, file_path: str) -> bool:
         """Delete file from storage"""
         try:
+            key = self.key_for(file_path)
+            if key and not self.backend.is_local:
+                self.backend.delete(key)
             if os.path.exists(file_path):
                 os.remove(file_path)
                 return True
@@ -61,15 +122,36 @@ class StorageService:
         except Exception:
             return False
     
-    def create_processed_file_path(self, filename: str, suffix: str = "") -> str:
-        """Create path for processed file"""
-        self.processed_dir.mkdir(parents=True, exist_ok=True)
+    def delete_upload(self, file_path: str) -> bool:
+        """Delete an upload together with its shard directory"""
+        directory = Path(file_path).parent
+        if directory == shard_dir(self.upload_dir, directory.name):
+            return self.delete_directory(str(directory))
+        return self.delete_file(file_path)  # Not migrated to the sharded layout yet
+    
+    def delete_directory(self, directory_path: str) -> bool:
+        """Recursively delete a directory"""
+        try:
+            key = self.key_for(directory_path)
+            if key and not self.backend.is_local:
+                self.backend.delete_prefix(f"{key}/")
+            if os.path.isdir(directory_path):
+                shutil.rmtree(directory_path)
+                return True
+            return False
+        except Exception:
+            return False
+    
+    def create_processed_file_path(self, video_id, filename: str, suffix: str = "") -> str:
+        """Create path for a derivative of a video, inside that video's directory"""
+        directory = self.video_dir(video_id)
+        directory.mkdir(parents=True, exist_ok=True)
         
         if suffix:
             name, ext = os.path.splitext(filename)
             filename = f"{name}_{suffix}{ext}"
         
-        return str(self.processed_dir / filename)
+        return str(directory / filename)
     
     def copy_file(self, source_path: str, dest_path: str) -> bool:
         """Copy file from source to destination"""
@@ -86,6 +168,183 @@ class StorageService:
         except Exception:
             return 0
     
+    def file_hash(self, file_path: str) -> str:
+        """SHA-256 of a file's content, read in chunks"""
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    @contextmanager
+    def staged_outputs(self, *final_paths: str) -> Iterator[List[str]]:
+        """Scratch paths to write ``final_paths`` to, published when the block succeeds.
+
+        Files are written on the local scratch disk, fsynced and then renamed
+        into place, so readers of the final path never see a partial file.
+        On failure the scratch files are removed and the final paths are
+        left untouched.
+        """
+        self.scratch_dir.mkdir(parents=True, exist_ok=True)
+        # The pid prefix lets clean_scratch tell live encodes from a crashed worker's leftovers
+        prefix = f"{os.getpid()}-{_host_tag()}-{uuid.uuid4().hex[:8]}"
+        scratch_paths = [str(self.scratch_dir / f"{prefix}-{i}-{Path(p).name}") for i, p in enumerate(final_paths)]
+        try:
+            yield scratch_paths
+            if self.before_publish:
+                self.before_publish()
+            for scratch_path, final_path in zip(scratch_paths, final_paths):
+                self.publish(scratch_path, final_path)
+                self.persist(final_path)
+                self.published.append(final_path)
+        finally:
+            for scratch_path in scratch_paths:
+                if os.path.exists(scratch_path):
+                    os.remove(scratch_path)
+    
+    def publish(self, source_path: str, final_path: str) -> None:
+        """Durably and atomically move a finished file to its final path"""
+        final = Path(final_path)
+        final.parent.mkdir(parents=True, exist_ok=True)
+        with open(source_path, "rb") as f:
+            os.fsync(f.fileno())
+        
+        try:
+            os.replace(source_path, final)
+        except OSError:
+            # Scratch and storage are different filesystems: copy next to the target, then rename
+            partial = final.parent / f".{final.name}.{uuid.uuid4().hex[:8]}.partial"
+            try:
+                with open(source_path, "rb") as src, open(partial, "wb") as dst:
+                    shutil.copyfileobj(src, dst, 1024 * 1024)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.replace(partial, final)
+            finally:
+                if partial.exists():
+                    partial.unlink()
+            os.remove(source_path)
+        _fsync_directory(final.parent)
+    
+    def key_for(self, path: str) -> Optional[str]:
+        """Backend key of a path under the upload or processed directory"""
+        resolved = Path(path).resolve()
+        for prefix, root in (("uploads", self.upload_dir), ("processed", self.processed_dir)):
+            try:
+                relative = resolved.relative_to(root.resolve())
+            except ValueError:
+                continue
+            return f"{prefix}/{relative.as_posix()}" if relative.parts else prefix
+        return None
+    
+    def persist(self, path: str) -> None:
+        """Store a finished local file in the storage backend"""
+        key = self.key_for(path)
+        if key and not self.backend.is_local:
+            self.backend.put_file(path, key)
+    
+    def exists(self, path: str) -> bool:
+        """Whether a stored file exists locally or in the backend"""
+        if os.path.exists(path):
+            return True
+        key = self.key_for(path)
+        return bool(key) and not self.backend.is_local and self.backend.exists(key)
+    
+    def ensure_local(self, path: str, node: Optional[str] = None) -> str:
+        """Local path of a stored file, fetched on a cache miss.
+
+        Remote files are read through into the upload/processed directories,
+        which act as this node's cache and are trimmed to
+        ``SOURCE_CACHE_MAX_BYTES``. With node-local storage the file is
+        transferred from ``node``, the node that holds it, instead.
+        """
+        if os.path.exists(path):
+            # Record the access for LRU trimming; mtime stays the write time
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+            return path
+        key = self.key_for(path)
+        if not key:
+            return path  # Nothing to fetch; callers see the missing file as before
+        if self.backend.is_local:
+            if node and node in settings.node_urls:
+                self._download(f"{settings.node_urls[node].rstrip('/')}/{key}", path)
+            return path
+        
+        self._fetch(path, lambda partial: self.backend.get_file(key, partial))
+        self.trim_cache()
+        return path
+    
+    def _download(self, url: str, path: str) -> None:
+        """Transfer a file from another node's file server"""
+        def download(partial):
+            with httpx.stream("GET", url, timeout=60.0) as response:
+                response.raise_for_status()
+                with open(partial, "wb") as f:
+                    for chunk in response.iter_bytes(1024 * 1024):
+                        f.write(chunk)
+        self._fetch(path, download)
+    
+    def _fetch(self, path: str, write: Callable[[str], None]) -> None:
+        """Fill ``path`` atomically from ``write(partial_path)``"""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f".{target.name}.{uuid.uuid4().hex[:8]}.partial")
+        try:
+            write(str(partial))
+            os.replace(partial, target)
+        finally:
+            partial.unlink(missing_ok=True)
+    
+    def trim_cache(self, max_bytes: Optional[int] = None) -> int:
+        """Evict least recently used local copies of remote files; returns bytes freed"""
+        if self.backend.is_local:
+            return 0  # The local files are the only copy
+        max_bytes = settings.source_cache_max_bytes if max_bytes is None else max_bytes
+        
+        files = []
+        for root in (self.upload_dir, self.processed_dir):
+            if root.exists():
+                files += [(p, p.stat()) for p in root.rglob("*") if p.is_file() and not p.name.endswith(".partial")]
+        total = sum(stat.st_size for _, stat in files)
+        
+        freed = 0
+        now = time.time()
+        for path, stat in sorted(files, key=lambda item: item[1].st_atime):
+            if total - freed <= max_bytes:
+                break
+            if now - stat.st_atime < CACHE_MIN_IDLE_SECONDS:
+                continue
+            key = self.key_for(str(path))
+            if key and self.backend.exists(key):  # Never drop the only copy
+                path.unlink(missing_ok=True)
+                freed += stat.st_size
+        return freed
+    
+    def clean_scratch(self, max_age_seconds: Optional[float] = None) -> int:
+        """Delete scratch files left behind by dead workers or untouched for too long.
+
+        Returns the number of files removed.
+        """
+        if not self.scratch_dir.exists():
+            return 0
+        max_age = settings.scratch_max_age_hours * 3600 if max_age_seconds is None else max_age_seconds
+        now = time.time()
+        host = _host_tag()
+        removed = 0
+        for path in self.scratch_dir.iterdir():
+            if not path.is_file():
+                continue
+            pid, _, tag = path.name.partition("-")
+            # Only processes on this machine can be checked; other files go by age alone
+            orphaned = tag.startswith(f"{host}-") and pid.isdigit() and not _process_alive(int(pid))
+            try:
+                if orphaned or now - path.stat().st_mtime > max_age:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Published or cleaned up by its owner meanwhile
+        return removed
+    
     def ensure_directory(self, directory_path: str) -> None:
         """Ensure directory exists"""
         Path(directory_path).mkdir(parents=True, exist_ok=True)
@@ -1,5 +1,5 @@
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Optional, Tuple
 import uuid
 import os
 from pathlib import Path
@@ -7,7 +7,13 @@ from app.models.video import Video, VideoQuality
 from app.models.job import Job
 from app.schemas.video import VideoCreate, TrimRequest, QualityRequest
 from app.services.ffmpeg_service import FFmpegService
+from app.services.outbox import enqueue
 from app.services.storage_service import StorageService
+from app.services.encoding_profiles import get_encoding_profile, CODECS, CODEC_PREFERENCE
+from app.services.pipeline import Pipeline
+from app.services.result_cache import ResultCache
+from app.services.webhooks import check_callback_url, register_callback
+from app.tasks.routing import current_node
 from app.config.settings import settings
 
 
@@ -25,12 +31,14 @@ class VideoService:
             # Extract metadata using FFmpeg
             metadata = self.ffmpeg.get_video_metadata(file_path)
             
-            # Generate thumbnail
-            thumbnail_path = os.path.join(settings.processed_dir, f"thumb_{uuid.uuid4()}.jpg")
+            # Generate thumbnail in the video's own directory
+            video_id = uuid.uuid4()
+            thumbnail_path = self.storage.create_processed_file_path(video_id, "thumbnail.jpg")
             self.ffmpeg.generate_thumbnail(file_path, thumbnail_path)
             
             # Create video record
             video = Video(
+                id=video_id,
                 filename=os.path.basename(file_path),
                 original_filename=original_filename,
                 file_path=file_path,
@@ -40,7 +48,9 @@ class VideoService:
                 resolution=metadata["resolution"],
                 fps=metadata["fps"],
                 bitrate=metadata["bitrate"],
-                thumbnail_path=thumbnail_path
+                thumbnail_path=thumbnail_path,
+                content_hash=self.storage.file_hash(file_path),
+                storage_node=current_node()
             )
             
             self.db.add(video)
@@ -67,16 +77,14 @@ class VideoService:
             return False
         
         try:
-            # Delete files
-            if os.path.exists(video.file_path):
-                os.remove(video.file_path)
-            if video.thumbnail_path and os.path.exists(video.thumbnail_path):
-                os.remove(video.thumbnail_path)
+            # Every derivative lives under the video's directory
+            self.storage.delete_upload(video.file_path)
+            self.storage.delete_directory(str(self.storage.video_dir(video.id)))
             
-            # Delete quality versions
-            for quality in video.qualities:
-                if os.path.exists(quality.file_path):
-                    os.remove(quality.file_path)
+            # Files from before the sharded layout (see migrate_storage.py)
+            for path in [video.thumbnail_path, *(quality.file_path for quality in video.qualities)]:
+                if path:
+                    self.storage.delete_file(path)
             
             # Delete from database
             self.db.delete(video)
@@ -86,8 +94,12 @@ class VideoService:
             self.db.rollback()
             raise Exception(f"Failed to delete video: {str(e)}")
     
-    def trim_video(self, video_id: uuid.UUID, start_time: float, end_time: float) -> Job:
-        """Create trim job for video"""
+    def trim_video(self, video_id: uuid.UUID, start_time: float, end_time: float,
+                   callback_url: Optional[str] = None) -> Tuple[Job, bool]:
+        """Create trim job for video, reusing an identical earlier or running trim.
+
+        Returns ``(job, created)``; only a created job has its task sent, through the outbox.
+        """
         video = self.get_video(video_id)
         if not video:
             raise ValueError("Video not found")
@@ -98,50 +110,120 @@ class VideoService:
         if end_time > float(video.duration):
             raise ValueError("End time exceeds video duration")
         
-        # Create job
-        job = Job(
-            video_id=video_id,
-            job_type="trim",
-            parameters={
+        return ResultCache(self.db, self.ffmpeg).submit(
+            video_id,
+            "trim",
+            {
                 "start_time": start_time,
                 "end_time": end_time
-            }
+            },
+            callback_url=callback_url
         )
-        
-        self.db.add(job)
-        self.db.commit()
-        self.db.refresh(job)
-        
-        return job
     
-    def generate_qualities(self, video_id: uuid.UUID, qualities: List[str]) -> Job:
-        """Create quality generation job"""
+    def generate_qualities(self, video_id: uuid.UUID, qualities: List[str],
+                           encoding_profile: Optional[str] = None, priority: str = "normal",
+                           per_title: Optional[bool] = None,
+                           codecs: Optional[List[str]] = None,
+                           callback_url: Optional[str] = None) -> Job:
+        """Create quality generation job, its task sent through the outbox"""
         video = self.get_video(video_id)
         if not video:
             raise ValueError("Video not found")
         
+        # Raises ValueError for unknown profiles
+        get_encoding_profile(encoding_profile, priority)
+        check_callback_url(callback_url)
+        
+        codecs = codecs or settings.ladder_codecs
+        unknown = [codec for codec in codecs if codec not in CODECS]
+        if unknown:
+            raise ValueError(f"Unsupported codecs: {', '.join(unknown)}")
+        
         # Create job
         job = Job(
             video_id=video_id,
             job_type="quality",
+            priority=priority,
             parameters={
-                "qualities": qualities
+                "qualities": qualities,
+                "encoding_profile": encoding_profile,
+                "per_title": settings.per_title_encoding_enabled if per_title is None else per_title,
+                "codecs": codecs
             }
         )
         
         self.db.add(job)
+        enqueue(self.db, job)
+        register_callback(self.db, job, callback_url)
         self.db.commit()
         self.db.refresh(job)
         
         return job
     
+    def create_pipeline(self, video_id: uuid.UUID, operations: List[dict],
+                        encoding_profile: Optional[str] = None, priority: str = "normal",
+                        mode: Optional[str] = None) -> Tuple[Job, bool]:
+        """Create a job that runs a chain of operations in one ffmpeg graph.
+
+        Returns ``(job, created)`` like ``trim_video``.
+        """
+        video = self.get_video(video_id)
+        if not video:
+            raise ValueError("Video not found")
+        
+        # Raises ValueError for unknown profiles
+        get_encoding_profile(encoding_profile, priority)
+        
+        # Images must come from an earlier upload, never arbitrary server paths
+        upload_dir = os.path.realpath(settings.upload_dir)
+        for op in operations:
+            if op.get("file_path"):
+                path = os.path.realpath(op["file_path"])
+                if os.path.commonpath([path, upload_dir]) != upload_dir or not self.storage.exists(path):
+                    raise ValueError(f"Unknown upload: {op['file_path']}")
+        
+        # Compiling checks operation order, trims and scales against the source
+        width, height = (int(v) for v in video.resolution.split("x"))
+        Pipeline(operations, width, height, float(video.duration), ffmpeg=self.ffmpeg)
+        
+        return ResultCache(self.db, self.ffmpeg).submit(
+            video_id,
+            "pipeline",
+            {
+                "operations": operations,
+                "encoding_profile": encoding_profile,
+                "mode": mode or settings.pipeline_mode
+            },
+            priority
+        )
+    
     def get_video_qualities(self, video_id: uuid.UUID) -> List[VideoQuality]:
         """Get all quality versions for a video"""
         return self.db.query(VideoQuality).filter(VideoQuality.video_id == video_id).all()
     
-    def get_video_quality(self, video_id: uuid.UUID, quality: str) -> Optional[VideoQuality]:
+    def get_video_quality(self, video_id: uuid.UUID, quality: str, codec: str = "h264") -> Optional[VideoQuality]:
         """Get specific quality version"""
         return self.db.query(VideoQuality).filter(
             VideoQuality.video_id == video_id,
-            VideoQuality.quality == quality
+            VideoQuality.quality == quality,
+            VideoQuality.codec == codec
         ).first()
+    
+    def negotiate_quality(self, video_id: uuid.UUID, quality: str,
+                          accepted_codecs: List[str]) -> Optional[VideoQuality]:
+        """Most efficient existing rendition of a quality that the client can play.
+
+        H.264 is always acceptable as the universal fallback.
+        """
+        variants = {
+            variant.codec or "h264": variant
+            for variant in self.db.query(VideoQuality).filter(
+                VideoQuality.video_id == video_id,
+                VideoQuality.quality == quality
+            ).all()
+        }
+        accepted = set(accepted_codecs) | {"h264"}
+        for codec in CODEC_PREFERENCE:
+            if codec in accepted and codec in variants:
+                return variants[codec]
+        return None
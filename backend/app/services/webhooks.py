@@ -0,0 +1,192 @@
+import hashlib
+import hmac
+import ipaddress
+import json
+import logging
+import math
+import socket
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+import httpx
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, contains_eager
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.webhook import WebhookDelivery
+from app.services.fair_share import FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_HEADER = "X-Dripple-Signature"
+TIMESTAMP_HEADER = "X-Dripple-Timestamp"
+
+
+def check_callback_url(url: Optional[str]) -> Optional[str]:
+    """The URL if it can take callbacks; raises ValueError otherwise.
+
+    Workers post from inside the network, so a host that resolves to a
+    loopback, link-local, private or otherwise non-public address is
+    refused unless it is listed in ``webhook_allowed_hosts``.
+    """
+    if not url:
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname or len(url) > 2048:
+        raise ValueError(f"Invalid callback_url: {url}")
+    if parsed.hostname in settings.webhook_allowed_hosts:
+        return url
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, parsed.port or None)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        raise ValueError(f"Invalid callback_url: cannot resolve {parsed.hostname}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not (getattr(ip, "ipv4_mapped", None) or ip).is_global:
+            raise ValueError(f"Invalid callback_url: {parsed.hostname} is not a public address")
+    return url
+
+
+def register_callback(db: Session, job: Job, url: Optional[str]) -> None:
+    """Have ``url`` called once the job finishes (at once if it already has); the caller commits"""
+    if url:
+        db.add(WebhookDelivery(job=job, url=check_callback_url(url)))
+
+
+def sign(body: bytes, timestamp: str) -> str:
+    """HMAC-SHA256 of ``<timestamp>.<body>``, as sent in the signature header"""
+    secret = (settings.webhook_secret or settings.secret_key).encode()
+    return hmac.new(secret, timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+
+
+def _iso(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def callback_event(delivery: WebhookDelivery) -> Dict[str, Any]:
+    """What an endpoint is told about a finished job"""
+    job = delivery.job
+    return {
+        "delivery_id": delivery.id,  # Unique per callback; deliveries are at least once
+        "event": f"job.{job.status}",
+        "job_id": str(job.id),
+        "video_id": str(job.video_id) if job.video_id else None,
+        "batch_id": str(job.batch_id) if job.batch_id else None,
+        "job_type": job.job_type,
+        "status": job.status,
+        "error_message": job.error_message,
+        "result_path": job.result_path,
+        "started_at": _iso(job.started_at),
+        "completed_at": _iso(job.completed_at)
+    }
+
+
+def post(url: str, body: bytes) -> Optional[str]:
+    """POST a signed batch of events; returns None once the endpoint accepted it, otherwise the error"""
+    timestamp = str(int(time.time()))
+    headers = {
+        "Content-Type": "application/json",
+        TIMESTAMP_HEADER: timestamp,
+        SIGNATURE_HEADER: f"sha256={sign(body, timestamp)}"
+    }
+    try:
+        # Checked again at send time, as the host may resolve elsewhere by now
+        check_callback_url(url)
+        response = httpx.post(url, content=body, headers=headers, timeout=settings.webhook_timeout)
+    except (ValueError, httpx.HTTPError) as e:
+        return f"{type(e).__name__}: {e}"
+    return None if response.is_success else f"HTTP {response.status_code}"
+
+
+class WebhookDispatcher:
+    """Delivers the callbacks of finished jobs, batched per endpoint.
+
+    Each run takes the due callbacks of finished jobs, oldest first (on
+    Postgres skipping rows another dispatcher has locked), and sends the
+    events for one URL together, up to ``webhook_batch_size`` per POST,
+    to several endpoints in parallel. The body is signed with
+    HMAC-SHA256. The taken callbacks are leased (``next_attempt_at`` is
+    pushed past the time the POSTs can take) and committed before any is
+    sent, so no row lock is held across the network and a dispatcher that
+    dies mid-run leaves them due again once the lease runs out. A failed
+    POST is retried with exponential backoff, until
+    ``webhook_max_attempts`` failures mark its callbacks ``failed``.
+    Delivery is at least once; endpoints de-duplicate by ``delivery_id``.
+    """
+
+    def __init__(self, db: Session, send: Callable[[str, bytes], Optional[str]] = post):
+        self.db = db
+        self.send = send
+
+    def due(self, limit: int) -> List[WebhookDelivery]:
+        # Jobs come with their callbacks, as the events are built from them
+        query = self.db.query(WebhookDelivery).join(WebhookDelivery.job).options(
+            contains_eager(WebhookDelivery.job)
+        ).filter(
+            WebhookDelivery.status == "waiting",
+            Job.status.in_(FINISHED_STATUSES),
+            or_(WebhookDelivery.next_attempt_at.is_(None),
+                WebhookDelivery.next_attempt_at <= datetime.now(timezone.utc))
+        ).order_by(WebhookDelivery.id).limit(limit)
+        if self.db.get_bind().dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True, of=WebhookDelivery)
+        return query.all()
+
+    def backoff(self, attempts: int) -> timedelta:
+        seconds = settings.webhook_retry_base_seconds * 2 ** (attempts - 1)
+        return timedelta(seconds=min(seconds, settings.webhook_retry_max_seconds))
+
+    def run(self) -> int:
+        """Send one round of due callbacks; returns how many were attempted"""
+        deliveries = self.due(settings.webhook_batch_size * settings.webhook_concurrency)
+        if not deliveries:
+            self.db.commit()
+            return 0
+
+        by_url = defaultdict(list)
+        for delivery in deliveries:
+            by_url[delivery.url].append(delivery)
+        size = settings.webhook_batch_size
+        batches = [group[i:i + size] for group in by_url.values() for i in range(0, len(group), size)]
+        bodies = [json.dumps({"events": [callback_event(d) for d in batch]}).encode() for batch in batches]
+
+        # A POST may wait webhook_timeout each to connect, send and read
+        rounds = math.ceil(len(batches) / settings.webhook_concurrency)
+        lease = datetime.now(timezone.utc) + timedelta(seconds=3 * settings.webhook_timeout * rounds)
+        for delivery in deliveries:
+            delivery.next_attempt_at = lease
+        self.db.commit()
+
+        with ThreadPoolExecutor(max_workers=settings.webhook_concurrency) as pool:
+            errors = list(pool.map(self.send, [batch[0].url for batch in batches], bodies))
+
+        now = datetime.now(timezone.utc)
+        for batch, error in zip(batches, errors):
+            for delivery in batch:
+                if error is None:
+                    delivery.status = "delivered"
+                    delivery.delivered_at = now
+                    continue
+                delivery.attempts += 1
+                delivery.last_error = error
+                if delivery.attempts >= settings.webhook_max_attempts:
+                    delivery.status = "failed"
+                else:
+                    delivery.next_attempt_at = now + self.backoff(delivery.attempts)
+            if error is not None:
+                logger.warning("Callback to %s failed (%d events): %s", batch[0].url, len(batch), error)
+        self.db.commit()
+        return len(deliveries)
+
+    def prune(self) -> int:
+        """Delete callbacks delivered or given up more than ``webhook_retention_hours`` ago"""
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=settings.webhook_retention_hours)
+        deleted = self.db.query(WebhookDelivery).filter(
+            WebhookDelivery.status.in_(("delivered", "failed")),
+            WebhookDelivery.created_at < cutoff
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return deleted
@@ -1,9 +1,10 @@
-from .video_tasks import process_video_upload, process_video_trim, process_quality_generation, process_overlay, process_watermark
+from .video_tasks import process_video_upload, process_video_trim, process_quality_generation, process_overlay, process_watermark, process_pipeline
 
 __all__ = [
     "process_video_upload",
     "process_video_trim", 
     "process_quality_generation",
     "process_overlay",
-    "process_watermark"
+    "process_watermark",
+    "process_pipeline"
 ]
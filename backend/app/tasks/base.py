@@ -0,0 +1,164 @@
+import logging
+import resource
+from typing import Any, Dict, Optional
+from celery import Task
+from celery.utils import uuid
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_seconds() -> float:
+    """CPU time used by this process and its finished children (ffmpeg)"""
+    usages = (resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN))
+    return sum(usage.ru_utime + usage.ru_stime for usage in usages)
+
+
+class PermanentError(Exception):
+    """A failure that retrying cannot fix"""
+
+
+# Bad input rather than a bad moment: a missing job, video or source file, or invalid parameters
+PERMANENT_ERRORS = (PermanentError, ValueError, KeyError, TypeError, FileNotFoundError)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Whether a failed task may succeed on another attempt (database, broker, storage or ffmpeg trouble)"""
+    return not isinstance(exc, PERMANENT_ERRORS)
+
+
+class ProcessingTask(Task):
+    """Base for ``process_*`` tasks.
+
+    With fair-share scheduling a submitted task is held in its tenant's
+    queue and sent once the scheduler releases it (see FairShareScheduler).
+    Sending asks the cost estimator for the task's lane, priority and time
+    limits; anything the caller passes explicitly wins. Every run holds a
+    lease on its job (see JobLease) and is skipped if the job is finished or
+    already running. The task bodies run through JobRun, which records each
+    completed job's wall-clock and CPU time for estimator calibration.
+    Failures go through ``fail``, which retries only what may succeed next
+    time.
+    """
+    
+    max_retries = 3
+    default_retry_delay = 60  # Seconds, doubled on every further retry
+
+    def apply_async(self, args=None, kwargs=None, **options):
+        # Eager runs, explicit queues and retries of running tasks go straight to Celery
+        if self.app.conf.task_always_eager or options.get("queue") or "retries" in options:
+            return super().apply_async(args, kwargs, **options)
+        if settings.fair_share_enabled:
+            task_id = self.hold(args, options.get("task_id"))
+            if task_id:
+                return self.AsyncResult(task_id)
+        return self.dispatch(args, kwargs, **options)
+
+    def dispatch(self, args=None, kwargs=None, plan: Optional[Dict[str, Any]] = None, **options):
+        """Send the task now, with the planned lane, priority and time limits.
+
+        Tasks sent in a batch are planned together beforehand (see
+        TaskPlanner) and pass their ``plan``; others are planned here.
+        """
+        from app.tasks.routing import plan_task
+
+        if plan is None:
+            plan = plan_task(self.name, args, options.get("task_id"))
+        for key, value in plan.items():
+            if options.get(key) is None:
+                options[key] = value
+        if options.get("task_id") is None:
+            options["task_id"] = uuid()
+        return super().apply_async(args, kwargs, **options)
+
+    def hold(self, args, task_id: Optional[str] = None) -> Optional[str]:
+        """Queue the task's job under its tenant and run a dispatch.
+
+        Returns the task id, by default the job id, or None if the task has
+        no job to hold.
+        """
+        from app.config.database import SessionLocal
+        from app.services.fair_share import FairShareScheduler
+        from app.tasks.routing import load_task_subject
+        from app.tasks.scheduling import dispatch_held
+
+        job, video = load_task_subject(self.name, args)
+        if job is None:
+            return None
+        task_id = task_id or str(job.id)
+        db = SessionLocal()
+        try:
+            FairShareScheduler(db).hold(db.merge(job), video, task_id)
+            db.commit()
+            dispatch_held(db)
+        finally:
+            db.close()
+        return task_id
+
+    def __call__(self, *args, **kwargs):
+        from app.services.leases import JobLease
+
+        # Each attempt runs under a lease on its job, so a reclaimed job is never run twice at once
+        job_id = self.job_id_for(args)
+        lease = JobLease.acquire(job_id) if job_id else None
+        if job_id and lease is None:
+            logger.warning("Not running %s for job %s: it is finished or another attempt holds it", self.name, job_id)
+            return {"status": "skipped"}
+        self.request.job_id = job_id
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            if lease:
+                lease.release()
+
+    def job_id_for(self, args) -> Optional[str]:
+        """Id of the job a run works on: the first argument, or for upload tasks the second (see load_task_subject)"""
+        from app.tasks.routing import VIDEO_ID_TASKS, load_task_subject
+
+        if self.name in VIDEO_ID_TASKS:
+            job, _ = load_task_subject(self.name, args)
+            return str(job.id) if job else None
+        return str(args[0]) if args else None
+
+    def after_return(self, status, retval, task_id, args, kwargs, einfo):
+        """A worker slot is free: let the scheduler release the next job"""
+        if settings.fair_share_enabled:
+            from app.tasks.scheduling import dispatch_pending_jobs
+            try:
+                dispatch_pending_jobs()
+            except Exception as e:
+                logger.warning("Dispatch after %s failed: %s", task_id, e)
+
+    def fail(self, db, job, exc: Exception):
+        """Retry a retryable failure, or mark the job failed and re-raise.
+
+        A retried job goes back to ``pending`` and keeps its checkpoint, so
+        the next attempt resumes after the last finished stage. A job that
+        fails for good has its checkpointed outputs removed. A job that was
+        reclaimed from this attempt is left to its new owner.
+        """
+        from app.services.checkpoint import Checkpoint
+        from app.services.job_events import publish_on_commit
+        from app.services.leases import held_lease
+
+        lease = held_lease(job.id) if job is not None else None
+        if lease and lease.lost:
+            # The job was reclaimed and belongs to another attempt now
+            logger.warning("Job %s failed after it was reclaimed: %s", job.id, exc)
+            return
+
+        retry = is_retryable(exc) and self.request.retries < self.max_retries
+        try:
+            db.rollback()
+            if job is not None:
+                job.status = "pending" if retry else "failed"
+                job.error_message = str(exc)
+                publish_on_commit(db, job)
+                db.commit()
+                if not retry:
+                    Checkpoint(db, job).discard()
+        except Exception as e:
+            logger.warning("Could not record the failure of job %s: %s", getattr(job, "id", None), e)
+        if retry:
+            raise self.retry(exc=exc, countdown=self.default_retry_delay * 2 ** self.request.retries)
+        raise exc
@@ -0,0 +1,190 @@
+import socket
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+from sqlalchemy import bindparam, event, update
+from sqlalchemy.orm import Session
+from app.config.celery_config import PRIORITY_SEPARATOR, PRIORITY_STEPS
+from app.config.settings import settings
+from app.models.job import Job
+
+TASK_PREFIX = "app.tasks.video_tasks."
+
+# Tasks whose first argument is a video id rather than a job id; their job id is the second
+VIDEO_ID_TASKS = (f"{TASK_PREFIX}process_video_upload",)
+
+# Broker connection for queue depth checks, opened on first use
+_broker = None
+
+
+def current_node() -> str:
+    """Name of the node this process runs on"""
+    return settings.node_name or socket.gethostname()
+
+
+def node_queue(node: str, lane: Optional[str] = None) -> str:
+    """Queue consumed only by the workers of one node (and one lane)"""
+    return f"node.{node}.{lane}" if lane else f"node.{node}"
+
+
+def load_task_subject(task_name: str, args, db: Optional[Session] = None) -> Tuple[Any, Any]:
+    """``(job, video)`` a processing task works on; either may be None.
+
+    Without ``db`` they are loaded in a session of their own and detached.
+    """
+    from app.config.database import SessionLocal
+    from app.models.video import Video
+
+    if not args:
+        return None, None
+    session = db or SessionLocal()
+    try:
+        if task_name in VIDEO_ID_TASKS:
+            video = session.query(Video).filter(Video.id == uuid.UUID(str(args[0]))).first()
+            if len(args) > 1 and args[1]:
+                job = session.query(Job).filter(Job.id == uuid.UUID(str(args[1]))).first()
+            else:
+                # Sent before upload tasks were given their job: the video's newest upload job
+                job = session.query(Job).filter(
+                    Job.video_id == video.id,
+                    Job.job_type == "upload"
+                ).order_by(Job.created_at.desc()).first() if video else None
+        else:
+            job = session.query(Job).filter(Job.id == uuid.UUID(str(args[0]))).first()
+            video = job.video if job else None
+        if db is None:
+            # Detach so attributes stay readable after the session closes
+            session.expunge_all()
+        return job, video
+    finally:
+        if db is None:
+            session.close()
+
+
+def classify_lane(task_name: str, estimate=None) -> str:
+    """Lane for a processing task given its cost estimate"""
+    name = task_name[len(TASK_PREFIX):]
+    if name == "process_video_upload":
+        return "probe"
+    if name == "process_video_trim":
+        return "remux"  # Stream copy: cost is I/O, not encoding
+    if estimate and estimate.cpu_seconds > settings.lane_light_max_cpu_seconds:
+        return "encode_heavy"
+    return "encode_light"
+
+
+class TaskPlanner:
+    """Queue, priority and time limits for processing tasks about to be sent.
+
+    The cost estimate behind them is stored on the job, where it serves
+    the job's predicted completion time, and the job is marked dispatched.
+    One planner serves a whole batch of tasks: estimates come from the
+    estimator's cached rates, a node queue's length is read from the broker
+    once, and the jobs are updated together, by one UPDATE when the
+    caller's session commits.
+    """
+
+    def __init__(self, db: Session):
+        from app.services.cost_estimator import CostEstimator
+
+        self.db = db
+        self.estimator = CostEstimator(db)
+        self.node_queues = {}  # Node queue -> tasks waiting in it, counting those planned since it was read
+
+    def plan(self, task_name: str, job, video, task_id: Optional[str] = None) -> Dict[str, Any]:
+        from app.services.fair_share import tenant_for
+
+        options = {}
+        estimate = None
+        if job is not None:
+            estimate = self.estimator.estimate(job, video)
+            options["soft_time_limit"], options["time_limit"] = self.estimator.time_limits(estimate)
+            options["priority"] = self.estimator.priority(estimate, job.priority)
+
+        lane = classify_lane(task_name, estimate) if settings.lane_routing_enabled else None
+        if lane:
+            options["queue"] = lane
+        # With affinity routing the lane queue of the node holding the video is
+        # used instead. When that node's queue is too long the task stays on the
+        # shared lane queue, and the worker that picks it up transfers the
+        # source first (see StorageService.ensure_local).
+        node = video.storage_node if video and settings.affinity_routing_enabled else None
+        if node:
+            queue = node_queue(node, lane)
+            if queue not in self.node_queues:
+                self.node_queues[queue] = queue_length(queue)
+            if self.node_queues[queue] < settings.node_queue_max_length:
+                options["queue"] = queue
+                self.node_queues[queue] += 1
+
+        if job is not None:
+            planned = {
+                "cost_units": estimate.units,
+                "estimated_seconds": estimate.wall_seconds,
+                "lane": lane,
+                "tenant": tenant_for(video),
+                "dispatched_at": datetime.now(timezone.utc)
+            }
+            # Jobs run under their own id, which the upload task relies on
+            options["task_id"] = planned["task_id"] = task_id or str(job.id)
+            self.db.info.setdefault("planned_jobs", []).append({"job_id": job.id, **planned})
+        return options
+
+
+@event.listens_for(Session, "before_commit")
+def _save_plans(session: Session) -> None:
+    planned = session.info.pop("planned_jobs", None)
+    if planned:
+        # A job deleted meanwhile matches no row and is skipped
+        jobs = Job.__table__
+        session.execute(update(jobs).where(jobs.c.id == bindparam("job_id")), planned)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_plans(session: Session) -> None:
+    session.info.pop("planned_jobs", None)
+
+
+def plan_task(task_name: str, args, task_id: Optional[str] = None) -> Dict[str, Any]:
+    """Plan one task on its own, loading its job and video first (see TaskPlanner)"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        job, video = load_task_subject(task_name, args, db)
+        options = TaskPlanner(db).plan(task_name, job, video, task_id)
+        db.commit()
+        return options
+    finally:
+        db.close()
+
+
+def queue_length(queue: str) -> int:
+    """Messages waiting in a queue across its priority lists, 0 when the broker cannot say"""
+    global _broker
+    try:
+        import redis
+        if _broker is None:
+            _broker = redis.Redis.from_url(settings.celery_broker_url)
+        pipe = _broker.pipeline()
+        for step in PRIORITY_STEPS:
+            pipe.llen(f"{queue}{PRIORITY_SEPARATOR}{step}" if step else queue)
+        return int(sum(pipe.execute()))
+    except Exception:
+        return 0
+
+
+def route_task(name: str, args, kwargs, options, task=None, **kw) -> Optional[Dict[str, Any]]:
+    """Celery router sending ``process_*`` tasks to a lane by estimated cost.
+
+    Tasks dispatched through ``ProcessingTask.apply_async`` arrive with
+    their queue already set; this covers ``send_task`` by name. Time limits
+    cannot be set by a router, so those tasks keep the worker's.
+    """
+    if not name.startswith(f"{TASK_PREFIX}process_"):
+        return None
+    if options.get("queue"):
+        return None  # Explicitly routed by the caller
+    planned = plan_task(name, args)
+    route = {key: planned[key] for key in ("queue", "priority") if key in planned}
+    return route or None
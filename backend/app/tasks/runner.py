@@ -0,0 +1,219 @@
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import Video
+from app.services.checkpoint import Checkpoint
+from app.services.cost_estimator import CostEstimator
+from app.services.ffmpeg_service import FFmpegService, JobCancelled
+from app.services.job_events import event_for, publish, publish_on_commit
+from app.services.leases import held_lease
+from app.tasks.base import cpu_seconds
+
+logger = logging.getLogger(__name__)
+
+
+def cancellation_check(job_id) -> Callable[[], bool]:
+    """Whether the job has been cancelled or reclaimed, read from the database at most every cancel_poll_seconds"""
+    from app.config.database import SessionLocal
+
+    state = {"at": 0.0, "cancelled": False}
+
+    def cancelled() -> bool:
+        now = time.monotonic()
+        if not state["cancelled"] and job_id and now - state["at"] >= settings.cancel_poll_seconds:
+            state["at"] = now
+            # A session of its own, so polling never touches the task's transaction
+            db = SessionLocal()
+            try:
+                state["cancelled"] = db.query(Job.status).filter(Job.id == job_id).scalar() == "cancelled"
+            finally:
+                db.close()
+        lease = held_lease(job_id)
+        return state["cancelled"] or bool(lease and lease.lost)
+
+    return cancelled
+
+
+class JobRun:
+    """One attempt at a job, as run by the body of a processing task.
+
+    The job and its video are loaded in one query on a session of the
+    run's own, closed when the ``with`` block ends. Starting and
+    completing the job are one commit each and record real timestamps;
+    ``stage`` times the parts in between. Failures go through ``abort``::
+
+        with JobRun(self, job_id) as run:
+            try:
+                job, video = run.start()
+                ...
+                run.complete(result_path=path)
+                return {"status": "completed"}
+            except Exception as e:
+                return run.abort(e)
+
+    The FFmpegService of the run stops once the job is cancelled or
+    reclaimed from this attempt, and only publishes files while the
+    attempt holds the job's lease.
+    """
+
+    def __init__(self, task, job_id=None, video_id=None):
+        self.task = task
+        # Upload tasks are given the video; their job is the one the task was started for
+        job_id = job_id or getattr(task.request, "job_id", None) or task.request.id
+        self.job_id = uuid.UUID(str(job_id)) if job_id else None
+        self.video_id = uuid.UUID(str(video_id)) if video_id else None
+        self.job: Optional[Job] = None
+        self.video: Optional[Video] = None
+        self.stage_seconds: Dict[str, float] = {}
+        self.progress_written, self.progress_written_at = 0, 0.0  # Progress last stored on the job row
+
+    def __enter__(self) -> "JobRun":
+        from app.config.database import SessionLocal
+
+        self.db = SessionLocal()
+        self.ffmpeg = FFmpegService(cancelled=cancellation_check(self.job_id))
+        lease = held_lease(self.job_id)
+        if lease:
+            self.ffmpeg.storage.before_publish = lease.verify
+        self.started, self.cpu = time.monotonic(), cpu_seconds()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.db.close()
+
+    def load(self) -> Tuple[Optional[Job], Video]:
+        """The job and its video, in one query"""
+        # Upload tasks are given their video; other tasks find it through the job
+        row = self.db.query(Job, Video).outerjoin(
+            Video, Video.id == (self.video_id or Job.video_id)
+        ).filter(Job.id == self.job_id).first()
+        if row:
+            self.job, self.video = row
+        elif self.video_id:
+            # An upload task run without a job
+            self.video = self.db.query(Video).filter(Video.id == self.video_id).first()
+        else:
+            raise ValueError("Job not found")
+        if self.video is None:
+            raise ValueError("Video not found")
+        return self.job, self.video
+
+    def start(self) -> Tuple[Optional[Job], Video]:
+        """Load the job and mark it processing; a job cancelled while it waited never starts"""
+        job, video = self.load()
+        if job:
+            if job.status == "cancelled":
+                raise JobCancelled()
+            self._fence()
+            job.status = "processing"
+            job.started_at = datetime.now(timezone.utc)
+            self.progress_written, self.progress_written_at = job.progress or 0, time.monotonic()
+            publish_on_commit(self.db, job, video)
+            self.db.commit()
+        return job, video
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time a part of the job; the durations are stored when it completes"""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stage_seconds[name] = round(self.stage_seconds.get(name, 0.0) + time.monotonic() - started, 3)
+
+    def checkpoint(self) -> Checkpoint:
+        return Checkpoint(self.db, self.job, self.ffmpeg.storage)
+
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if the job was cancelled or reclaimed; called between stages"""
+        if not self.job:
+            return
+        if self.db.query(Job.status).filter(Job.id == self.job.id).scalar() == "cancelled":
+            raise JobCancelled()
+        lease = held_lease(self.job.id)
+        if lease:
+            # Checked on a session of its own: the lease row must not stay locked while the next stage runs
+            lease.verify()
+
+    def _fence(self) -> None:
+        lease = held_lease(self.job.id)
+        if lease:
+            lease.fence(self.db)
+
+    def progress(self, progress: int) -> None:
+        """Report progress to Celery, the job's subscribers and the job row.
+
+        Events go out on every call. The row, which the status endpoints
+        read, is written once progress has moved ``progress_write_step``
+        points or ``progress_write_seconds`` have passed since it last was.
+        """
+        if self.job:
+            now = time.monotonic()
+            if progress >= self.progress_written + settings.progress_write_step or (
+                    progress != self.progress_written and now - self.progress_written_at >= settings.progress_write_seconds):
+                self.job.progress = self.progress_written = progress
+                self.progress_written_at = now
+                publish_on_commit(self.db, self.job, self.video)
+                self.db.commit()
+            else:
+                publish(event_for(self.job, self.video, progress=progress))
+        if self.task.request.id:
+            self.task.update_state(state="PROGRESS", meta={"progress": progress})
+
+    def complete(self, records: Iterable[Any] = (), **fields) -> None:
+        """Add the job's records and mark it completed with its timings, in one commit.
+
+        Does nothing to the job if it was cancelled or reclaimed meanwhile
+        (JobCancelled is raised instead).
+        """
+        if self.job:
+            if self.db.query(Job.status).filter(Job.id == self.job.id).scalar() == "cancelled":
+                raise JobCancelled()
+            self._fence()
+        self.db.add_all(records)
+        if self.job:
+            self.job.status = "completed"
+            self.job.progress = 100
+            self.job.completed_at = datetime.now(timezone.utc)
+            CostEstimator(self.db).record(self.job, time.monotonic() - self.started, cpu_seconds() - self.cpu)
+            self.job.stage_seconds = self.stage_seconds
+            for key, value in fields.items():
+                setattr(self.job, key, value)
+            publish_on_commit(self.db, self.job, self.video)
+        self.db.commit()
+
+    def abort(self, exc: Exception) -> Optional[Dict[str, Any]]:
+        """Handle a failed run: discard a cancelled one, otherwise retry or fail the job (see ProcessingTask.fail)"""
+        if isinstance(exc, JobCancelled):
+            return self.discard()
+        self.task.fail(self.db, self.job, exc)
+        return None
+
+    def discard(self) -> Dict[str, Any]:
+        """Drop a cancelled run's uncommitted records and the outputs it already published.
+
+        An attempt whose job was reclaimed leaves the job and its checkpoint
+        to the new attempt and only removes what it published on its own.
+        """
+        storage = self.ffmpeg.storage
+        self.db.rollback()
+        lease = held_lease(self.job.id) if self.job else None
+        if lease and lease.lost:
+            kept = set(self.checkpoint().artifact_paths())
+            for path in storage.published:
+                if path not in kept:
+                    storage.delete_file(path)
+            logger.warning("Job %s was reclaimed from this attempt; its outputs were discarded", self.job.id)
+            return {"status": "reclaimed"}
+
+        for path in storage.published:
+            storage.delete_file(path)
+        if self.job:
+            self.checkpoint().discard()
+        logger.info("Job %s was cancelled", self.job.id if self.job else None)
+        return {"status": "cancelled"}
@@ -0,0 +1,136 @@
+import logging
+import threading
+from functools import partial
+from typing import List, Optional
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.services.fair_share import FairShareScheduler
+from app.services.leases import reap_expired
+from app.services.outbox import OutboxRelay, wait_for_messages
+from app.tasks.routing import TASK_PREFIX, TaskPlanner
+
+logger = logging.getLogger(__name__)
+
+# Task that processes each job type
+TASKS_BY_JOB_TYPE = {
+    "upload": "process_video_upload",
+    "trim": "process_video_trim",
+    "quality": "process_quality_generation",
+    "overlay": "process_overlay",
+    "watermark": "process_watermark",
+    "pipeline": "process_pipeline",
+}
+
+
+def release_job(job: Job, producer=None, planner: Optional[TaskPlanner] = None) -> None:
+    """Send a held job to Celery under the task id it was given when held.
+
+    Jobs sent in a batch share one broker ``producer`` and one ``planner``,
+    whose updates to the jobs are saved when its session commits.
+    """
+    task = celery_app.tasks[f"{TASK_PREFIX}{TASKS_BY_JOB_TYPE[job.job_type]}"]
+    # The upload task takes the video id, then its job's
+    args = [str(job.video_id), str(job.id)] if job.job_type == "upload" else [str(job.id)]
+    plan = planner.plan(task.name, job, job.video, job.task_id) if planner else None
+    task.dispatch(args, task_id=job.task_id, producer=producer, plan=plan)
+
+
+def dispatch_held(db) -> int:
+    """Release held jobs into free worker slots, publishing them over one producer"""
+    with celery_app.producer_or_acquire() as producer:
+        return FairShareScheduler(db).dispatch(partial(release_job, producer=producer, planner=TaskPlanner(db)))
+
+
+@celery_app.task
+def dispatch_pending_jobs() -> int:
+    """Release held jobs into free worker slots; also run after every submission and processing task"""
+    from app.config.database import SessionLocal
+
+    if not settings.fair_share_enabled:
+        return 0
+    db = SessionLocal()
+    try:
+        return dispatch_held(db)
+    finally:
+        db.close()
+
+
+def submit_jobs(db, jobs: List[Job]) -> None:
+    """Hand jobs from the outbox on: into their tenants' queues, or straight to Celery.
+
+    Held jobs are committed together with their outbox messages and
+    released by the next dispatch.
+    """
+    if settings.fair_share_enabled:
+        scheduler = FairShareScheduler(db)
+        for job in jobs:
+            scheduler.hold(job, job.video, str(job.id))
+        return
+    planner = TaskPlanner(db)
+    with celery_app.producer_or_acquire() as producer:
+        for job in jobs:
+            release_job(job, producer=producer, planner=planner)
+
+
+@celery_app.task
+def relay_outbox() -> int:
+    """Hand every submitted job waiting in the outbox on to Celery; returns how many were relayed"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        relay = OutboxRelay(db)
+        relayed = 0
+        while True:
+            sent = relay.relay(partial(submit_jobs, db))
+            relayed += sent
+            if sent < settings.outbox_batch_size:
+                break
+        if relayed and settings.fair_share_enabled:
+            dispatch_held(db)
+        relay.prune()
+        return relayed
+    finally:
+        db.close()
+
+
+def start_outbox_relay() -> threading.Thread:
+    """Relay from a thread of this process whenever one of its transactions commits outbox messages.
+
+    Submissions then reach Celery without waiting for the periodic relay,
+    which still picks up anything this thread misses.
+    """
+    def run():
+        while True:
+            if not wait_for_messages(settings.outbox_relay_interval):
+                continue
+            try:
+                relay_outbox()
+            except Exception as e:
+                logger.warning("Outbox relay failed: %s", e)
+
+    thread = threading.Thread(target=run, name="outbox-relay", daemon=True)
+    thread.start()
+    return thread
+
+
+@celery_app.task
+def reap_expired_leases() -> int:
+    """Requeue the jobs of workers that died mid-run; returns how many were requeued"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        jobs = reap_expired(db)
+        if settings.fair_share_enabled:
+            # Reclaimed jobs are held again and released into free slots like any other
+            dispatch_held(db)
+        else:
+            planner = TaskPlanner(db)
+            for job in jobs:
+                release_job(job, planner=planner)
+            db.commit()
+        return len(jobs)
+    finally:
+        db.close()
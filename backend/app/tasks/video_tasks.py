@@ -1,382 +1,522 @@
-from celery import current_task
-from sqlalchemy.orm import sessionmaker
-from app.config.database import engine
+from celery.signals import worker_ready
 from app.config.celery_config import celery_app
+from app.tasks.base import PermanentError, ProcessingTask
+from app.tasks.runner import JobRun
 from app.models.video import Video, VideoQuality, ProcessedVideo
-from app.models.job import Job
-from app.services.ffmpeg_service import FFmpegService
+from app.services.ffmpeg_service import FFmpegService, EncodeResult, sample_windows, adjust_position_for_crop
 from app.services.storage_service import StorageService
+from app.services.checkpoint import Checkpoint
+from app.services.rendition_cache import RenditionCache
+from app.services.encoding_profiles import get_encoding_profile
+from app.services.per_title import PerTitleAnalyzer
+from app.services.pipeline import Pipeline
 from app.config.settings import settings
+from typing import Any, Callable, Dict, Optional, Tuple
+import logging
 import uuid
 import os
 
+logger = logging.getLogger(__name__)
 
-# Create database session
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def ensure_source(storage: StorageService, video: Video) -> str:
+    """Local copy of a video's source file; a source that is gone fails the job without retries"""
+    path = storage.ensure_local(video.file_path, node=video.storage_node)
+    if not os.path.exists(path):
+        raise PermanentError(f"Source file of video {video.id} is missing")
+    return path
 
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
+def encode_once(checkpoint: Checkpoint, video: Video, prefix: str,
+                encode: Callable[[str], EncodeResult]) -> Tuple[uuid.UUID, str, EncodeResult]:
+    """Run a job's single-output encode, or reuse the output an earlier attempt checkpointed.
 
-@celery_app.task(bind=True)
-def process_video_upload(self, video_id: str):
-    """Process video upload - extract metadata and generate thumbnail"""
-    db = next(get_db())
+    ``encode`` is called with the output path. Returns the id and filename
+    of the ProcessedVideo to create, and the encode's result.
+    """
+    saved = checkpoint.get("encode")
+    if saved:
+        return uuid.UUID(saved["processed_video_id"]), saved["filename"], EncodeResult(**saved["result"])
     
-    try:
-        # Update job status
-        job = db.query(Job).filter(Job.id == self.request.id).first()
-        if job:
-            job.status = "processing"
-            job.started_at = db.query(Job).filter(Job.id == self.request.id).first().created_at
-            db.commit()
-        
-        # Get video
-        video = db.query(Video).filter(Video.id == video_id).first()
-        if not video:
-            raise ValueError("Video not found")
-        
-        # Update progress
-        current_task.update_state(state="PROGRESS", meta={"progress": 50})
-        
-        # Process video (metadata already extracted during upload)
-        # Generate thumbnail if not exists
-        if not video.thumbnail_path:
-            ffmpeg = FFmpegService()
-            thumbnail_path = os.path.join(settings.processed_dir, f"thumb_{video_id}.jpg")
-            ffmpeg.generate_thumbnail(video.file_path, thumbnail_path)
-            video.thumbnail_path = thumbnail_path
-            db.commit()
-        
-        # Update job status
-        if job:
-            job.status = "completed"
-            job.progress = 100
-            job.completed_at = db.query(Job).filter(Job.id == self.request.id).first().created_at
-            db.commit()
-        
-        return {"status": "completed", "video_id": video_id}
-        
-    except Exception as e:
-        # Update job status
-        if job:
-            job.status = "failed"
-            job.error_message = str(e)
-            db.commit()
-        
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+    processed_video_id = uuid.uuid4()
+    filename = f"{prefix}_{processed_video_id}.mp4"
+    result = encode(checkpoint.storage.create_processed_file_path(video.id, filename))
+    checkpoint.save(
+        "encode",
+        {"processed_video_id": str(processed_video_id), "filename": filename, "result": result.model_dump()},
+        {"output": result.path}
+    )
+    return processed_video_id, filename, result
 
 
-@celery_app.task(bind=True)
-def process_video_trim(self, job_id: str):
-    """Process video trimming"""
-    db = next(get_db())
+@worker_ready.connect
+def clean_scratch_on_start(**kwargs):
+    """Remove encode outputs a crashed worker left in the scratch directory"""
+    removed = StorageService().clean_scratch()
+    if removed:
+        logger.info("Removed %d orphaned scratch files", removed)
+
+
+def get_active_crop(video: Video, ffmpeg: FFmpegService, db, source_path: str) -> Optional[Dict[str, int]]:
+    """Crop rectangle to apply to this video's encodes, detecting it on first use in ``source_path``"""
+    if not settings.auto_crop_enabled:
+        return None
     
-    try:
-        # Get job
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise ValueError("Job not found")
-        
-        # Update job status
-        job.status = "processing"
-        job.started_at = db.query(Job).filter(Job.id == job_id).first().created_at
+    width, height = (int(v) for v in video.resolution.split("x"))
+    if video.crop is None:
+        windows = sample_windows(float(video.duration), settings.crop_sample_count, settings.crop_sample_seconds)
+        video.crop = ffmpeg.detect_crop(source_path, windows, width, height)
         db.commit()
-        
-        # Get video
-        video = db.query(Video).filter(Video.id == job.video_id).first()
-        if not video:
-            raise ValueError("Video not found")
-        
-        # Get parameters
-        start_time = job.parameters["start_time"]
-        end_time = job.parameters["end_time"]
-        
-        # Update progress
-        current_task.update_state(state="PROGRESS", meta={"progress": 30})
-        
-        # Process trimming
-        ffmpeg = FFmpegService()
-        storage = StorageService()
-        
-        # Generate unique filename for trimmed video
-        trimmed_video_id = uuid.uuid4()
-        output_filename = f"trimmed_{trimmed_video_id}.mp4"
-        output_path = storage.create_processed_file_path(output_filename)
-        
-        ffmpeg.trim_video(video.file_path, output_path, start_time, end_time)
-        
-        # Update progress
-        current_task.update_state(state="PROGRESS", meta={"progress": 80})
-        
-        # Get metadata of trimmed video
-        trimmed_metadata = ffmpeg.get_video_metadata(output_path)
-        
-        # Create ProcessedVideo record
-        processed_video = ProcessedVideo(
-            id=trimmed_video_id,
-            original_video_id=video.id,
-            job_id=job.id,
-            filename=output_filename,
-            file_path=output_path,
-            file_size=trimmed_metadata["size"],
-            duration=trimmed_metadata["duration"],
-            format=trimmed_metadata["format"],
-            resolution=trimmed_metadata["resolution"],
-            fps=trimmed_metadata["fps"],
-            bitrate=trimmed_metadata["bitrate"],
-            processing_type="trim",
-            parameters={
-                "start_time": start_time,
-                "end_time": end_time
-            }
-        )
-        
-        db.add(processed_video)
-        
-        # Update job
-        job.status = "completed"
-        job.progress = 100
-        job.result_path = output_path
-        job.completed_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        return {"status": "completed", "result_path": output_path}
-        
-    except Exception as e:
-        # Update job status
-        if job:
-            job.status = "failed"
-            job.error_message = str(e)
-            db.commit()
-        
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+    
+    # Nothing to strip when the active picture is the full frame
+    if (video.crop["width"], video.crop["height"]) == (width, height):
+        return None
+    return video.crop
 
 
-@celery_app.task(bind=True)
-def process_quality_generation(self, job_id: str):
-    """Process multiple quality generation"""
-    db = next(get_db())
+def output_metadata(ffmpeg: FFmpegService, result: EncodeResult) -> Dict[str, Any]:
+    """Metadata for a ProcessedVideo row from what the encode reported.
+
+    The file is only probed when verification is switched on or the run
+    could not report everything; a verified probe wins over the report.
+    """
+    if result.complete and not settings.verify_output_metadata:
+        return result.metadata()
     
-    try:
-        # Get job
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise ValueError("Job not found")
-        
-        # Update job status
-        job.status = "processing"
-        job.started_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        # Get video
-        video = db.query(Video).filter(Video.id == job.video_id).first()
-        if not video:
-            raise ValueError("Video not found")
-        
-        # Get parameters
-        qualities = job.parameters["qualities"]
-        
-        # Process quality generation
-        ffmpeg = FFmpegService()
-        storage = StorageService()
-        
-        results = ffmpeg.generate_quality_versions(
-            video.file_path, 
-            settings.processed_dir, 
-            qualities
-        )
-        
-        # Save quality records
-        for quality, file_path in results.items():
-            file_size = storage.get_file_size(file_path)
-            
-            quality_record = VideoQuality(
-                video_id=video.id,
-                quality=quality,
-                file_path=file_path,
-                file_size=file_size,
-                resolution=quality.replace("p", ""),
-                bitrate=1000 if quality == "480p" else 2500 if quality == "720p" else 5000
+    probed = ffmpeg.get_video_metadata(result.path)
+    if result.complete:
+        reported = result.metadata()
+        mismatched = {
+            key for key in ("resolution", "size") if reported[key] != probed[key]
+        } | {
+            key for key in ("duration", "fps") if abs(reported[key] - probed[key]) > 0.1
+        }
+        if mismatched:
+            logger.warning("Encode report for %s differs from probe on %s", result.path, sorted(mismatched))
+    return probed
+
+
+@celery_app.task(bind=True, base=ProcessingTask)
+def process_video_upload(self, video_id: str, job_id: str = None):
+    """Process video upload - extract metadata and generate thumbnail"""
+    with JobRun(self, job_id, video_id=video_id) as run:
+        try:
+            job, video = run.start()
+            ffmpeg = run.ffmpeg
+            run.progress(50)
+            
+            # Process video (metadata already extracted during upload)
+            with run.stage("fetch"):
+                source_path = ensure_source(ffmpeg.storage, video)
+            with run.stage("analyze"):
+                get_active_crop(video, ffmpeg, run.db, source_path)
+            
+            # Generate thumbnail if not exists, or when asked to redo it; it is stored with the job's completion
+            if not video.thumbnail_path or (job and (job.parameters or {}).get("regenerate_thumbnail")):
+                with run.stage("thumbnail"):
+                    thumbnail_path = ffmpeg.storage.create_processed_file_path(video.id, "thumbnail.jpg")
+                    ffmpeg.generate_thumbnail(source_path, thumbnail_path)
+                    video.thumbnail_path = thumbnail_path
+            
+            run.complete()
+            return {"status": "completed", "video_id": video_id}
+        except Exception as e:
+            return run.abort(e)
+
+
+@celery_app.task(bind=True, base=ProcessingTask)
+def process_video_trim(self, job_id: str):
+    """Process video trimming"""
+    with JobRun(self, job_id) as run:
+        try:
+            job, video = run.start()
+            ffmpeg = run.ffmpeg
+            
+            # Get parameters
+            start_time = job.parameters["start_time"]
+            end_time = job.parameters["end_time"]
+            run.progress(30)
+            
+            with run.stage("fetch"):
+                source_path = ensure_source(ffmpeg.storage, video)
+            
+            # Trim into a uniquely named file, unless an earlier attempt already did
+            with run.stage("encode"):
+                trimmed_video_id, output_filename, result = encode_once(
+                    run.checkpoint(), video, "trimmed",
+                    lambda output_path: ffmpeg.trim_video(source_path, output_path, start_time, end_time)
+                )
+            output_path = result.path
+            run.progress(80)
+            
+            # Get metadata of trimmed video
+            with run.stage("metadata"):
+                trimmed_metadata = output_metadata(ffmpeg, result)
+            
+            # Create ProcessedVideo record
+            processed_video = ProcessedVideo(
+                id=trimmed_video_id,
+                original_video_id=video.id,
+                job_id=job.id,
+                filename=output_filename,
+                file_path=output_path,
+                file_size=trimmed_metadata["size"],
+                duration=trimmed_metadata["duration"],
+                format=trimmed_metadata["format"],
+                resolution=trimmed_metadata["resolution"],
+                fps=trimmed_metadata["fps"],
+                bitrate=trimmed_metadata["bitrate"],
+                processing_type="trim",
+                parameters={
+                    "start_time": start_time,
+                    "end_time": end_time
+                },
+                cache_key=job.cache_key
             )
-            db.add(quality_record)
-        
-        # Update job
-        job.status = "completed"
-        job.progress = 100
-        job.result_path = str(results)
-        job.completed_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        return {"status": "completed", "qualities": list(results.keys())}
+            
+            run.complete([processed_video], result_path=output_path)
+            return {"status": "completed", "result_path": output_path}
+        except Exception as e:
+            return run.abort(e)
+
+
+@celery_app.task(bind=True, base=ProcessingTask)
+def process_quality_generation(self, job_id: str):
+    """Process multiple quality generation"""
+    with JobRun(self, job_id) as run:
+        try:
+            job, video = run.start()
+            ffmpeg, storage, db = run.ffmpeg, run.ffmpeg.storage, run.db
+            
+            # Get parameters, skipping renditions that already exist so that
+            # duplicate JIT requests never transcode twice
+            existing = {
+                (quality, codec or "h264")
+                for quality, codec in db.query(VideoQuality.quality, VideoQuality.codec).filter(
+                    VideoQuality.video_id == video.id
+                ).all()
+            }
+            codecs = job.parameters.get("codecs") or ["h264"]
+            
+            with run.stage("fetch"):
+                source_path = ensure_source(storage, video)
+            
+            # Per-video directory so evicting one rendition never touches another video's file
+            output_dir = str(storage.video_dir(video.id))
+            storage.ensure_directory(output_dir)
+            
+            with run.stage("analyze"):
+                probe = ffmpeg.probe(source_path)
+                crop = get_active_crop(video, ffmpeg, db, source_path)
+                
+                # Optional per-title analysis, done once per video and reused by later ladders
+                ladder = None
+                if job.parameters.get("per_title"):
+                    if not video.encoding_ladder:
+                        video.encoding_ladder = PerTitleAnalyzer(ffmpeg).analyze(source_path, probe, output_dir)
+                        db.commit()
+                    ladder = video.encoding_ladder["rungs"]
+            
+            profile = get_encoding_profile(job.parameters.get("encoding_profile"), job.priority)
+            checkpoint = run.checkpoint()
+            
+            all_results = {}
+            skipped = {}
+            new_records = []
+            for codec in codecs:
+                run.check_cancelled()
+                qualities = [q for q in job.parameters["qualities"] if (q, codec) not in existing]
+                
+                # Plan from the full probe: skip rungs above the source, remux where it already fits
+                plans = ffmpeg.plan_quality_versions(probe, qualities, ladder=ladder, crop=crop, codec=codec)
+                
+                # One rendition at a time, each checkpointed, so a retry only encodes what is missing
+                results = {}
+                for quality in qualities:
+                    stage = f"rendition:{quality}:{codec}"
+                    saved = checkpoint.get(stage)
+                    if saved:
+                        results[quality] = saved["path"]
+                        continue
+                    with run.stage(stage):
+                        rendition = ffmpeg.generate_quality_versions(
+                            source_path, 
+                            output_dir, 
+                            [quality],
+                            plans=plans,
+                            profile=profile,
+                            codec=codec
+                        )
+                    if quality in rendition:
+                        checkpoint.save(stage, {"path": rendition[quality]}, {"rendition": rendition[quality]})
+                        results[quality] = rendition[quality]
+                
+                # Quality records are only added with the job's completion, since checkpoints commit as they go
+                for quality, file_path in results.items():
+                    plan = plans[quality]
+                    new_records.append(VideoQuality(
+                        video_id=video.id,
+                        quality=quality,
+                        codec=codec,
+                        file_path=file_path,
+                        file_size=storage.get_file_size(file_path),
+                        resolution=plan["resolution"],
+                        bitrate=plan["bitrate"],
+                        encode_mode=plan["action"],
+                        encode_decision={**plan, "profile": profile.name if plan["action"] == "transcode" else None}
+                    ))
+                
+                all_results.update({quality if codec == "h264" else f"{quality}_{codec}": path for quality, path in results.items()})
+                skipped.update({q: p["reason"] for q, p in plans.items() if p["action"] == "skip"})
+            
+            run.complete(new_records, result_path=str(all_results))
+        except Exception as e:
+            return run.abort(e)
         
-    except Exception as e:
-        # Update job status
-        if job:
-            job.status = "failed"
-            job.error_message = str(e)
-            db.commit()
+        # Keep the rendition cache within its disk budget; the job is done either way
+        try:
+            RenditionCache(db).evict_to_budget(keep_ids=tuple(r.id for r in new_records))
+        except Exception as e:
+            logger.warning("Rendition cache eviction after job %s failed: %s", job.id, e)
         
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+        return {"status": "completed", "qualities": list(all_results.keys()), "skipped": skipped}
 
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, base=ProcessingTask)
 def process_overlay(self, job_id: str):
     """Process overlay addition"""
-    db = next(get_db())
-    
-    try:
-        # Get job
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise ValueError("Job not found")
-        
-        # Update job status
-        job.status = "processing"
-        job.started_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        # Get video
-        video = db.query(Video).filter(Video.id == job.video_id).first()
-        if not video:
-            raise ValueError("Video not found")
-        
-        # Get parameters
-        overlay_type = job.parameters["overlay_type"]
-        
-        # Process overlay
-        ffmpeg = FFmpegService()
-        storage = StorageService()
-        
-        # Generate unique filename for processed video
-        processed_video_id = uuid.uuid4()
-        output_filename = f"overlay_{processed_video_id}.mp4"
-        output_path = storage.create_processed_file_path(output_filename)
-        
-        if overlay_type == "text":
-            text = job.parameters["text"]
-            position = (job.parameters["position_x"], job.parameters["position_y"])
-            font_size = job.parameters.get("font_size", 24)
-            font_color = job.parameters.get("font_color", "white")
-            language = job.parameters.get("language", "en")
-            
-            ffmpeg.add_text_overlay(
-                video.file_path, output_path, text, position, 
-                font_size, font_color, language
-            )
-        elif overlay_type == "image":
-            overlay_path = job.parameters["overlay_path"]
-            position = (job.parameters["position_x"], job.parameters["position_y"])
-            size = (job.parameters.get("width"), job.parameters.get("height"))
+    with JobRun(self, job_id) as run:
+        try:
+            job, video = run.start()
+            ffmpeg, storage = run.ffmpeg, run.ffmpeg.storage
+            
+            # Get parameters
+            overlay_type = job.parameters["overlay_type"]
+            profile = get_encoding_profile(job.parameters.get("encoding_profile"), job.priority)
+            
+            with run.stage("fetch"):
+                source_path = ensure_source(storage, video)
+            
+            # Overlay coordinates are given on the source frame; map them onto the cropped one
+            with run.stage("analyze"):
+                crop = get_active_crop(video, ffmpeg, run.db, source_path)
+            
+            def encode(output_path: str) -> EncodeResult:
+                if overlay_type == "text":
+                    text = job.parameters["text"]
+                    position = adjust_position_for_crop((job.parameters["position_x"], job.parameters["position_y"]), crop)
+                    font_size = job.parameters.get("font_size", 24)
+                    font_color = job.parameters.get("font_color", "white")
+                    language = job.parameters.get("language", "en")
+                    
+                    return ffmpeg.add_text_overlay(
+                        source_path, output_path, text, position, 
+                        font_size, font_color, language, profile=profile, crop=crop
+                    )
+                if overlay_type == "image":
+                    overlay_path = storage.ensure_local(job.parameters["overlay_path"])
+                    position = adjust_position_for_crop((job.parameters["position_x"], job.parameters["position_y"]), crop)
+                    size = (job.parameters.get("width"), job.parameters.get("height"))
+                    
+                    return ffmpeg.add_image_overlay(
+                        source_path, output_path, overlay_path, position, size, profile=profile, crop=crop
+                    )
+                raise ValueError(f"Unknown overlay type: {overlay_type}")
+            
+            # Encode into a uniquely named file, unless an earlier attempt already did
+            with run.stage("encode"):
+                processed_video_id, output_filename, result = encode_once(run.checkpoint(), video, "overlay", encode)
+            output_path = result.path
+            
+            # Get metadata of processed video
+            with run.stage("metadata"):
+                processed_metadata = output_metadata(ffmpeg, result)
             
-            ffmpeg.add_image_overlay(
-                video.file_path, output_path, overlay_path, position, size
+            # Create ProcessedVideo record
+            processed_video = ProcessedVideo(
+                id=processed_video_id,
+                original_video_id=video.id,
+                job_id=job.id,
+                filename=output_filename,
+                file_path=output_path,
+                file_size=processed_metadata["size"],
+                duration=processed_metadata["duration"],
+                format=processed_metadata["format"],
+                resolution=processed_metadata["resolution"],
+                fps=processed_metadata["fps"],
+                bitrate=processed_metadata["bitrate"],
+                processing_type="overlay",
+                parameters=job.parameters,
+                cache_key=job.cache_key
             )
-        
-        # Get metadata of processed video
-        processed_metadata = ffmpeg.get_video_metadata(output_path)
-        
-        # Create ProcessedVideo record
-        processed_video = ProcessedVideo(
-            id=processed_video_id,
-            original_video_id=video.id,
-            job_id=job.id,
-            filename=output_filename,
-            file_path=output_path,
-            file_size=processed_metadata["size"],
-            duration=processed_metadata["duration"],
-            format=processed_metadata["format"],
-            resolution=processed_metadata["resolution"],
-            fps=processed_metadata["fps"],
-            bitrate=processed_metadata["bitrate"],
-            processing_type="overlay",
-            parameters=job.parameters
-        )
-        
-        db.add(processed_video)
-        
-        # Update job
-        job.status = "completed"
-        job.progress = 100
-        job.result_path = output_path
-        job.completed_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        return {"status": "completed", "result_path": output_path}
-        
-    except Exception as e:
-        # Update job status
-        if job:
-            job.status = "failed"
-            job.error_message = str(e)
-            db.commit()
-        
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+            
+            run.complete([processed_video], result_path=output_path)
+            return {"status": "completed", "result_path": output_path}
+        except Exception as e:
+            return run.abort(e)
 
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, base=ProcessingTask)
 def process_watermark(self, job_id: str):
     """Process watermark addition"""
-    db = next(get_db())
-    
-    try:
-        # Get job
-        job = db.query(Job).filter(Job.id == job_id).first()
-        if not job:
-            raise ValueError("Job not found")
-        
-        # Update job status
-        job.status = "processing"
-        job.started_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        # Get video
-        video = db.query(Video).filter(Video.id == job.video_id).first()
-        if not video:
-            raise ValueError("Video not found")
-        
-        # Get parameters
-        watermark_type = job.parameters["watermark_type"]
-        position = job.parameters.get("position", "bottom-right")
-        opacity = job.parameters.get("opacity", 0.5)
-        
-        # Process watermark
-        ffmpeg = FFmpegService()
-        storage = StorageService()
-        
-        output_filename = f"watermarked_{video.id}.mp4"
-        output_path = storage.create_processed_file_path(output_filename)
-        
-        if watermark_type == "image":
-            watermark_path = job.parameters["watermark_path"]
-            ffmpeg.add_watermark(video.file_path, output_path, watermark_path, position, opacity)
-        elif watermark_type == "text":
-            text = job.parameters["text"]
-            # For text watermarks, we'll use the text overlay function
-            ffmpeg.add_text_overlay(
-                video.file_path, output_path, text, (10, 10), 16, "white@0.5"
+    with JobRun(self, job_id) as run:
+        try:
+            job, video = run.start()
+            ffmpeg, storage = run.ffmpeg, run.ffmpeg.storage
+            
+            # Get parameters
+            watermark_type = job.parameters["watermark_type"]
+            position = job.parameters.get("position", "bottom-right")
+            opacity = job.parameters.get("opacity", 0.5)
+            profile = get_encoding_profile(job.parameters.get("encoding_profile"), job.priority)
+            
+            with run.stage("fetch"):
+                source_path = ensure_source(storage, video)
+            
+            # Watermark positions are relative to the visible picture, so no adjustment is needed
+            with run.stage("analyze"):
+                crop = get_active_crop(video, ffmpeg, run.db, source_path)
+            
+            def encode(output_path: str) -> EncodeResult:
+                if watermark_type == "image":
+                    watermark_path = storage.ensure_local(job.parameters["watermark_path"])
+                    return ffmpeg.add_watermark(source_path, output_path, watermark_path, position, opacity, profile=profile, crop=crop)
+                if watermark_type == "text":
+                    text = job.parameters["text"]
+                    # For text watermarks, we'll use the text overlay function
+                    return ffmpeg.add_text_overlay(
+                        source_path, output_path, text, (10, 10), 16, "white@0.5", profile=profile, crop=crop
+                    )
+                raise ValueError(f"Unknown watermark type: {watermark_type}")
+            
+            # Encode into a uniquely named file, unless an earlier attempt already did
+            with run.stage("encode"):
+                processed_video_id, output_filename, result = encode_once(run.checkpoint(), video, "watermarked", encode)
+            output_path = result.path
+            
+            # Get metadata of processed video
+            with run.stage("metadata"):
+                processed_metadata = output_metadata(ffmpeg, result)
+            
+            # Create ProcessedVideo record so identical requests can reuse it
+            processed_video = ProcessedVideo(
+                id=processed_video_id,
+                original_video_id=video.id,
+                job_id=job.id,
+                filename=output_filename,
+                file_path=output_path,
+                file_size=processed_metadata["size"],
+                duration=processed_metadata["duration"],
+                format=processed_metadata["format"],
+                resolution=processed_metadata["resolution"],
+                fps=processed_metadata["fps"],
+                bitrate=processed_metadata["bitrate"],
+                processing_type="watermark",
+                parameters=job.parameters,
+                cache_key=job.cache_key
             )
-        
-        # Update job
-        job.status = "completed"
-        job.progress = 100
-        job.result_path = output_path
-        job.completed_at = db.query(Job).filter(Job.id == job_id).first().created_at
-        db.commit()
-        
-        return {"status": "completed", "result_path": output_path}
-        
-    except Exception as e:
-        # Update job status
-        if job:
-            job.status = "failed"
-            job.error_message = str(e)
-            db.commit()
-        
-        raise self.retry(exc=e, countdown=60, max_retries=3)
+            
+            run.complete([processed_video], result_path=output_path)
+            return {"status": "completed", "result_path": output_path}
+        except Exception as e:
+            return run.abort(e)
+
+
+@celery_app.task(bind=True, base=ProcessingTask)
+def process_pipeline(self, job_id: str):
+    """Process a chain of operations without intermediate files"""
+    with JobRun(self, job_id) as run:
+        try:
+            job, video = run.start()
+            ffmpeg, storage = run.ffmpeg, run.ffmpeg.storage
+            
+            operations = job.parameters["operations"]
+            profile = get_encoding_profile(job.parameters.get("encoding_profile"), job.priority)
+            
+            with run.stage("fetch"):
+                source_path = ensure_source(storage, video)
+                operations = [
+                    {**op, "file_path": storage.ensure_local(op["file_path"])} if op.get("file_path") else op
+                    for op in operations
+                ]
+            
+            with run.stage("analyze"):
+                crop = get_active_crop(video, ffmpeg, run.db, source_path)
+            width, height = (int(v) for v in video.resolution.split("x"))
+            pipeline = Pipeline(operations, width, height, float(video.duration), crop=crop, ffmpeg=ffmpeg)
+            
+            checkpoint = run.checkpoint()
+            saved = checkpoint.get("encode")
+            if saved:
+                # An earlier attempt finished the encode; only its records are missing
+                outputs = [
+                    (output, uuid.UUID(processed_video_id), output_filename, output_path)
+                    for output, (processed_video_id, output_filename, output_path) in zip(pipeline.outputs(), saved["outputs"])
+                ]
+                encoded = [EncodeResult(**result) for result in saved["results"]]
+            else:
+                # One output per ladder rung, otherwise a single file
+                outputs = []
+                for output in pipeline.outputs():
+                    processed_video_id = uuid.uuid4()
+                    output_filename = f"pipeline_{processed_video_id}.mp4"
+                    outputs.append((output, processed_video_id, output_filename, storage.create_processed_file_path(video.id, output_filename)))
+                
+                # Every stage shares the one job; progress is reported in 1% steps
+                reported = {"progress": job.progress or 0}
+                
+                def report_progress(fraction):
+                    progress = int(fraction * 95)
+                    if progress > reported["progress"]:
+                        reported["progress"] = progress
+                        run.progress(progress)
+                
+                with run.stage("encode"):
+                    encoded = pipeline.run(
+                        source_path,
+                        [path for _, _, _, path in outputs],
+                        profile=profile,
+                        fused=job.parameters.get("mode", settings.pipeline_mode) != "pipe",
+                        on_progress=report_progress
+                    )
+                checkpoint.save(
+                    "encode",
+                    {
+                        "outputs": [[str(processed_video_id), output_filename, output_path]
+                                    for _, processed_video_id, output_filename, output_path in outputs],
+                        "results": [result.model_dump() for result in encoded]
+                    },
+                    {output["name"]: output_path for output, _, _, output_path in outputs}
+                )
+            
+            by_path = {result.path: result for result in encoded}
+            results = {}
+            records = []
+            with run.stage("metadata"):
+                for output, processed_video_id, output_filename, output_path in outputs:
+                    result = by_path.get(output_path) or EncodeResult(path=output_path)
+                    processed_metadata = output_metadata(ffmpeg, result)
+                    
+                    # Create ProcessedVideo record
+                    records.append(ProcessedVideo(
+                        id=processed_video_id,
+                        original_video_id=video.id,
+                        job_id=job.id,
+                        filename=output_filename,
+                        file_path=output_path,
+                        file_size=processed_metadata["size"],
+                        duration=processed_metadata["duration"],
+                        format=processed_metadata["format"],
+                        resolution=processed_metadata["resolution"],
+                        fps=processed_metadata["fps"],
+                        bitrate=processed_metadata["bitrate"],
+                        processing_type="pipeline",
+                        parameters={**job.parameters, "output": output["name"]},
+                        cache_key=job.cache_key
+                    ))
+                    results[output["name"]] = output_path
+            
+            run.complete(records, result_path=results["output"] if "output" in results else str(results))
+            return {"status": "completed", "outputs": results}
+        except Exception as e:
+            return run.abort(e)
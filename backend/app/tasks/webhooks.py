@@ -0,0 +1,23 @@
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.services.webhooks import WebhookDispatcher
+
+
+@celery_app.task(queue="webhooks")
+def deliver_webhooks() -> int:
+    """Send the callbacks of finished jobs, on a queue of their own; returns how many were attempted"""
+    from app.config.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        dispatcher = WebhookDispatcher(db)
+        attempted = 0
+        while True:
+            sent = dispatcher.run()
+            attempted += sent
+            if sent < settings.webhook_batch_size * settings.webhook_concurrency:
+                break
+        dispatcher.prune()
+        return attempted
+    finally:
+        db.close()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Library backfill for Dripple Video Processing Backend
+
+Imports a directory of existing videos, or recomputes the metadata and
+thumbnails of the videos already in the database (for example after a
+change to FFmpegService). Files are probed, hashed and thumbnailed in a
+pool of worker processes; the results are written with one bulk insert or
+update per batch. Every committed batch is recorded in a checkpoint file,
+so an interrupted run started again with the same arguments carries on
+where it stopped.
+
+    python backfill.py import /mnt/library --workers 8
+    python backfill.py refresh --workers 8
+    python backfill.py refresh --no-thumbnails --restart
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+from app.config.database import SessionLocal
+from app.models.video import Video
+from app.services.ffmpeg_service import FFmpegService
+from app.services.storage_service import StorageService
+from app.tasks.routing import current_node
+
+# Services of a pool worker, created once per process
+_services = {}
+
+
+def _ffmpeg() -> FFmpegService:
+    if "ffmpeg" not in _services:
+        _services["ffmpeg"] = FFmpegService()
+    return _services["ffmpeg"]
+
+
+def import_file(source: str, user_id: Optional[str] = None) -> Dict[str, Any]:
+    """Copy one file into storage with its metadata and thumbnail; runs in a pool worker.
+
+    Returns the video row to insert, or ``{"source", "error"}``.
+    """
+    ffmpeg = _ffmpeg()
+    storage = ffmpeg.storage
+    try:
+        metadata = ffmpeg.get_video_metadata(source)
+        video_id = uuid.uuid4()
+        file_path = str(storage.upload_path(uuid.uuid4(), source))
+        with storage.staged_outputs(file_path) as (scratch_path,):
+            shutil.copyfile(source, scratch_path)
+        thumbnail_path = storage.create_processed_file_path(video_id, "thumbnail.jpg")
+        ffmpeg.generate_thumbnail(file_path, thumbnail_path)
+        return {
+            "source": source,
+            "row": {
+                "id": video_id,
+                "filename": os.path.basename(file_path),
+                "original_filename": os.path.basename(source),
+                "file_path": file_path,
+                "file_size": metadata["size"],
+                "duration": metadata["duration"],
+                "format": metadata["format"],
+                "resolution": metadata["resolution"],
+                "fps": metadata["fps"],
+                "bitrate": metadata["bitrate"],
+                "thumbnail_path": thumbnail_path,
+                "content_hash": storage.file_hash(file_path),
+                "storage_node": current_node(),
+                "user_id": uuid.UUID(user_id) if user_id else None,
+                "status": "uploaded"
+            }
+        }
+    except Exception as e:
+        return {"source": source, "error": str(e)}
+
+
+def refresh_video(video: Dict[str, Any], thumbnails: bool = True) -> Dict[str, Any]:
+    """Probe a stored video again and redo its thumbnail; runs in a pool worker.
+
+    Returns the changed columns, keyed by ``id``, or ``{"source", "error"}``.
+    """
+    ffmpeg = _ffmpeg()
+    try:
+        local_path = ffmpeg.storage.ensure_local(video["file_path"], node=video["storage_node"])
+        metadata = ffmpeg.get_video_metadata(local_path)
+        row = {
+            "id": video["id"],
+            "file_size": metadata["size"],
+            "duration": metadata["duration"],
+            "format": metadata["format"],
+            "resolution": metadata["resolution"],
+            "fps": metadata["fps"],
+            "bitrate": metadata["bitrate"]
+        }
+        if thumbnails:
+            row["thumbnail_path"] = ffmpeg.generate_thumbnail(
+                local_path, ffmpeg.storage.create_processed_file_path(video["id"], "thumbnail.jpg"))
+        return {"source": str(video["id"]), "row": row}
+    except Exception as e:
+        return {"source": str(video["id"]), "error": str(e)}
+
+
+class Checkpoint:
+    """Items finished by earlier runs, one per line, appended after every committed batch.
+
+    An item is only recorded once its rows are committed, so a crash
+    between the two at worst repeats a batch of work.
+    """
+
+    def __init__(self, path: str, restart: bool = False):
+        self.path = Path(path)
+        if restart and self.path.exists():
+            self.path.unlink()
+        self.done: Set[str] = set(self.path.read_text().split("\n")) - {""} if self.path.exists() else set()
+
+    def record(self, items: Iterable[str]) -> None:
+        with open(self.path, "a") as f:
+            f.write("".join(f"{item}\n" for item in items))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+
+
+class Throughput:
+    """Running totals for the progress report"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.started = time.monotonic()
+        self.done = 0
+        self.failed = 0
+        self.skipped = 0  # Done, but already in the library
+        self.bytes = 0
+
+    def add(self, results: List[Dict[str, Any]]) -> None:
+        for result in results:
+            if "error" in result:
+                self.failed += 1
+            else:
+                self.done += 1
+                self.bytes += result["row"].get("file_size") or 0
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return (f"{self.done + self.failed}/{self.total} videos, {self.failed} failed, {self.skipped} duplicates, "
+                f"{self.done / elapsed:.1f} videos/s, {self.bytes / elapsed / 1e6:.1f} MB/s, {elapsed:.0f}s")
+
+
+class Backfill:
+    """Runs a worker function over many items and writes the results back in batches"""
+
+    def __init__(self, db: Session, workers: int = None, batch_size: int = 100,
+                 checkpoint: Checkpoint = None, log=print):
+        self.db = db
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.log = log
+        self.errors: List[Dict[str, Any]] = []
+
+    def _batches(self, results: Iterator[Dict[str, Any]]) -> Iterator[List[Dict[str, Any]]]:
+        batch = []
+        for result in results:
+            batch.append(result)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _run(self, function, items: List[Any], keys: List[str], write) -> Throughput:
+        pending = [(item, key) for item, key in zip(items, keys)
+                   if not self.checkpoint or key not in self.checkpoint.done]
+        throughput = Throughput(len(pending))
+        if len(pending) < len(items):
+            self.log(f"Resuming: {len(items) - len(pending)} videos were done by an earlier run")
+        if not pending:
+            return throughput
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            # Results come back in submission order, a chunk of items per worker round trip
+            chunksize = max(1, min(16, len(pending) // (self.workers * 4)))
+            results = pool.map(function, [item for item, _ in pending], chunksize=chunksize)
+            for batch in self._batches(results):
+                rows = [result["row"] for result in batch if "error" not in result]
+                throughput.skipped += write(rows)
+                self.db.commit()
+                if self.checkpoint:
+                    # Failed items stay out of the checkpoint, so the next run retries them
+                    self.checkpoint.record(result["source"] for result in batch if "error" not in result)
+                self.errors.extend(result for result in batch if "error" in result)
+                throughput.add(batch)
+                self.log(throughput.report())
+        return throughput
+
+    def import_directory(self, directory: str, user_id: Optional[str] = None) -> Throughput:
+        """Import every video file under ``directory``"""
+        storage = StorageService()
+        sources = sorted(
+            str(path) for path in Path(directory).rglob("*")
+            if path.is_file() and storage.validate_file(path.name, 0)
+        )
+        function = import_file if user_id is None else _ImportAs(user_id)
+
+        def write(rows: List[Dict[str, Any]]) -> int:
+            # A file whose content is already in the library is not imported twice
+            known = {content_hash for (content_hash,) in self.db.query(Video.content_hash).filter(
+                Video.content_hash.in_([row["content_hash"] for row in rows]))} if rows else set()
+            fresh, seen = [], set(known)
+            for row in rows:
+                if row["content_hash"] in seen:
+                    storage.delete_upload(row["file_path"])
+                    storage.delete_directory(str(storage.video_dir(row["id"])))
+                else:
+                    seen.add(row["content_hash"])
+                    fresh.append(row)
+            if fresh:
+                self.db.execute(insert(Video), fresh)
+            return len(rows) - len(fresh)
+
+        return self._run(function, sources, sources, write)
+
+    def refresh_library(self, thumbnails: bool = True) -> Throughput:
+        """Recompute metadata (and thumbnails) of every video in the database"""
+        videos = [
+            {"id": video_id, "file_path": file_path, "storage_node": storage_node}
+            for video_id, file_path, storage_node in self.db.query(
+                Video.id, Video.file_path, Video.storage_node
+            ).order_by(Video.created_at, Video.id)
+        ]
+        self.db.commit()
+
+        def write(rows: List[Dict[str, Any]]) -> int:
+            if rows:
+                # Bulk UPDATE by primary key, one statement for the batch
+                self.db.execute(update(Video), rows)
+            return 0
+
+        function = refresh_video if thumbnails else _RefreshMetadata()
+        return self._run(function, videos, [str(video["id"]) for video in videos], write)
+
+
+class _ImportAs:
+    """``import_file`` for one owner; a class so the pool can pickle it"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+
+    def __call__(self, source: str) -> Dict[str, Any]:
+        return import_file(source, self.user_id)
+
+
+class _RefreshMetadata:
+    """``refresh_video`` without thumbnails; a class so the pool can pickle it"""
+
+    def __call__(self, video: Dict[str, Any]) -> Dict[str, Any]:
+        return refresh_video(video, thumbnails=False)
+
+
+def main():
+    """Backfill runner"""
+    parser = argparse.ArgumentParser(description="Import a video library or recompute stored metadata and thumbnails")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Videos written per database commit")
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: .backfill-<command>.checkpoint)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of an earlier run")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="Import every video file under a directory")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--user-id", help="Owner of the imported videos")
+    refresh_parser = commands.add_parser("refresh", help="Probe every stored video again and redo its thumbnail")
+    refresh_parser.add_argument("--no-thumbnails", action="store_true", help="Only recompute metadata")
+    args = parser.parse_args()
+
+    checkpoint = Checkpoint(args.checkpoint or f".backfill-{args.command}.checkpoint", restart=args.restart)
+    db = SessionLocal()
+    try:
+        backfill = Backfill(db, workers=args.workers, batch_size=args.batch_size, checkpoint=checkpoint)
+        if args.command == "import":
+            throughput = backfill.import_directory(args.directory, args.user_id)
+        else:
+            throughput = backfill.refresh_library(thumbnails=not args.no_thumbnails)
+    finally:
+        db.close()
+
+    print(f"📦 Done: {throughput.report()}")
+    for error in backfill.errors:
+        print(f"⚠️  {error['source']}: {error['error']}")
+    if not backfill.errors:
+        checkpoint.remove()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Encoding benchmark for Dripple Video Processing Backend
+
+Encodes the bundled sample clips with every encoding profile (or every
+ladder codec) and reports encode speed and output size, so changes can be
+compared.
+
+    python benchmark.py profiles
+    python benchmark.py profiles --quality 480p --profiles fast balanced
+    python benchmark.py codecs --codecs h264 vp9 av1
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from app.services.ffmpeg_service import FFmpegService
+from app.services.encoding_profiles import list_profiles, get_encoding_profile, CODECS
+
+SAMPLE_CLIPS = ["B-roll-1.mp4", "B-roll-2.mp4"]
+
+
+def _frame_count(ffmpeg: FFmpegService, path: str) -> int:
+    """Frames in a file, from the container or estimated from duration x fps"""
+    probe = ffmpeg.probe(path)
+    stream = next(s for s in probe["streams"] if s["codec_type"] == "video")
+    if stream.get("nb_frames"):
+        return int(stream["nb_frames"])
+    num, den = stream.get("r_frame_rate", "0/1").split("/")
+    return int(float(probe["format"]["duration"]) * int(num) / max(int(den), 1))
+
+
+def _run_matrix(clips, quality, variants):
+    """Encode every clip once per (label, profile, codec) variant and time it"""
+    ffmpeg = FFmpegService()
+    rows = []
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        for clip in clips:
+            probe = ffmpeg.probe(clip)
+            frames = _frame_count(ffmpeg, clip)
+            duration = float(probe["format"]["duration"])
+
+            for label, profile, codec in variants:
+                plan = ffmpeg.plan_quality_versions(probe, [quality], codec=codec)[quality]
+                if plan["action"] == "skip":
+                    print(f"⏭️  {clip}: {plan['reason']}")
+                    break
+                # Always measure the encoder, even when the rung could be remuxed
+                plan = {**plan, "action": "transcode"}
+
+                started = time.perf_counter()
+                result = ffmpeg.generate_quality_versions(
+                    clip, output_dir, [quality], plans={quality: plan}, profile=profile, codec=codec
+                )
+                elapsed = time.perf_counter() - started
+                output_path = Path(result[quality])
+                size = output_path.stat().st_size
+
+                rows.append({
+                    "variant": label,
+                    "clip": Path(clip).name,
+                    "seconds": elapsed,
+                    "fps": frames / elapsed if elapsed else 0.0,
+                    "size_kb": size / 1024,
+                    "kbps": size * 8 / 1000 / duration if duration else 0.0
+                })
+                output_path.unlink()
+
+    return rows
+
+
+def benchmark_profiles(clips, quality, profile_names=None):
+    """Encode every clip with every profile and return one result row per encode"""
+    profiles = list_profiles()
+    names = profile_names or list(profiles)
+    return _run_matrix(clips, quality, [(name, profiles[name], "h264") for name in names])
+
+
+def benchmark_codecs(clips, quality, codecs=None, profile_name=None):
+    """Encode every clip with every ladder codec using one profile"""
+    profile = get_encoding_profile(profile_name)
+    return _run_matrix(clips, quality, [(codec, profile, codec) for codec in codecs or list(CODECS)])
+
+
+def print_rows(rows, heading):
+    """Print benchmark rows as an aligned table"""
+    print(f"{heading:<12} {'clip':<16} {'seconds':>8} {'fps':>8} {'size KB':>10} {'kbps':>8}")
+    for row in rows:
+        print(
+            f"{row['variant']:<12} {row['clip']:<16} {row['seconds']:>8.2f} {row['fps']:>8.1f} "
+            f"{row['size_kb']:>10.1f} {row['kbps']:>8.0f}"
+        )
+
+
+def main():
+    """Main benchmark runner"""
+    parser = argparse.ArgumentParser(description="Benchmark encoding settings on the sample clips")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    profiles_parser = subparsers.add_parser("profiles", help="Compare encoding profiles")
+    profiles_parser.add_argument("--quality", default="720p", help="Ladder rung to encode")
+    profiles_parser.add_argument("--profiles", nargs="*", help="Profile names (default: all)")
+    profiles_parser.add_argument("--clips", nargs="*", default=SAMPLE_CLIPS)
+
+    codecs_parser = subparsers.add_parser("codecs", help="Compare ladder codecs")
+    codecs_parser.add_argument("--quality", default="720p", help="Ladder rung to encode")
+    codecs_parser.add_argument("--codecs", nargs="*", choices=list(CODECS), help="Codecs (default: all)")
+    codecs_parser.add_argument("--profile", help="Encoding profile (default: the configured default)")
+    codecs_parser.add_argument("--clips", nargs="*", default=SAMPLE_CLIPS)
+
+    args = parser.parse_args()
+
+    if args.command == "profiles":
+        print(f"🧪 Benchmarking encoding profiles at {args.quality}")
+        print_rows(benchmark_profiles(args.clips, args.quality, args.profiles), "profile")
+    elif args.command == "codecs":
+        print(f"🧪 Benchmarking ladder codecs at {args.quality}")
+        print_rows(benchmark_codecs(args.clips, args.quality, args.codecs, args.profile), "codec")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Storage layout migration for Dripple Video Processing Backend
+
+Moves files from the old flat upload/processed directories into the sharded
+``ab/cd/<id>/`` layout and rewrites the paths stored in the database. Each
+video is committed on its own, so an interrupted run can simply be started
+again; files already in place are skipped.
+
+    python migrate_storage.py --dry-run
+    python migrate_storage.py
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add the app directory to the Python path
+sys.path.append(str(Path(__file__).parent))
+
+from sqlalchemy.orm import Session
+from app.config.database import SessionLocal
+from app.models.video import Video, VideoQuality, ProcessedVideo
+from app.models.job import Job
+from app.services.storage_service import StorageService
+
+# Job parameters that hold paths of uploaded images
+UPLOAD_PARAMETERS = ("overlay_path", "watermark_path", "file_path")
+
+
+class StorageMigration:
+    """Moves one video at a time and remembers every path it rewrote"""
+
+    def __init__(self, db: Session, storage: StorageService = None, dry_run: bool = False):
+        self.db = db
+        self.storage = storage or StorageService()
+        self.dry_run = dry_run
+        self.moved = {}  # Old path -> new path
+        self.missing = []
+
+    def move(self, old_path: str, new_path) -> str:
+        """Move a file to its new home and return the path to store"""
+        new_path = str(new_path)
+        if not old_path or old_path == new_path:
+            return old_path
+        if old_path in self.moved:
+            return self.moved[old_path]
+
+        if os.path.exists(old_path):
+            if not self.dry_run:
+                self.storage.publish(old_path, new_path)
+        elif not os.path.exists(new_path):
+            # Neither here nor there: keep the row as it is so nothing points at a guess
+            self.missing.append(old_path)
+            return old_path
+        self.moved[old_path] = new_path
+        return new_path
+
+    def move_upload(self, old_path: str) -> str:
+        """Uploads keep their id-based name and get a shard directory of their own"""
+        if not old_path:
+            return old_path
+        name = Path(old_path).name
+        return self.move(old_path, self.storage.upload_path(Path(name).stem, name))
+
+    def move_derivative(self, video_id, old_path: str) -> str:
+        if not old_path:
+            return old_path
+        return self.move(old_path, self.storage.video_dir(video_id) / Path(old_path).name)
+
+    def migrate_video(self, video: Video) -> None:
+        video.file_path = self.move_upload(video.file_path)
+        video.thumbnail_path = self.move_derivative(video.id, video.thumbnail_path)
+
+        for quality in self.db.query(VideoQuality).filter(VideoQuality.video_id == video.id):
+            quality.file_path = self.move_derivative(video.id, quality.file_path)
+
+        for processed in self.db.query(ProcessedVideo).filter(ProcessedVideo.original_video_id == video.id):
+            processed.file_path = self.move_derivative(video.id, processed.file_path)
+
+        for job in self.db.query(Job).filter(Job.video_id == video.id):
+            job.parameters = self.migrate_parameters(job.parameters)
+            if job.result_path:
+                job.result_path = self.rewrite(job.result_path)
+
+    def migrate_parameters(self, value, key=None):
+        """Copy of job parameters with uploaded image paths moved"""
+        if isinstance(value, dict):
+            return {k: self.migrate_parameters(v, k) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.migrate_parameters(v) for v in value]
+        if key in UPLOAD_PARAMETERS and isinstance(value, str):
+            return self.move_upload(value)
+        return value
+
+    def rewrite(self, text: str) -> str:
+        """Result paths may be a single path or a rendering of several (ladders)"""
+        if text in self.moved:
+            return self.moved[text]
+        for old_path, new_path in self.moved.items():
+            text = text.replace(f"'{old_path}'", f"'{new_path}'")
+        return text
+
+    def run(self) -> int:
+        """Migrate every video; returns how many were processed"""
+        count = 0
+        for video in self.db.query(Video).order_by(Video.created_at).all():
+            self.migrate_video(video)
+            if self.dry_run:
+                self.db.rollback()
+            else:
+                self.db.commit()
+            count += 1
+        if not self.dry_run:
+            self.remove_empty_directories()
+        return count
+
+    def remove_empty_directories(self) -> None:
+        """Drop the old per-video rendition directories once they are empty"""
+        for old_path in self.moved:
+            directory = Path(old_path).parent
+            if directory != self.storage.processed_dir and directory.parent == self.storage.processed_dir:
+                try:
+                    directory.rmdir()
+                except OSError:
+                    pass  # Not empty or already gone
+
+
+def main():
+    """Main migration runner"""
+    parser = argparse.ArgumentParser(description="Move stored files into the sharded directory layout")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would move without changing anything")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        migration = StorageMigration(db, dry_run=args.dry_run)
+        videos = migration.run()
+    finally:
+        db.close()
+
+    verb = "Would move" if args.dry_run else "Moved"
+    print(f"📦 {verb} {len(migration.moved)} files for {videos} videos")
+    for path in migration.missing:
+        print(f"⚠️  Missing, left unchanged: {path}")
+
+
+if __name__ == "__main__":
+    main()
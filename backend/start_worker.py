@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Start a Celery worker for one processing lane
+
+    python start_worker.py --lane encode_heavy
+    python start_worker.py                      # every lane, for development
+
+Each lane gets the concurrency and time limits from LANES in
+app/config/celery_config.py; extra arguments are passed to celery.
+"""
+
+import argparse
+import os
+from app.config.celery_config import LANES
+
+
+def worker_command(lane: str = None, loglevel: str = "info", extra=()) -> list:
+    """Celery command line for a worker serving ``lane`` (all queues when None)"""
+    cmd = ["celery", "-A", "app.config.celery_config", "worker", f"--loglevel={loglevel}"]
+    if lane:
+        config = LANES[lane]
+        cmd += [
+            "-Q", lane,
+            "-n", f"{lane}@%h",
+            f"--concurrency={config['concurrency']}",
+            f"--soft-time-limit={config['soft_time_limit']}",
+            f"--time-limit={config['time_limit']}",
+        ]
+    return cmd + list(extra)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Start a Celery worker for a processing lane")
+    parser.add_argument("--lane", choices=sorted(LANES), help="Lane to serve (default: every queue)")
+    parser.add_argument("--loglevel", default="info")
+    args, extra = parser.parse_known_args()
+
+    cmd = worker_command(args.lane, args.loglevel, extra)
+    print(" ".join(cmd))
+    os.execvp(cmd[0], cmd)
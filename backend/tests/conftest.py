@@ -1,13 +1,25 @@
+import os
+import tempfile
 import pytest
+
+# Keep the database and every file a test writes in a throwaway directory, set before the app reads its settings
+TEST_DIR = tempfile.TemporaryDirectory(prefix="dripple-tests-")
+SQLALCHEMY_DATABASE_URL = f"sqlite:///{TEST_DIR.name}/test.db"
+os.environ["DATABASE_URL"] = SQLALCHEMY_DATABASE_URL
+for name in ("upload", "processed", "scratch"):
+    os.environ[f"{name.upper()}_DIR"] = os.path.join(TEST_DIR.name, name)
+
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+import app.config.database as database
 from app.main import app
 from app.config.database import get_db, Base
 from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import Video
 
 # Create test database
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -38,6 +50,58 @@ def test_db():
         db.close()
 
 
+@pytest.fixture
+def db_session():
+    """Test database session whose rows are removed afterwards"""
+    db = TestingSessionLocal()
+    try:
+        yield db
+    finally:
+        db.rollback()
+        for table in reversed(Base.metadata.sorted_tables):
+            db.execute(table.delete())
+        db.commit()
+        db.close()
+
+
+def new_video(**fields) -> Video:
+    """An unsaved 10 s 640x360 video; keyword arguments override the defaults"""
+    return Video(**{"filename": "a.mp4", "original_filename": "a.mp4", "file_path": "a.mp4", "file_size": 1,
+                    "duration": 10.0, "format": "mp4", "resolution": "640x360", **fields})
+
+
+@pytest.fixture
+def make_video(db_session, monkeypatch, tmp_path):
+    """Store videos with a small source file in ``tmp_path``; tasks run by the test use the test database"""
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+
+    def make_video(content: bytes = b"video", **fields) -> Video:
+        if "file_path" not in fields:
+            source = tmp_path / fields.get("filename", "a.mp4")
+            source.write_bytes(content)
+            fields.update(file_path=str(source), file_size=len(content))
+        video = new_video(**fields)
+        db_session.add(video)
+        db_session.commit()
+        return video
+
+    return make_video
+
+
+@pytest.fixture
+def video(make_video):
+    return make_video()
+
+
+@pytest.fixture
+def job(db_session, video):
+    """A pending trim of the first five seconds of ``video``"""
+    job = Job(video_id=video.id, job_type="trim", parameters={"start_time": 0, "end_time": 5})
+    db_session.add(job)
+    db_session.commit()
+    return job
+
+
 @pytest.fixture
 def sample_video_file():
     """Create a sample video file for testing"""
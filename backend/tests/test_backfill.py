@@ -0,0 +1,107 @@
+import os
+import pytest
+from app.config.settings import settings
+from app.models.video import Video
+from app.services.ffmpeg_service import FFmpegService
+from app.services.storage_service import StorageService
+from backfill import Backfill, Checkpoint
+
+METADATA = {"duration": 2.0, "size": 5, "format": "mov,mp4", "resolution": "640x360", "fps": 25.0, "bitrate": 800000}
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "processed_dir", str(tmp_path / "processed"))
+    monkeypatch.setattr(settings, "scratch_dir", str(tmp_path / "scratch"))
+
+    # Pool workers are forked, so they see these stand-ins for ffprobe and ffmpeg
+    def get_video_metadata(self, path):
+        if "broken" in os.path.basename(path) and not os.path.exists(str(tmp_path / "fixed")):
+            raise Exception("Error extracting metadata: moov atom not found")
+        return dict(METADATA, size=os.path.getsize(path))
+
+    def generate_thumbnail(self, video_path, output_path, timestamp=1.0):
+        with self.storage.staged_outputs(output_path) as (scratch_path,):
+            open(scratch_path, "wb").close()
+        return output_path
+
+    monkeypatch.setattr(FFmpegService, "get_video_metadata", get_video_metadata)
+    monkeypatch.setattr(FFmpegService, "generate_thumbnail", generate_thumbnail)
+    return tmp_path
+
+
+@pytest.fixture
+def library(dirs):
+    library = dirs / "library"
+    (library / "2024").mkdir(parents=True)
+    (library / "a.mp4").write_bytes(b"first")
+    (library / "2024" / "b.MOV").write_bytes(b"second")
+    (library / "z-copy-of-a.mp4").write_bytes(b"first")
+    (library / "notes.txt").write_text("not a video")
+    return library
+
+
+def test_import_bulk_inserts_new_videos_once(dirs, library, db_session):
+    checkpoint = Checkpoint(str(dirs / "import.checkpoint"))
+    backfill = Backfill(db_session, workers=2, batch_size=2, checkpoint=checkpoint, log=lambda line: None)
+    throughput = backfill.import_directory(str(library))
+
+    videos = db_session.query(Video).order_by(Video.original_filename).all()
+    assert [video.original_filename for video in videos] == ["a.mp4", "b.MOV"]
+    assert throughput.done == 3 and throughput.skipped == 1 and throughput.failed == 0
+    for video in videos:
+        assert os.path.exists(video.file_path) and os.path.exists(video.thumbnail_path)
+        assert video.content_hash == StorageService().file_hash(video.file_path)
+        assert video.resolution == "640x360" and video.status == "uploaded"
+    # The duplicate's copy was removed again
+    assert len([f for f in (dirs / "uploads").rglob("*") if f.is_file()]) == 2
+
+    # Every file is in the checkpoint, so a second run has nothing to do
+    again = Backfill(db_session, workers=2, checkpoint=Checkpoint(checkpoint.path), log=lambda line: None)
+    assert again.import_directory(str(library)).total == 0
+    assert db_session.query(Video).count() == 2
+
+
+def test_interrupted_import_resumes_with_failed_files(dirs, library, db_session):
+    (library / "broken.mp4").write_bytes(b"truncated")
+    checkpoint = Checkpoint(str(dirs / "import.checkpoint"))
+    backfill = Backfill(db_session, workers=2, batch_size=10, checkpoint=checkpoint, log=lambda line: None)
+    throughput = backfill.import_directory(str(library))
+    assert throughput.failed == 1
+    assert [error["source"] for error in backfill.errors] == [str(library / "broken.mp4")]
+    assert str(library / "broken.mp4") not in Checkpoint(checkpoint.path).done
+
+    # Once the file is readable, the next run retries only that file
+    (dirs / "fixed").touch()
+    resumed = Backfill(db_session, workers=2, checkpoint=Checkpoint(checkpoint.path), log=lambda line: None)
+    throughput = resumed.import_directory(str(library))
+    assert throughput.total == 1 and throughput.done == 1 and not resumed.errors
+    assert db_session.query(Video).count() == 3
+
+    # --restart forgets the checkpoint; duplicates are still not imported again
+    restarted = Backfill(db_session, workers=2, checkpoint=Checkpoint(checkpoint.path, restart=True),
+                         log=lambda line: None)
+    assert restarted.import_directory(str(library)).skipped == 4
+    assert db_session.query(Video).count() == 3
+
+
+def test_refresh_rewrites_metadata_and_thumbnails(dirs, db_session):
+    storage = StorageService()
+    videos = []
+    for i in range(3):
+        path = storage.save_uploaded_file(b"x" * (i + 1), "clip.mp4")
+        videos.append(Video(filename="clip.mp4", original_filename="clip.mp4", file_path=path, file_size=0,
+                            duration=0, format="unknown", resolution="0x0"))
+    db_session.add_all(videos)
+    db_session.commit()
+
+    backfill = Backfill(db_session, workers=2, batch_size=2, log=lambda line: None)
+    throughput = backfill.refresh_library()
+    assert throughput.done == 3
+
+    db_session.expire_all()
+    for i, video in enumerate(videos):
+        assert video.file_size == i + 1 and video.resolution == "640x360" and float(video.duration) == 2.0
+        assert video.thumbnail_path == storage.create_processed_file_path(video.id, "thumbnail.jpg")
+        assert os.path.exists(video.thumbnail_path)
@@ -0,0 +1,133 @@
+import uuid
+import pytest
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.outbox import OutboxMessage
+from app.services.ffmpeg_service import FFmpegService
+from app.services.outbox import enqueue
+from app.tasks import process_video_upload
+from app.tasks.scheduling import relay_outbox
+from tests.conftest import client
+
+OWNER = uuid.uuid4()
+
+
+@pytest.fixture
+def videos(make_video):
+    return [
+        make_video(filename=f"{i}.mp4", resolution="1280x720", content_hash=f"{i:064x}", user_id=OWNER if i < 3 else None)
+        for i in range(4)
+    ]
+
+
+def test_batch_queues_one_job_per_video(db_session, videos, monkeypatch):
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    response = client.post("/api/v1/batches/", json={
+        "video_ids": [str(video.id) for video in videos[:3]],
+        "operation": {"type": "quality", "qualities": ["480p"], "codecs": ["h264"]}
+    })
+    assert response.status_code == 200
+    batch = response.json()
+    assert batch["total_jobs"] == 3 and batch["skipped"] == 0
+    assert batch["status_counts"] == {"pending": 3} and batch["progress"] == 0.0 and not batch["done"]
+
+    jobs = db_session.query(Job).filter(Job.batch_id == uuid.UUID(batch["id"])).all()
+    assert {job.video_id for job in jobs} == {video.id for video in videos[:3]}
+    assert all(job.priority == "low" and job.parameters["qualities"] == ["480p"] for job in jobs)
+    assert db_session.query(OutboxMessage).count() == 3
+
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    assert relay_outbox() == 3
+    assert sorted(sent) == sorted(str(job.id) for job in jobs)
+
+    # Aggregate progress counts finished jobs as done
+    jobs[0].status, jobs[0].progress = "completed", 100
+    jobs[1].status, jobs[1].progress = "processing", 50
+    db_session.commit()
+    batch = client.get(f"/api/v1/batches/{batch['id']}").json()
+    assert batch["status_counts"] == {"completed": 1, "processing": 1, "pending": 1}
+    assert batch["progress"] == 50.0 and not batch["done"]
+    listed = client.get(f"/api/v1/batches/{batch['id']}/jobs", params={"status": "completed"}).json()
+    assert [job["id"] for job in listed] == [str(jobs[0].id)]
+
+
+def test_filter_selects_videos_and_skips_running_duplicates(db_session, videos):
+    request = {
+        "filter": {"user_id": str(OWNER)},
+        "operation": {"type": "watermark", "watermark_type": "text", "text": "(c) 2026"}
+    }
+    first = client.post("/api/v1/batches/", json=request).json()
+    assert first["total_jobs"] == 3
+
+    # The first batch is still queued, so a repeat adds nothing
+    again = client.post("/api/v1/batches/", json=request).json()
+    assert again["total_jobs"] == 0 and again["skipped"] == 3 and again["done"]
+    assert db_session.query(Job).count() == 3
+
+
+def test_videos_with_identical_content_get_one_job(db_session, videos):
+    videos[1].content_hash = videos[0].content_hash
+    db_session.commit()
+    response = client.post("/api/v1/batches/", json={
+        "video_ids": [str(video.id) for video in videos[:2]],
+        "operation": {"type": "watermark", "watermark_type": "text", "text": "(c) 2026"}
+    })
+    assert response.status_code == 200
+    assert response.json()["total_jobs"] == 1 and response.json()["skipped"] == 1
+
+
+def test_overlays_can_sit_on_the_frame_edge(db_session, videos):
+    response = client.post("/api/v1/batches/", json={
+        "video_ids": [str(videos[0].id)],
+        "operation": {"type": "overlay", "overlay_type": "text", "text": "Live", "position_x": 0, "position_y": 0}
+    })
+    assert response.status_code == 200
+    job = db_session.query(Job).one()
+    assert (job.parameters["position_x"], job.parameters["position_y"]) == (0, 0)
+
+
+def test_thumbnail_batches_rerun_the_upload_task(db_session, videos, monkeypatch):
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append((name, args)))
+    response = client.post("/api/v1/batches/", json={"filter": {}, "operation": {"type": "thumbnail"}})
+    assert response.json()["total_jobs"] == 4
+
+    relay_outbox()
+    jobs = db_session.query(Job).all()
+    assert sorted(sent) == sorted(("app.tasks.video_tasks.process_video_upload", [str(job.video_id), str(job.id)]) for job in jobs)
+    assert all(job.parameters == {"regenerate_thumbnail": True} for job in jobs)
+
+
+def test_each_upload_task_runs_its_own_job(db_session, videos, monkeypatch):
+    """Two upload jobs of one video both run, rather than both resolving to the newer one"""
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    monkeypatch.setattr(FFmpegService, "generate_thumbnail", lambda self, video_path, output_path, timestamp=1.0: output_path)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(args))
+    jobs = [Job(video_id=videos[0].id, job_type="upload", parameters={"regenerate_thumbnail": True}) for _ in range(2)]
+    for job in jobs:
+        db_session.add(job)
+        enqueue(db_session, job)
+    db_session.commit()
+
+    assert relay_outbox() == 2
+    for args in sent:
+        assert process_video_upload(*args)["status"] == "completed"
+    for job in jobs:
+        db_session.refresh(job)
+    assert [job.status for job in jobs] == ["completed", "completed"]
+
+
+def test_invalid_batches_are_rejected(db_session, videos):
+    rejected = [
+        {"operation": {"type": "thumbnail"}},
+        {"video_ids": [str(uuid.uuid4())], "operation": {"type": "thumbnail"}},
+        {"filter": {}, "operation": {"type": "quality", "qualities": ["9000p"]}},
+        {"filter": {}, "operation": {"type": "overlay", "overlay_type": "image", "file_path": "/etc/passwd"}},
+    ]
+    for request in rejected:
+        assert client.post("/api/v1/batches/", json=request).status_code == 400
+    assert db_session.query(Job).count() == 0
@@ -0,0 +1,65 @@
+import os
+import time
+from datetime import datetime, timezone
+import pytest
+import app.tasks.video_tasks as video_tasks
+from app.config.celery_config import celery_app
+from app.models.video import ProcessedVideo
+from app.services.ffmpeg_service import FFmpegService, EncodeResult, JobCancelled
+from app.tasks import process_video_trim
+from tests.conftest import client
+
+
+def test_cancelled_run_stops_its_child_promptly():
+    deadline = time.monotonic() + 0.3
+    ffmpeg = FFmpegService(cancelled=lambda: time.monotonic() > deadline)
+
+    started = time.monotonic()
+    with pytest.raises(JobCancelled):
+        ffmpeg.run(["sleep", "30"])
+    assert time.monotonic() - started < 2
+
+
+def test_cancel_revokes_sent_tasks(db_session, job, monkeypatch):
+    revoked = []
+    monkeypatch.setattr(celery_app.control, "revoke", lambda task_id, **kwargs: revoked.append(task_id))
+    job.task_id, job.dispatched_at = str(job.id), datetime.now(timezone.utc)
+    db_session.commit()
+
+    response = client.delete(f"/api/v1/jobs/{job.id}")
+    assert response.status_code == 200
+    assert revoked == [str(job.id)]
+    db_session.refresh(job)
+    assert job.status == "cancelled"
+
+
+def test_cancelled_job_never_starts(db_session, job):
+    job.status = "cancelled"
+    db_session.commit()
+
+    assert process_video_trim.run(job.id) == {"status": "cancelled"}
+    db_session.refresh(job)
+    assert job.status == "cancelled"
+
+
+def test_outputs_of_a_cancelled_run_are_removed(db_session, job, monkeypatch):
+    """A job cancelled after its encode finished is not completed, and its file is deleted"""
+    written = []
+
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        written.append(output_path)
+        client.delete(f"/api/v1/jobs/{job.id}")
+        return EncodeResult(path=output_path)
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    monkeypatch.setattr(video_tasks, "output_metadata", lambda ffmpeg, result: {
+        "size": 7, "duration": 5.0, "format": "mp4", "resolution": "640x360", "fps": 30.0, "bitrate": 1})
+
+    assert process_video_trim.run(job.id) == {"status": "cancelled"}
+    assert written and not os.path.exists(written[0])
+    db_session.refresh(job)
+    assert job.status == "cancelled"
+    assert db_session.query(ProcessedVideo).filter(ProcessedVideo.job_id == job.id).count() == 0
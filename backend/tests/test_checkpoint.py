@@ -0,0 +1,81 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+import app.tasks.video_tasks as video_tasks
+from app.config.settings import settings
+from app.models.video import ProcessedVideo, Video
+from app.services.checkpoint import Checkpoint
+from app.services.ffmpeg_service import FFmpegService, EncodeResult
+from app.tasks import process_video_trim
+from app.tasks.base import PermanentError, is_retryable
+
+METADATA = {"size": 7, "duration": 5.0, "format": "mp4", "resolution": "640x360", "fps": 30.0, "bitrate": 1}
+
+
+def test_stages_count_only_while_their_files_match(db_session, job, tmp_path):
+    output = tmp_path / "out.mp4"
+    output.write_bytes(b"encoded")
+    checkpoint = Checkpoint(db_session, job)
+    checkpoint.save("encode", {"frames": 10}, {"output": str(output)})
+
+    db_session.expire_all()
+    assert Checkpoint(db_session, job).get("encode") == {"frames": 10}
+    assert Checkpoint(db_session, job).get("thumbnail") is None
+
+    output.write_bytes(b"truncat")  # Same size, different content
+    assert Checkpoint(db_session, job).get("encode") is None
+
+    Checkpoint(db_session, job).discard()
+    assert job.checkpoint is None and not output.exists()
+
+
+def test_retry_resumes_after_the_finished_encode(db_session, job, monkeypatch):
+    """A database error after the trim keeps its output; the retry only writes the records"""
+    encodes = []
+
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        encodes.append(output_path)
+        return EncodeResult(path=output_path)
+
+    def lost_connection(ffmpeg, result):
+        raise OperationalError("SELECT 1", {}, Exception("server closed the connection"))
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    monkeypatch.setattr(video_tasks, "output_metadata", lost_connection)
+    with pytest.raises(OperationalError):
+        process_video_trim.run(job.id)  # Called directly, a retry re-raises
+    db_session.refresh(job)
+    assert job.status == "pending" and "encode" in job.checkpoint["stages"]
+
+    monkeypatch.setattr(video_tasks, "output_metadata", lambda ffmpeg, result: METADATA)
+    assert process_video_trim.run(job.id)["status"] == "completed"
+    assert len(encodes) == 1
+    processed = db_session.query(ProcessedVideo).filter(ProcessedVideo.job_id == job.id).one()
+    assert processed.file_path == encodes[0]
+
+
+def test_permanent_failures_are_not_retried(db_session, job, monkeypatch):
+    db_session.query(Video).update({"file_path": "/nonexistent/a.mp4"})
+    db_session.commit()
+
+    with pytest.raises(PermanentError):
+        process_video_trim.run(job.id)
+    db_session.refresh(job)
+    assert job.status == "failed" and "missing" in job.error_message
+
+    assert not is_retryable(ValueError("Video not found"))
+    assert is_retryable(OperationalError("SELECT 1", {}, Exception("timeout")))
+    assert is_retryable(Exception("Trimming failed: Conversion failed!"))
+
+
+def test_unreadable_files_are_not_retried(db_session, job, monkeypatch, tmp_path):
+    ffprobe = tmp_path / "ffprobe"
+    ffprobe.write_text("#!/bin/sh\necho 'moov atom not found' >&2\nexit 1\n")
+    ffprobe.chmod(0o755)
+    monkeypatch.setattr(settings, "ffprobe_path", str(ffprobe))
+
+    with pytest.raises(ValueError, match="moov atom not found"):
+        FFmpegService().get_video_metadata(str(tmp_path / "a.mp4"))
+    assert not is_retryable(ValueError("Error extracting metadata: FFprobe error"))
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+import app.config.database as database
+import app.services.cost_estimator as cost_estimator
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.services.cost_estimator import CostEstimator, TASK_OVERHEAD_SECONDS
+from app.tasks import process_pipeline
+from app.tasks.runner import JobRun
+import app.tasks.routing as routing
+from tests.conftest import TestingSessionLocal, client
+
+
+@pytest.fixture
+def video(make_video, monkeypatch):
+    monkeypatch.setattr(cost_estimator, "_calibration", {"at": 0.0, "rates": {}})
+    return make_video(duration=60.0, resolution="1920x1080")
+
+
+def add_job(db, video, **fields):
+    fields = {"job_type": "overlay", "parameters": {"encoding_profile": "balanced"}, **fields}
+    job = Job(video_id=video.id, **fields)
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_estimates_scale_with_pixels_and_profile(db_session, video):
+    estimator = CostEstimator(db_session)
+    balanced = estimator.estimate(add_job(db_session, video), video)
+    slow = estimator.estimate(Job(job_type="overlay", parameters={"encoding_profile": "quality"}), video)
+    trim = estimator.estimate(Job(job_type="trim", parameters={"start_time": 0, "end_time": 30}), video)
+
+    assert balanced.units == pytest.approx(1920 * 1080 / 1e6 * 60)
+    assert slow.cpu_seconds > balanced.cpu_seconds > trim.cpu_seconds
+    assert not balanced.calibrated
+
+
+def test_recorded_timings_calibrate_the_rates(db_session, video, monkeypatch):
+    monkeypatch.setattr(settings, "cost_calibration_min_samples", 3)
+    estimator = CostEstimator(db_session)
+    for _ in range(3):
+        job = add_job(db_session, video, status="completed", cost_units=100.0)
+        estimator.record(job, run_seconds=TASK_OVERHEAD_SECONDS + 50, cpu_seconds=200)
+    db_session.commit()
+
+    estimate = estimator.estimate(add_job(db_session, video), video)
+    assert estimate.calibrated
+    assert estimate.cpu_seconds == pytest.approx(estimate.units * 2)
+    assert estimate.wall_seconds == pytest.approx(TASK_OVERHEAD_SECONDS + estimate.units * 0.5)
+
+
+def test_limits_and_priority_follow_the_estimate(db_session, video):
+    estimator = CostEstimator(db_session)
+    short = estimator.estimate(Job(job_type="trim"), video)
+    long = estimator.estimate(add_job(db_session, video, parameters={"encoding_profile": "archive"}), video)
+
+    assert estimator.time_limits(short) == (settings.min_task_time_limit, settings.min_task_time_limit + 60)
+    soft, hard = estimator.time_limits(long)
+    assert soft == int(long.wall_seconds * settings.task_time_limit_factor) and hard > soft
+    # Lower runs first; the priority class outweighs job size
+    assert estimator.priority(short, "normal") < estimator.priority(long, "normal")
+    assert estimator.priority(long, "high") < estimator.priority(short, "normal")
+
+
+def test_pending_jobs_wait_for_their_lane(db_session, video):
+    earlier = datetime.now(timezone.utc) - timedelta(minutes=5)
+    add_job(db_session, video, lane="encode_light", estimated_seconds=600.0, created_at=earlier)
+    add_job(db_session, video, lane="encode_heavy", estimated_seconds=6000.0, created_at=earlier)
+    job = add_job(db_session, video, lane="encode_light", estimated_seconds=60.0)
+
+    response = client.get(f"/api/v1/jobs/status/{job.id}")
+    assert response.status_code == 200
+    eta = datetime.fromisoformat(response.json()["estimated_completion"])
+    # 600s of backlog over the lane's two workers, then the job itself
+    assert timedelta(seconds=350) < eta - datetime.now(timezone.utc) <= timedelta(seconds=361)
+
+    job.status, job.progress = "processing", 50
+    db_session.commit()
+    assert CostEstimator(db_session).predicted_completion(job) - datetime.now(timezone.utc) <= timedelta(seconds=30)
+
+
+def test_dispatch_applies_the_plan_and_runs_are_timed(db_session, video, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(routing, "queue_length", lambda queue: 0)
+    sent = {}
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.update(options))
+    job = add_job(db_session, video, job_type="pipeline", parameters={"operations": [{"type": "scale", "height": 720}]})
+
+    process_pipeline.delay(str(job.id))
+    db_session.refresh(job)
+    assert sent["queue"] == job.lane == "encode_light"
+    assert sent["soft_time_limit"] >= settings.min_task_time_limit and "priority" in sent
+    assert job.estimated_seconds > TASK_OVERHEAD_SECONDS
+
+    with JobRun(process_pipeline, job.id) as run:
+        run.start()
+        with run.stage("encode"):
+            pass
+        run.complete(result_path="out.mp4")
+    db_session.refresh(job)
+    assert job.status == "completed" and job.started_at <= job.completed_at
+    assert job.run_seconds >= 0 and job.cpu_seconds >= 0 and set(job.stage_seconds) == {"encode"}
@@ -0,0 +1,61 @@
+from app.services.ffmpeg_service import FFmpegService, EncodeResult, parse_outputs
+from app.tasks.video_tasks import output_metadata
+
+STDERR = """Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'src.mp4':
+  Duration: 00:00:06.00, start: 0.000000, bitrate: 356 kb/s
+  Stream #0:0[0x1](und): Video: h264 (High) (avc1 / 0x31637661), yuv420p, 1280x720, 220 kb/s, 25 fps, 25 tbr
+Output #0, null, to '/dev/null':
+  Stream #0:0: Video: wrapped_avframe, yuv420p(progressive), 1280x720, q=2-31, 200 kb/s, 25 fps, 25 tbn
+Output #1, mp4, to '/tmp/out 480p.mp4':
+  Metadata:
+    encoder         : Lavf61.1.100
+  Stream #1:0: Video: h264 (avc1 / 0x31637661), yuv420p(tv, progressive), 854x480 [SAR 1280:1281 DAR 16:9], q=2-31, 29.97 fps, 12800 tbn
+  Stream #1:1(und): Audio: aac (LC) (mp4a / 0x6134706D), 44100 Hz, stereo, fltp, 128 kb/s
+"""
+
+
+def test_outputs_are_read_from_the_log():
+    """Every output header yields its container, frame size and rate"""
+    outputs = parse_outputs(STDERR)
+    assert [o["format"] for o in outputs] == ["null", "mp4"]
+    assert outputs[1] == {"format": "mp4", "path": "/tmp/out 480p.mp4", "resolution": "854x480", "fps": 29.97}
+
+
+def test_complete_report_is_not_probed(monkeypatch):
+    probed = []
+    monkeypatch.setattr(FFmpegService, "get_video_metadata", lambda self, path: probed.append(path) or {})
+    result = EncodeResult(path="out.mp4", format="mp4", size=1000, duration=2.0,
+                          resolution="854x480", fps=25.0, bitrate=4000)
+
+    assert output_metadata(FFmpegService(), result) == {
+        "duration": 2.0, "size": 1000, "format": "mp4", "resolution": "854x480", "fps": 25.0, "bitrate": 4000
+    }
+    assert probed == []
+
+    # A run that could not report its frame size falls back to ffprobe
+    output_metadata(FFmpegService(), EncodeResult(path="out.mp4", format="mp4", size=1000, duration=2.0))
+    assert probed == ["out.mp4"]
+
+
+def test_unmeasured_output_is_probed(tmp_path, monkeypatch):
+    """An output ffmpeg reported no time for keeps no duration, so it is probed instead of trusted"""
+    output = tmp_path / "out.mp4"
+    fake = tmp_path / "ffmpeg"
+    fake.write_text(
+        "#!/usr/bin/env python3\n"
+        "import sys\n"
+        f"open({str(output)!r}, 'wb').write(bytes(261))\n"
+        f"sys.stderr.write({STDERR.replace('/tmp/out 480p.mp4', str(output))!r})\n"
+        "print('out_time_us=N/A')\n"
+        "print('progress=end')\n"
+    )
+    fake.chmod(0o755)
+
+    (result,) = FFmpegService().run_with_progress([str(fake)], duration=2.0)
+    assert (result.size, result.duration, result.bitrate) == (261, 0.0, 0)
+    assert not result.complete
+
+    probed = []
+    monkeypatch.setattr(FFmpegService, "get_video_metadata", lambda self, path: probed.append(path) or {})
+    output_metadata(FFmpegService(), result)
+    assert probed == [str(output)]
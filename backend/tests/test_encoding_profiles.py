@@ -0,0 +1,47 @@
+import pytest
+from app.services.encoding_profiles import EncodingProfile, get_encoding_profile
+
+
+def test_crf_profile_caps_ladder_bitrate():
+    """CRF profiles turn the rung bitrate into a VBV cap"""
+    args = EncodingProfile(name="t", preset="veryfast", crf=26).video_args("2500k")
+    assert args[args.index("-crf") + 1] == "26"
+    assert args[args.index("-maxrate") + 1] == "2500k"
+    assert args[args.index("-bufsize") + 1] == "5000k"
+    assert "-b:v" not in args
+
+
+def test_two_pass_only_for_bitrate_driven_encodes():
+    """Two-pass is used for ABR ladder rungs, never for CRF or bitrate-less encodes"""
+    profile = EncodingProfile(name="t", two_pass=True)
+    assert profile.uses_two_pass("1000k")
+    assert not profile.uses_two_pass(None)
+    assert not EncodingProfile(name="t", crf=20, two_pass=True).uses_two_pass("1000k")
+    args = profile.video_args("1000k", pass_number=2, passlog="/tmp/x")
+    assert args[args.index("-pass") + 1] == "2"
+    assert args[args.index("-b:v") + 1] == "1000k"
+
+
+def test_profile_resolution_order():
+    """Explicit name beats priority class, which beats the default"""
+    assert get_encoding_profile("quality", "high").name == "quality"
+    assert get_encoding_profile(None, "high").name == "fast"
+    assert get_encoding_profile().name == "balanced"
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        get_encoding_profile("nope")
+
+
+def test_codec_args_translate_profile():
+    """Non-H.264 codecs get their own encoder, CRF scale and speed options"""
+    profile = EncodingProfile(name="t", preset="veryfast", crf=26)
+    vp9 = profile.video_args("1000k", codec="vp9")
+    assert vp9[vp9.index("-c:v") + 1] == "libvpx-vp9"
+    assert vp9[vp9.index("-crf") + 1] == "36"
+    assert vp9[vp9.index("-b:v") + 1] == "1000k"
+    assert "-preset" not in vp9
+    hevc = profile.video_args("1000k", codec="hevc")
+    assert hevc[hevc.index("-tag:v") + 1] == "hvc1"
+    assert not EncodingProfile(name="t", two_pass=True).uses_two_pass("1000k", codec="hevc")
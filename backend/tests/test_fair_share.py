@@ -0,0 +1,132 @@
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import pytest
+import app.config.database as database
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.tenant import TenantShare
+from app.services.fair_share import FairShareScheduler
+from app.tasks import process_video_trim
+from app.tasks.scheduling import dispatch_held
+from tests.conftest import TestingSessionLocal, client
+
+TENANT_A, TENANT_B = str(uuid.uuid4()), str(uuid.uuid4())
+
+
+@pytest.fixture
+def videos(make_video):
+    return {tenant: make_video(user_id=uuid.UUID(tenant)) for tenant in (TENANT_A, TENANT_B)}
+
+
+def hold_jobs(db, videos, tenant, count, **fields):
+    base = datetime.now(timezone.utc) - timedelta(minutes=10)
+    jobs = []
+    for i in range(count):
+        job = Job(**{"video_id": videos[tenant].id, "job_type": "trim", "tenant": tenant, "task_id": str(uuid.uuid4()),
+                     "estimated_seconds": 60.0, "created_at": base + timedelta(seconds=i), **fields})
+        db.add(job)
+        jobs.append(job)
+    db.commit()
+    return jobs
+
+
+def dispatch(db):
+    released = []
+
+    def release(job):
+        released.append(job)
+        job.dispatched_at = datetime.now(timezone.utc)  # As planning a sent task does
+
+    FairShareScheduler(db).dispatch(release)
+    return Counter(job.tenant for job in released)
+
+
+def test_free_slots_are_shared_between_tenants(db_session, videos, monkeypatch):
+    """A tenant with a large backlog does not starve one that submitted later"""
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 4)
+    hold_jobs(db_session, videos, TENANT_A, 10)
+    hold_jobs(db_session, videos, TENANT_B, 2)
+
+    assert dispatch(db_session) == {TENANT_A: 2, TENANT_B: 2}
+    assert dispatch(db_session) == {}  # Every slot is taken
+
+    # Finished jobs free their slots; B has nothing left, so A gets them
+    db_session.query(Job).filter(Job.dispatched_at.isnot(None)).update({"status": "completed"})
+    db_session.commit()
+    assert dispatch(db_session) == {TENANT_A: 4}
+
+
+def test_weights_and_caps(db_session, videos, monkeypatch):
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 8)
+    monkeypatch.setattr(settings, "tenant_weights", {TENANT_A: 3.0})
+    hold_jobs(db_session, videos, TENANT_A, 10)
+    hold_jobs(db_session, videos, TENANT_B, 10)
+    assert dispatch(db_session) == {TENANT_A: 6, TENANT_B: 2}
+
+    db_session.query(Job).update({"status": "completed"})
+    monkeypatch.setattr(settings, "tenant_max_in_flight", {TENANT_A: 1})
+    hold_jobs(db_session, videos, TENANT_A, 5)
+    hold_jobs(db_session, videos, TENANT_B, 10)
+    assert dispatch(db_session) == {TENANT_A: 1, TENANT_B: 7}
+
+
+def test_zero_weight_tenants_stay_held(db_session, videos, monkeypatch):
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 4)
+    monkeypatch.setattr(settings, "tenant_weights", {TENANT_A: 0.0})
+    hold_jobs(db_session, videos, TENANT_A, 3)
+    hold_jobs(db_session, videos, TENANT_B, 1)
+
+    assert dispatch(db_session) == {TENANT_B: 1}
+    assert dispatch(db_session) == {}
+
+
+def test_deficit_carries_over_for_expensive_jobs(db_session, videos, monkeypatch):
+    """A job costing several quanta is released once its tenant has saved up for it"""
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 5)
+    monkeypatch.setattr(settings, "fair_share_quantum_seconds", 100.0)
+    hold_jobs(db_session, videos, TENANT_A, 1, estimated_seconds=350.0)
+    hold_jobs(db_session, videos, TENANT_B, 10, estimated_seconds=None)
+
+    # A saves for four rounds while B releases a one-second job per round
+    assert dispatch(db_session) == {TENANT_A: 1, TENANT_B: 4}
+
+
+def test_submissions_are_held_and_reported(db_session, videos, monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 1)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    jobs = [Job(video_id=videos[TENANT_A].id, job_type="trim", parameters={"start_time": 0, "end_time": 5})
+            for _ in range(3)]
+    db_session.add_all(jobs)
+    db_session.commit()
+
+    for job in jobs:
+        process_video_trim.delay(str(job.id))
+    assert sent == [str(jobs[0].id)]  # Jobs run under their own id
+
+    response = client.get("/api/v1/jobs/tenants")
+    assert response.status_code == 200
+    stats = {entry["tenant"]: entry for entry in response.json()}
+    assert stats[TENANT_A]["queued"] == 2 and stats[TENANT_A]["in_flight"] == 1
+    assert stats[TENANT_A]["oldest_wait_seconds"] >= 0
+
+
+def test_released_jobs_commit_with_the_dispatch(db_session, videos, monkeypatch):
+    """Releasing plans the tasks in the scheduler's own transaction"""
+    def no_other_session():
+        raise AssertionError("planning opened a session of its own")
+
+    monkeypatch.setattr(database, "SessionLocal", no_other_session)
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 2)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    jobs = hold_jobs(db_session, videos, TENANT_A, 3)
+
+    assert dispatch_held(db_session) == 2
+    assert sent == [job.task_id for job in jobs[:2]]
+    db_session.expire_all()
+    assert [bool(job.dispatched_at) for job in jobs] == [True, True, False]
+    assert jobs[0].lane == "remux" and db_session.query(TenantShare).filter_by(tenant=TENANT_A).one().last_served_at
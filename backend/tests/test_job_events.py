@@ -0,0 +1,178 @@
+import json
+import threading
+import time
+import uuid
+import pytest
+import app.services.job_events as job_events
+import app.tasks.video_tasks as video_tasks
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import Video
+from app.services.ffmpeg_service import FFmpegService, EncodeResult
+from app.services.job_events import hub
+from app.tasks import process_video_trim
+from app.tasks.base import PermanentError
+from app.tasks.runner import JobRun
+from tests.conftest import TestingSessionLocal, client
+
+METADATA = {"size": 7, "duration": 5.0, "format": "mp4", "resolution": "640x360", "fps": 30.0, "bitrate": 1}
+
+
+class RecordingRedis:
+    """Keeps what the publisher writes, in place of a Redis server"""
+
+    def __init__(self):
+        self.published = []
+        self.values = {}
+
+    def pipeline(self, transaction=True):
+        return self
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def publish(self, channel, data):
+        self.published.append(json.loads(data))
+
+    def execute(self):
+        pass
+
+    def get(self, key):
+        return self.values.get(key)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    recording = RecordingRedis()
+    monkeypatch.setattr(job_events, "_client", recording)
+    # Events are handed to the hub directly instead of through a subscription
+    monkeypatch.setattr(hub, "start", lambda: None)
+    return recording
+
+
+@pytest.fixture
+def video(make_video):
+    return make_video(user_id=uuid.uuid4())
+
+
+def event(job_id, status, progress=0, batch_id=None, tenant="default"):
+    return {"job_id": str(job_id), "batch_id": str(batch_id) if batch_id else None, "tenant": tenant,
+            "status": status, "progress": progress}
+
+
+def dispatch_when_subscribed(topic, *events):
+    """Hand events to the hub once the endpoint under test has subscribed to ``topic``"""
+    def dispatch():
+        deadline = time.monotonic() + 5
+        while topic not in hub.subscribers and time.monotonic() < deadline:
+            time.sleep(0.01)
+        for job_event in events:
+            hub.dispatch(job_event)
+
+    threading.Thread(target=dispatch, daemon=True).start()
+
+
+def test_workers_publish_each_state_change(db_session, job, redis, monkeypatch):
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        return EncodeResult(path=output_path)
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    monkeypatch.setattr(video_tasks, "output_metadata", lambda ffmpeg, result: METADATA)
+    assert process_video_trim.run(job.id)["status"] == "completed"
+
+    assert [(e["status"], e["progress"]) for e in redis.published] == [
+        ("processing", 0), ("processing", 30), ("processing", 80), ("completed", 100)
+    ]
+    assert all(e["job_id"] == str(job.id) and e["tenant"] == str(job.video.user_id) for e in redis.published)
+    assert redis.published[-1]["result_path"].endswith(".mp4")
+    assert job_events.last_event(job.id)["status"] == "completed"
+
+
+def test_progress_is_stored_on_the_job_row(db_session, job, redis, monkeypatch):
+    """Status polling sees a running job's progress, written at most every few points"""
+    seen = []
+
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        db = TestingSessionLocal()
+        try:
+            seen.append(db.query(Job.progress).filter(Job.id == job.id).scalar())
+        finally:
+            db.close()
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        return EncodeResult(path=output_path)
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    monkeypatch.setattr(video_tasks, "output_metadata", lambda ffmpeg, result: METADATA)
+    assert process_video_trim.run(job.id)["status"] == "completed"
+    assert seen == [30]
+
+    monkeypatch.setattr(settings, "progress_write_seconds", 3600.0)
+    with JobRun(process_video_trim, job.id) as run:
+        run.job, run.video = run.load()
+        run.progress_written, run.progress_written_at = 30, time.monotonic()
+        run.progress(33)  # Too small a step to write
+        run.progress(36)
+    db_session.expire_all()
+    assert db_session.get(Job, job.id).progress == 36
+    assert [e["progress"] for e in redis.published[-2:]] == [33, 36]
+
+
+def test_failures_and_cancellations_are_published(db_session, job, redis):
+    db_session.query(Video).update({"file_path": "/nonexistent/a.mp4"})
+    db_session.commit()
+    with pytest.raises(PermanentError):
+        process_video_trim.run(job.id)
+    assert [(e["status"], e["progress"]) for e in redis.published] == [("processing", 0), ("processing", 30), ("failed", 30)]
+    assert "missing" in redis.published[-1]["error_message"]
+
+    waiting = Job(video_id=job.video_id, job_type="trim", parameters={"start_time": 0, "end_time": 5})
+    db_session.add(waiting)
+    db_session.commit()
+    assert client.delete(f"/api/v1/jobs/{waiting.id}").status_code == 200
+    assert redis.published[-1]["job_id"] == str(waiting.id) and redis.published[-1]["status"] == "cancelled"
+
+
+def test_job_stream_starts_from_the_last_state_and_ends_when_finished(redis):
+    job_id = uuid.uuid4()
+    job_events.publish(event(job_id, "processing", 40))
+    dispatch_when_subscribed(
+        ("job", str(job_id)),
+        event(uuid.uuid4(), "processing", 10),  # Another job's
+        event(job_id, "processing", 70),
+        event(job_id, "completed", 100)
+    )
+
+    with client.stream("GET", "/api/v1/events/", params={"job_id": str(job_id)}) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+        events = [json.loads(line[len("data: "):]) for line in response.iter_lines() if line.startswith("data: ")]
+    assert [(e["status"], e["progress"]) for e in events] == [("processing", 40), ("processing", 70), ("completed", 100)]
+    assert ("job", str(job_id)) not in hub.subscribers
+
+    # A finished job's stream is just its final state
+    job_events.publish(event(job_id, "completed", 100))
+    with client.stream("GET", "/api/v1/events/", params={"job_id": str(job_id)}) as response:
+        assert sum(line.startswith("data: ") for line in response.iter_lines()) == 1
+
+
+def test_websocket_follows_a_batch_or_a_tenant(redis):
+    batch_id = uuid.uuid4()
+    dispatch_when_subscribed(
+        ("batch", str(batch_id)),
+        event(uuid.uuid4(), "processing", 5, batch_id=uuid.uuid4()),
+        event(uuid.uuid4(), "completed", 100, batch_id=batch_id)
+    )
+    with client.websocket_connect(f"/api/v1/events/ws?batch_id={batch_id}") as websocket:
+        received = websocket.receive_json()
+    assert received["batch_id"] == str(batch_id) and received["status"] == "completed"
+
+    dispatch_when_subscribed(("tenant", "acme"), event(uuid.uuid4(), "failed", tenant="acme"))
+    with client.websocket_connect("/api/v1/events/ws?tenant=acme") as websocket:
+        assert websocket.receive_json()["tenant"] == "acme"
+
+    assert client.get("/api/v1/events/").status_code == 400
+    assert client.get("/api/v1/events/", params={"tenant": "acme", "job_id": str(uuid.uuid4())}).status_code == 400
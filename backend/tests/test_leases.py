@@ -0,0 +1,85 @@
+import os
+from datetime import datetime, timedelta, timezone
+import pytest
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import ProcessedVideo, Video
+from app.services.ffmpeg_service import FFmpegService, EncodeResult
+from app.services.leases import JobLease, LeaseLost, held_lease
+from app.tasks import process_video_trim
+from app.tasks.scheduling import reap_expired_leases
+
+
+@pytest.fixture
+def job(db_session, job):
+    """The trim, as sent to a worker"""
+    job.task_id, job.dispatched_at = "task-1", datetime.now(timezone.utc)
+    db_session.commit()
+    return job
+
+
+def expire(db, job):
+    db.query(Job).filter(Job.id == job.id).update({"lease_expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)})
+    db.commit()
+
+
+def test_expired_leases_are_reclaimed_once(db_session, job, monkeypatch):
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    lease = JobLease.acquire(job.id)
+    try:
+        assert JobLease.acquire(job.id) is None  # A live attempt holds it
+
+        expire(db_session, job)
+        assert reap_expired_leases() == 1
+        assert reap_expired_leases() == 0  # Already reclaimed
+        assert sent == ["task-1"]
+        db_session.refresh(job)
+        assert job.status == "pending" and job.lease_reclaims == 1 and job.dispatched_at is not None
+
+        # The old attempt finds out on its next beat, or when it tries to publish or complete
+        assert not lease.renew()
+        with pytest.raises(LeaseLost):
+            lease.fence(db_session)
+        db_session.rollback()
+    finally:
+        lease.release()
+
+
+def test_jobs_that_keep_losing_workers_fail(db_session, job, monkeypatch):
+    monkeypatch.setattr(settings, "max_lease_reclaims", 1)
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: None)
+    for _ in range(2):
+        lease = JobLease.acquire(job.id)
+        expire(db_session, job)
+        reap_expired_leases()
+        lease.release()
+
+    db_session.refresh(job)
+    assert job.status == "failed" and "stopped renewing" in job.error_message
+
+
+def test_reclaimed_attempt_publishes_nothing(db_session, job, monkeypatch):
+    """An attempt reclaimed mid-encode neither writes its output nor touches the job"""
+    written = []
+
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        # The reaper takes the job while this attempt is still encoding
+        db_session.query(Job).filter(Job.id == job.id).update({"lease_token": None, "status": "pending"})
+        db_session.commit()
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        written.append(output_path)
+        return EncodeResult(path=output_path)
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    original = db_session.query(Video).one().file_path
+
+    assert process_video_trim(job.id) == {"status": "reclaimed"}
+    assert written == [] and held_lease(job.id) is None
+    db_session.refresh(job)
+    assert job.status == "pending" and job.lease_token is None
+    assert db_session.query(ProcessedVideo).count() == 0
+    assert os.path.exists(original)
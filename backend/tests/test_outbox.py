@@ -0,0 +1,113 @@
+from sqlalchemy import event
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.outbox import OutboxMessage
+from app.services.outbox import enqueue
+from app.tasks.scheduling import relay_outbox
+from tests.conftest import client, engine
+
+
+def broker_down(name, args, kwargs, **options):
+    raise ConnectionError("Error 111 connecting to localhost:6379. Connection refused.")
+
+
+def submit(video, count):
+    """Submit distinct trims through the API; returns their job ids"""
+    ids = []
+    for i in range(count):
+        response = client.post("/trim", json={"video_id": str(video.id), "start_time": i, "end_time": i + 1})
+        assert response.status_code == 200
+        ids.append(response.json()["id"])
+    return ids
+
+
+def test_submissions_survive_a_broker_outage(db_session, video, monkeypatch):
+    """Jobs wait in the outbox while the broker is down and are sent once it is back"""
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    monkeypatch.setattr(celery_app, "send_task", broker_down)
+    ids = submit(video, 3)  # The API never talks to the broker
+
+    assert relay_outbox() == 0
+    messages = db_session.query(OutboxMessage).all()
+    assert len(messages) == 3
+    assert all(m.sent_at is None and m.attempts == 1 and "refused" in m.last_error for m in messages)
+
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    assert relay_outbox() == 3
+    assert sent == ids  # In submission order, under their job ids
+    assert relay_outbox() == 0  # Each message is sent once
+    db_session.expire_all()
+    assert all(m.sent_at is not None for m in db_session.query(OutboxMessage).all())
+    assert all(job.dispatched_at is not None for job in db_session.query(Job).all())
+
+
+def test_relay_works_in_batches(db_session, video, monkeypatch):
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    monkeypatch.setattr(settings, "outbox_batch_size", 2)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    ids = submit(video, 5)
+
+    assert relay_outbox() == 5
+    assert sent == ids
+
+
+def test_a_bad_message_does_not_block_the_rest(db_session, video, monkeypatch):
+    """A message that fails on its own is retried alone, then given up with its job"""
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    monkeypatch.setattr(settings, "outbox_max_attempts", 2)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    bad = Job(video_id=video.id, job_type="transmogrify", parameters={})
+    db_session.add(bad)
+    enqueue(db_session, bad)
+    db_session.commit()
+    ids = submit(video, 2)
+
+    assert relay_outbox() == 2
+    assert sent == ids
+    message = db_session.query(OutboxMessage).filter(OutboxMessage.job_id == bad.id).one()
+    assert (message.sent_at, message.attempts) == (None, 1) and message.last_error.startswith("KeyError")
+
+    assert relay_outbox() == 1
+    db_session.expire_all()
+    assert message.sent_at is not None and message.attempts == 2
+    assert bad.status == "failed" and "Could not be queued" in bad.error_message
+    assert relay_outbox() == 0 and sent == ids
+
+
+def test_relayed_batch_is_planned_in_one_transaction(db_session, video, monkeypatch):
+    """Jobs and videos are loaded once per batch, and the jobs updated by one statement"""
+    monkeypatch.setattr(settings, "fair_share_enabled", False)
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: None)
+    ids = submit(video, 5)
+    statements = []
+    record = lambda conn, cursor, statement, parameters, context, executemany: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert relay_outbox() == 5
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert len([s for s in statements if s.startswith("UPDATE jobs")]) == 1
+    assert len([s for s in statements if s.startswith("SELECT") and "FROM jobs" in s]) <= 2  # The batch, calibration
+    db_session.expire_all()
+    jobs = db_session.query(Job).all()
+    assert sorted(str(job.id) for job in jobs) == sorted(ids)
+    assert all(job.dispatched_at and job.lane == "remux" and job.estimated_seconds for job in jobs)
+
+
+def test_relayed_jobs_are_held_for_fair_share(db_session, video, monkeypatch):
+    """With fair share the relay holds jobs in their tenant's queue; dispatch sends what fits"""
+    monkeypatch.setattr(settings, "fair_share_max_in_flight", 1)
+    sent = []
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: sent.append(options["task_id"]))
+    ids = submit(video, 2)
+
+    assert relay_outbox() == 2
+    assert sent == ids[:1]
+    db_session.expire_all()
+    held = db_session.query(Job).filter(Job.dispatched_at.is_(None)).one()
+    assert str(held.id) == ids[1] and held.task_id == ids[1] and held.tenant == "default"
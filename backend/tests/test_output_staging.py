@@ -0,0 +1,48 @@
+import os
+import pytest
+from app.services.storage_service import StorageService
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = StorageService()
+    storage.scratch_dir = tmp_path / "scratch"
+    return storage
+
+
+def test_outputs_appear_only_when_complete(storage, tmp_path):
+    final = tmp_path / "processed" / "out.mp4"
+    with storage.staged_outputs(str(final)) as (scratch,):
+        assert os.path.dirname(scratch) == str(storage.scratch_dir)
+        with open(scratch, "wb") as f:
+            f.write(b"encoded")
+        assert not final.exists()
+
+    assert final.read_bytes() == b"encoded"
+    assert list(storage.scratch_dir.iterdir()) == []
+
+
+def test_failed_encode_leaves_nothing_behind(storage, tmp_path):
+    final = tmp_path / "processed" / "out.mp4"
+    with pytest.raises(RuntimeError):
+        with storage.staged_outputs(str(final)) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"half")
+            raise RuntimeError("ffmpeg died")
+
+    assert not final.exists()
+    assert list(storage.scratch_dir.iterdir()) == []
+
+
+def test_clean_scratch_keeps_live_encodes(storage, tmp_path):
+    """Files of running workers stay; those of dead or unknown owners older than the limit go"""
+    with storage.staged_outputs(str(tmp_path / "live.mp4")) as (live,):
+        open(live, "wb").close()
+        dead = storage.scratch_dir / os.path.basename(live).replace(str(os.getpid()), "999999999", 1)
+        dead.write_bytes(b"orphan")
+        stale = storage.scratch_dir / "leftover.mp4"
+        stale.write_bytes(b"old")
+        os.utime(stale, (0, 0))
+
+        assert storage.clean_scratch() == 2
+        assert os.path.exists(live)
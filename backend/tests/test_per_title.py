@@ -0,0 +1,45 @@
+import pytest
+from app.services.per_title import PerTitleAnalyzer
+
+
+def test_sample_windows_cover_the_title():
+    """Windows are spread across the title and stay inside it"""
+    analyzer = PerTitleAnalyzer()
+    analyzer.sample_count, analyzer.sample_seconds = 3, 4.0
+    windows = analyzer.sample_windows(60.0)
+    assert len(windows) == 3
+    assert windows[0][0] < windows[1][0] < windows[2][0]
+    assert all(start + length <= 60.0 for start, length in windows)
+    assert analyzer.sample_windows(2.5) == [(0.0, 2.5)]
+
+
+def test_static_content_gets_cheaper_ladder():
+    """A low-complexity title is encoded below the fixed ladder"""
+    analyzer = PerTitleAnalyzer()
+    ladder = analyzer.build_ladder([{"kbps": 300, "ssim": 0.99}, {"kbps": 250, "ssim": 0.99}], 720)
+    assert ladder["rungs"]["720p"] == "750k"  # floored at 30% of 2500k
+    assert ladder["analysis"]["reference_kbps"] == 300
+
+
+def test_high_motion_content_gets_more_bits():
+    """Hard content with SSIM below target is given more than the fixed ladder"""
+    analyzer = PerTitleAnalyzer()
+    analyzer.target_ssim = 0.97
+    ladder = analyzer.build_ladder([{"kbps": 2400, "ssim": 0.95}], 720)
+    assert int(ladder["rungs"]["720p"][:-1]) > 2500
+    assert int(ladder["rungs"]["720p"][:-1]) <= 3750  # capped at 150%
+
+
+def test_unusable_probe_gets_the_fixed_ladder(tmp_path):
+    """Without a video height or a duration nothing is sampled"""
+    analyzer = PerTitleAnalyzer()
+    analyzer.ffmpeg.measure_sample = lambda *args: pytest.fail("sampled an unusable title")
+    for probe in (
+        {"streams": [{"codec_type": "video", "width": 1280}], "format": {"duration": "60.0"}},
+        {"streams": [{"codec_type": "video", "height": 0}], "format": {"duration": "60.0"}},
+        {"streams": [{"codec_type": "video", "height": 720}], "format": {"duration": "0.000000"}},
+        {"streams": [{"codec_type": "audio"}], "format": {}},
+    ):
+        ladder = analyzer.analyze("a.mp4", probe, str(tmp_path))
+        assert ladder["rungs"] == {"1080p": "5000k", "720p": "2500k", "480p": "1000k", "360p": "500k"}
+    assert analyzer.build_ladder([], 720)["rungs"]["720p"] == "2500k"
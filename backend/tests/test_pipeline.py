@@ -0,0 +1,85 @@
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.job import Job
+from app.services.pipeline import Pipeline
+from app.models.outbox import OutboxMessage
+
+client = TestClient(app)
+
+
+def test_trims_fold_into_one_input_seek():
+    """Later trims are relative to earlier ones and clamp to the remaining timeline"""
+    pipeline = Pipeline([
+        {"type": "trim", "start_time": 2, "end_time": 8},
+        {"type": "scale", "quality": "480p"},
+        {"type": "trim", "start_time": 1, "end_time": 20},
+    ], 1280, 720, 10.0)
+    assert (pipeline.start, pipeline.duration) == (3, 5)
+
+
+def test_ladder_fans_out_of_one_graph():
+    """Overlays run once; the ladder splits the result into one output per fitting rung"""
+    pipeline = Pipeline([
+        {"type": "watermark", "watermark_type": "image", "file_path": "logo.png", "position": "top-left"},
+        {"type": "ladder", "qualities": ["1080p", "720p", "480p"]},
+    ], 1280, 720, 10.0)
+
+    stages = pipeline.stages()
+    assert len(stages) == 1
+    assert stages[0]["inputs"] == ["logo.png"]
+    assert "split=2" in ";".join(stages[0]["filters"])
+    assert [o["name"] for o in pipeline.outputs()] == ["720p", "480p"]
+    assert [o["resolution"] for o in pipeline.outputs()] == ["1280x720", "854x480"]
+
+
+def test_pipe_mode_runs_one_stage_per_operation():
+    pipeline = Pipeline([
+        {"type": "overlay", "overlay_type": "image", "file_path": "logo.png", "position_x": 40, "position_y": 40},
+        {"type": "scale", "height": 360},
+    ], 1280, 720, 10.0, crop={"width": 1280, "height": 704, "x": 0, "y": 8})
+
+    stages = pipeline.stages(fused=False)
+    assert len(stages) == 2
+    # Crop happens first and overlay positions move onto the cropped frame
+    assert stages[0]["filters"][:2] == ["[0:v]crop=1280:704:0:8[v0]", "[v0][1:v]overlay=40:32[v1]"]
+    assert stages[1]["filters"] == ["[0:v]scale=-2:360[v0]"]
+
+
+def test_overlay_keeps_a_zero_position():
+    pipeline = Pipeline([
+        {"type": "overlay", "overlay_type": "image", "file_path": "logo.png", "position_x": 0, "position_y": 0},
+    ], 1280, 720, 10.0)
+
+    assert "[0:v][1:v]overlay=0:0[v0]" in pipeline.stages()[0]["filters"]
+
+
+@pytest.mark.parametrize("operations", [
+    [{"type": "ladder", "qualities": ["480p"]}, {"type": "scale", "quality": "360p"}],
+    [{"type": "scale", "quality": "1080p"}],
+    [{"type": "trim", "start_time": 5, "end_time": 2}],
+    [{"type": "overlay", "overlay_type": "text"}],
+])
+def test_invalid_pipelines_are_rejected(operations):
+    with pytest.raises(ValueError):
+        Pipeline(operations, 1280, 720, 10.0)
+
+
+def test_pipeline_endpoint_creates_one_job(db_session, make_video):
+    """The whole chain is one job, and images must come from the upload directory"""
+    video = make_video(resolution="1280x720")
+
+    response = client.post(f"/api/v1/videos/{video.id}/pipeline", json={"operations": [
+        {"type": "trim", "start_time": 1, "end_time": 4},
+        {"type": "overlay", "overlay_type": "text", "text": "hello"},
+        {"type": "ladder", "qualities": ["720p", "480p"]},
+    ]})
+    rejected = client.post(f"/api/v1/videos/{video.id}/pipeline", json={"operations": [
+        {"type": "watermark", "watermark_type": "image", "file_path": "/etc/passwd"},
+    ]})
+
+    assert response.status_code == 200
+    assert response.json()["job_type"] == "pipeline"
+    assert [str(m.job_id) for m in db_session.query(OutboxMessage).all()] == [response.json()["id"]]
+    assert db_session.query(Job).count() == 1
+    assert rejected.status_code == 400
@@ -0,0 +1,120 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+from app.models.job import Job
+from app.models.video import VideoQuality
+from app.services.rendition_cache import RenditionCache
+from app.models.outbox import OutboxMessage
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def video(make_video):
+    return make_video(b"original", filename="source.mp4", original_filename="source.mp4", resolution="1920x1080")
+
+
+def _make_quality(db, tmp_path, video, quality, size, accessed):
+    path = tmp_path / f"{quality}.mp4"
+    path.write_bytes(b"x" * size)
+    record = VideoQuality(
+        video_id=video.id,
+        quality=quality,
+        file_path=str(path),
+        file_size=size,
+        resolution=quality.replace("p", ""),
+        last_accessed_at=accessed
+    )
+    db.add(record)
+    db.commit()
+    return record
+
+
+def test_evicts_least_recently_accessed(db_session, video, tmp_path):
+    """Oldest renditions go first and the original is never evicted"""
+    now = datetime.now(timezone.utc)
+    _make_quality(db_session, tmp_path, video, "1080p", 100, now - timedelta(hours=2))
+    _make_quality(db_session, tmp_path, video, "720p", 50, now)
+
+    evicted = RenditionCache(db_session, max_bytes=60).evict_to_budget()
+
+    assert [q.quality for q in evicted] == ["1080p"]
+    assert not (tmp_path / "1080p.mp4").exists()
+    assert (tmp_path / "720p.mp4").exists()
+    assert (tmp_path / "source.mp4").exists()
+    assert db_session.query(VideoQuality).count() == 1
+
+
+def test_keep_ids_are_never_evicted(db_session, video, tmp_path):
+    """A just-produced rendition survives eviction even when it is the oldest"""
+    fresh = _make_quality(db_session, tmp_path, video, "480p", 100, datetime(2020, 1, 1, tzinfo=timezone.utc))
+
+    evicted = RenditionCache(db_session, max_bytes=10).evict_to_budget(keep_ids=(fresh.id,))
+
+    assert evicted == []
+    assert (tmp_path / "480p.mp4").exists()
+
+
+def test_missing_rendition_shares_one_transcode(db_session, video):
+    """Repeated downloads of a missing rendition enqueue a single JIT job"""
+
+    first = client.get(f"/api/v1/videos/{video.id}/download/720p")
+    second = client.get(f"/api/v1/videos/{video.id}/download/720p")
+
+    assert first.status_code == 202
+    assert second.status_code == 202
+    assert first.json()["id"] == second.json()["id"]
+    assert db_session.query(OutboxMessage).count() == 1
+
+
+def test_jit_transcodes_are_h264_and_shared_across_processes(db_session, video, monkeypatch):
+    """A ladder without H.264 is not waited on, and a racing request takes the job created first"""
+    vp9 = Job(video_id=video.id, job_type="quality", parameters={"qualities": ["720p"], "codecs": ["vp9"]})
+    db_session.add(vp9)
+    db_session.commit()
+
+    first = client.get(f"/api/v1/videos/{video.id}/download/720p").json()
+    assert first["id"] != str(vp9.id)
+    assert first["parameters"]["codecs"] == ["h264"]
+
+    # Another process looked before this job existed
+    winner = db_session.query(Job).filter(Job.id == uuid.UUID(first["id"])).first()
+    lookups = iter([None])
+    monkeypatch.setattr(RenditionCache, "find_inflight_job", lambda self, video_id, quality: next(lookups, winner))
+    job, created = RenditionCache(db_session).request_rendition(video, "720p")
+    assert str(job.id) == first["id"] and not created
+    assert db_session.query(OutboxMessage).count() == 1
+
+
+def test_unknown_quality_is_not_found(db_session, video):
+    """Only ladder rungs can be produced on demand"""
+    response = client.get(f"/api/v1/videos/{video.id}/download/4320p")
+    assert response.status_code == 404
+
+
+def test_rungs_above_the_source_are_not_found(db_session, make_video):
+    """A rung the transcode would skip is never queued, so retries do not pile up jobs"""
+    video = make_video(resolution="854x480")
+    for _ in range(2):
+        assert client.get(f"/api/v1/videos/{video.id}/download/720p").status_code == 404
+    assert db_session.query(Job).count() == 0
+    assert client.get(f"/api/v1/videos/{video.id}/download/480p").status_code == 202
+
+
+def test_download_negotiates_codec(db_session, video, tmp_path):
+    """Clients get the most efficient codec they advertise, else H.264"""
+    now = datetime.now(timezone.utc)
+    _make_quality(db_session, tmp_path, video, "720p", 10, now)
+    av1 = _make_quality(db_session, tmp_path, video, "720p_av1", 5, now)
+    av1.quality, av1.codec = "720p", "av1"
+    db_session.commit()
+
+    modern = client.get(f"/api/v1/videos/{video.id}/download/720p", headers={"X-Video-Codecs": "av1,vp9"})
+    legacy = client.get(f"/api/v1/videos/{video.id}/download/720p")
+    listing = client.get(f"/api/v1/videos/{video.id}/qualities?codecs=av1")
+
+    assert modern.content == b"x" * 5
+    assert legacy.content == b"x" * 10
+    assert [q["codec"] for q in listing.json()] == ["av1"]
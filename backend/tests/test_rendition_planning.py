@@ -0,0 +1,71 @@
+from app.services.ffmpeg_service import FFmpegService, adjust_position_for_crop
+
+
+def _probe(codec="h264", width=1280, height=720, bit_rate="2400000",
+           audio_codec="aac", audio_bit_rate="128000"):
+    streams = [{
+        "codec_type": "video",
+        "codec_name": codec,
+        "width": width,
+        "height": height,
+        "pix_fmt": "yuv420p",
+        "bit_rate": bit_rate
+    }]
+    if audio_codec:
+        streams.append({
+            "codec_type": "audio",
+            "codec_name": audio_codec,
+            "channels": 2,
+            "bit_rate": audio_bit_rate
+        })
+    return {"streams": streams, "format": {"bit_rate": "2600000"}}
+
+
+def test_matching_h264_source_is_remuxed():
+    """An H.264/AAC 720p source within budget becomes a stream copy"""
+    plans = FFmpegService().plan_quality_versions(_probe(), ["720p"])
+    assert plans["720p"]["action"] == "remux"
+    assert plans["720p"]["video_codec"] == "copy"
+    assert plans["720p"]["audio_codec"] == "copy"
+    assert plans["720p"]["resolution"] == "1280x720"
+
+
+def test_rungs_above_source_are_skipped():
+    """A 480p source is never upscaled"""
+    plans = FFmpegService().plan_quality_versions(_probe(width=854, height=480), ["1080p", "720p", "480p"])
+    assert plans["1080p"]["action"] == "skip"
+    assert plans["720p"]["action"] == "skip"
+    assert plans["480p"]["action"] == "transcode"
+
+
+def test_over_budget_or_foreign_codec_is_transcoded():
+    """Bitrate above the rung or a non-H.264 codec forces a transcode"""
+    ffmpeg = FFmpegService()
+    assert ffmpeg.plan_quality_versions(_probe(bit_rate="6000000"), ["720p"])["720p"]["action"] == "transcode"
+    plan = ffmpeg.plan_quality_versions(_probe(codec="hevc"), ["720p"])["720p"]
+    assert plan["action"] == "transcode"
+    assert plan["video_codec"] == "libx264"
+
+
+def test_incompatible_audio_is_reencoded():
+    """Non-AAC audio is re-encoded while missing audio is left out"""
+    ffmpeg = FFmpegService()
+    assert ffmpeg.plan_quality_versions(_probe(audio_codec="opus"), ["720p"])["720p"]["audio_codec"] == "aac"
+    assert ffmpeg.plan_quality_versions(_probe(audio_codec=None), ["720p"])["720p"]["audio_codec"] is None
+
+
+def test_crop_replaces_source_frame():
+    """A cropped source is always transcoded and sized from the crop"""
+    crop = {"width": 1280, "height": 536, "x": 0, "y": 92}
+    plans = FFmpegService().plan_quality_versions(_probe(), ["720p", "480p"], crop=crop)
+    assert plans["720p"]["action"] == "skip"
+    assert plans["480p"]["action"] == "transcode"
+    assert plans["480p"]["crop"] == crop
+
+
+def test_overlay_position_follows_crop():
+    """Source-frame coordinates are shifted and clamped onto the cropped frame"""
+    crop = {"width": 1280, "height": 536, "x": 0, "y": 92}
+    assert adjust_position_for_crop((10, 100), crop) == (10, 8)
+    assert adjust_position_for_crop((10, 10), crop) == (10, 0)
+    assert adjust_position_for_crop((10, 10), None) == (10, 10)
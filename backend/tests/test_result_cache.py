@@ -0,0 +1,119 @@
+import os
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from app.config.settings import settings
+from app.main import app
+from app.models.job import Job
+from app.models.video import ProcessedVideo
+from app.services.ffmpeg_service import FFmpegService
+from app.services.result_cache import ResultCache
+from app.models.outbox import OutboxMessage
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def video(make_video):
+    return make_video(b"original", filename="source.mp4", original_filename="source.mp4", resolution="1280x720")
+
+
+def test_equivalent_parameters_share_a_key(db_session, video, tmp_path):
+    """Number formatting, unset options and the copy of an uploaded file do not matter"""
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    first.write_bytes(b"logo")
+    second.write_bytes(b"logo")
+    cache = ResultCache(db_session)
+
+    key = cache.cache_key(video, "overlay", {"overlay_type": "image", "overlay_path": str(first), "position_x": 10})
+    same = cache.cache_key(video, "overlay", {"overlay_type": "image", "overlay_path": str(second), "position_x": 10.0, "width": None})
+    other = cache.cache_key(video, "overlay", {"overlay_type": "image", "overlay_path": str(first), "position_x": 11})
+
+    assert key == same
+    assert key != other
+
+
+def test_key_changes_with_encoder_and_source(db_session, video, monkeypatch):
+    cache = ResultCache(db_session)
+    parameters = {"start_time": 1, "end_time": 4}
+    key = cache.cache_key(video, "trim", parameters)
+
+    monkeypatch.setattr(FFmpegService, "encoder_version", lambda self: "ffmpeg version 99")
+    assert cache.cache_key(video, "trim", parameters) != key
+
+    video.content_hash = "0" * 64
+    assert cache.cache_key(video, "trim", parameters) != key
+
+
+def test_repeat_trim_attaches_then_reuses(db_session, video, tmp_path):
+    """A running trim is shared; a finished one completes new requests immediately"""
+    request = {"video_id": str(video.id), "start_time": 1, "end_time": 4}
+
+    first = client.post("/trim", json=request).json()
+    attached = client.post("/trim", json={**request, "start_time": 1.0}).json()
+    assert attached["id"] == first["id"]
+    assert db_session.query(OutboxMessage).count() == 1
+
+    # Finish the first job as the worker would
+    output = tmp_path / "trimmed.mp4"
+    output.write_bytes(b"trimmed")
+    job = db_session.query(Job).filter(Job.id == uuid.UUID(first["id"])).first()
+    job.status, job.result_path = "completed", str(output)
+    db_session.add(ProcessedVideo(original_video_id=video.id, job_id=job.id, filename="trimmed.mp4",
+                                  file_path=str(output), file_size=7, duration=3, format="mp4",
+                                  resolution="1280x720", processing_type="trim", cache_key=job.cache_key))
+    db_session.commit()
+
+    reused = client.post("/trim", json=request).json()
+    assert reused["id"] != first["id"]
+    assert reused["status"] == "completed"
+    assert reused["result_path"] == str(output)
+    assert reused["parameters"]["cached_from"] == first["id"]
+    assert db_session.query(OutboxMessage).count() == 1
+
+    # Once the output is gone the cache misses and a new encode runs
+    output.unlink()
+    client.post("/trim", json=request)
+    assert db_session.query(OutboxMessage).count() == 2
+
+
+def test_requests_racing_in_other_processes_share_one_job(db_session, video, monkeypatch):
+    """The unique in-flight key, not a lock, decides which of two racing requests creates the job"""
+    parameters = {"start_time": 1, "end_time": 4}
+    key = ResultCache(db_session).cache_key(video, "trim", parameters)
+    racer = Job(video_id=video.id, job_type="trim", parameters=parameters, cache_key=key)
+    db_session.add(racer)
+    db_session.commit()
+    # The other process committed its job just after this one looked
+    lookups = iter([None])
+    original = ResultCache.find_inflight_job
+    monkeypatch.setattr(ResultCache, "find_inflight_job",
+                        lambda self, cache_key: next(lookups, None) or original(self, cache_key))
+
+    response = client.post("/trim", json={"video_id": str(video.id), **parameters})
+    assert response.status_code == 200
+    assert response.json()["id"] == str(racer.id)
+    assert db_session.query(Job).count() == 1
+    assert db_session.query(OutboxMessage).count() == 0
+
+
+def test_cached_overlay_points_at_a_kept_image(db_session, video, tmp_path, monkeypatch):
+    """A repeat's upload is deleted, so the reused job names the image the output was made from"""
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    form = {"video_id": str(video.id), "overlay_type": "image"}
+
+    first = client.post("/api/v1/overlays/image", data=form, files={"overlay_file": ("logo.png", b"logo")}).json()
+    job = db_session.query(Job).filter(Job.id == uuid.UUID(first["id"])).first()
+    output = tmp_path / "overlaid.mp4"
+    output.write_bytes(b"overlaid")
+    job.status, job.result_path = "completed", str(output)
+    db_session.add(ProcessedVideo(original_video_id=video.id, job_id=job.id, filename="overlaid.mp4",
+                                  file_path=str(output), file_size=8, duration=10, format="mp4",
+                                  resolution="1280x720", processing_type="overlay", cache_key=job.cache_key))
+    db_session.commit()
+
+    reused = client.post("/api/v1/overlays/image", data=form, files={"overlay_file": ("copy.png", b"logo")}).json()
+    assert reused["parameters"]["cached_from"] == first["id"]
+    assert reused["parameters"]["overlay_path"] == first["parameters"]["overlay_path"]
+    assert os.path.exists(reused["parameters"]["overlay_path"])
+    assert len(list((tmp_path / "uploads").rglob("*.png"))) == 1
@@ -0,0 +1,110 @@
+import os
+import pytest
+import app.tasks.video_tasks as video_tasks
+from app.config.settings import settings
+from app.services.ffmpeg_service import FFmpegService, EncodeResult
+from app.services.storage_backends import S3StorageBackend
+from app.services.storage_service import StorageService
+from app.tasks import process_video_trim
+
+
+@pytest.fixture
+def remote_storage(tmp_path, monkeypatch):
+    """Node-local directories backed by a separate store directory"""
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "node" / "uploads"))
+    monkeypatch.setattr(settings, "processed_dir", str(tmp_path / "node" / "processed"))
+    monkeypatch.setattr(settings, "storage_root", str(tmp_path / "store"))
+    return StorageService()
+
+
+def test_local_backend_in_place_copies_nothing(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    storage = StorageService()
+    path = storage.save_uploaded_file(b"video", "clip.mp4")
+
+    assert storage.backend.is_local
+    assert storage.backend.path(storage.key_for(path)) == storage.upload_path(os.path.basename(path)[:-4], path)
+    assert os.listdir(tmp_path) == ["uploads"]
+
+
+def test_sources_are_read_through(remote_storage, tmp_path):
+    """A node that lacks a file fetches it; idle copies are evicted only once stored"""
+    storage = remote_storage
+    path = storage.save_uploaded_file(b"video", "clip.mp4")
+    key = storage.key_for(path)
+    assert (tmp_path / "store" / key).read_bytes() == b"video"
+
+    os.remove(path)  # As seen from another node
+    assert storage.exists(path)
+    assert storage.ensure_local(path) == path
+    assert open(path, "rb").read() == b"video"
+
+    os.utime(path, (0, 0))
+    assert storage.trim_cache(max_bytes=0) == 5
+    assert not os.path.exists(path) and storage.exists(path)
+
+
+def test_deleting_a_video_directory_clears_the_store(remote_storage, tmp_path):
+    storage = remote_storage
+    with storage.staged_outputs(storage.create_processed_file_path("v1", "720p.mp4")) as (scratch,):
+        with open(scratch, "wb") as f:
+            f.write(b"720p")
+    assert (tmp_path / "store" / storage.key_for(str(storage.video_dir("v1")))).is_dir()
+
+    storage.delete_directory(str(storage.video_dir("v1")))
+    assert not (tmp_path / "store" / storage.key_for(str(storage.video_dir("v1")))).exists()
+
+
+def test_tasks_read_the_fetched_copy(job, tmp_path, monkeypatch):
+    """Encodes read whatever local path the fetch returned, not the stored path"""
+    fetched = tmp_path / "cache" / "a.mp4"
+    fetched.parent.mkdir()
+    fetched.write_bytes(b"video")
+    monkeypatch.setattr(StorageService, "ensure_local", lambda self, path, node=None: str(fetched))
+    inputs = []
+
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        inputs.append(input_path)
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        return EncodeResult(path=output_path)
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    monkeypatch.setattr(video_tasks, "output_metadata", lambda ffmpeg, result: {
+        "size": 7, "duration": 5.0, "format": "mp4", "resolution": "640x360", "fps": 30.0, "bitrate": 1
+    })
+    assert process_video_trim.run(job.id)["status"] == "completed"
+    assert inputs == [str(fetched)]
+
+
+@pytest.fixture
+def s3_server():
+    """Local S3-compatible stand-in"""
+    pytest.importorskip("boto3")
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(port=0, verbose=False)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+def test_s3_backend_moves_large_files_in_parts(s3_server, tmp_path):
+    part_size = 5 * 1024 * 1024  # The S3 minimum
+    backend = S3StorageBackend("dripple", endpoint_url=s3_server, region="us-east-1",
+                               access_key_id="test", secret_access_key="test",
+                               part_size=part_size, max_concurrency=4)
+    backend.client.create_bucket(Bucket="dripple")
+    source = tmp_path / "big.mp4"
+    source.write_bytes(os.urandom(part_size * 2 + 1024))
+
+    backend.put_file(str(source), "processed/ab/cd/v1/720p.mp4")
+    head = backend.client.head_object(Bucket="dripple", Key="processed/ab/cd/v1/720p.mp4")
+    assert head["ETag"].strip('"').endswith("-3")  # Three multipart parts
+
+    backend.get_file("processed/ab/cd/v1/720p.mp4", str(tmp_path / "copy.mp4"))
+    assert (tmp_path / "copy.mp4").read_bytes() == source.read_bytes()
+
+    backend.delete_prefix("processed/ab/cd/v1/")
+    assert not backend.exists("processed/ab/cd/v1/720p.mp4")
@@ -0,0 +1,88 @@
+import uuid
+import pytest
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.video import Video, VideoQuality
+from app.services.storage_service import StorageService
+from app.services.video_service import VideoService
+from migrate_storage import StorageMigration
+
+
+@pytest.fixture
+def dirs(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "upload_dir", str(tmp_path / "uploads"))
+    monkeypatch.setattr(settings, "processed_dir", str(tmp_path / "processed"))
+    return tmp_path
+
+
+def test_files_are_sharded_by_id(dirs):
+    storage = StorageService()
+    video_id = uuid.uuid4()
+    upload = storage.save_uploaded_file(b"video", "clip.MP4")
+    output = storage.create_processed_file_path(video_id, "trimmed.mp4")
+
+    upload_id = upload.rsplit("/", 2)[1]
+    assert upload.endswith(f"/{upload_id}/{upload_id}.mp4")
+    assert upload.count("/") - str(dirs / "uploads").count("/") == 4  # ab/cd/<id>/<file>
+    assert output == str(storage.video_dir(video_id) / "trimmed.mp4")
+    assert storage.get_file_path(f"{upload_id}.mp4") == upload
+
+
+def test_delete_video_removes_its_directories(dirs, db_session):
+    storage = StorageService()
+    upload = storage.save_uploaded_file(b"video", "clip.mp4")
+    video = Video(filename="clip.mp4", original_filename="clip.mp4", file_path=upload,
+                  file_size=5, duration=1, format="mp4", resolution="1280x720")
+    db_session.add(video)
+    db_session.commit()
+    rendition = storage.create_processed_file_path(video.id, "720p.mp4")
+    open(rendition, "wb").close()
+    other = storage.save_uploaded_file(b"other", "other.mp4")
+
+    assert VideoService(db_session).delete_video(video.id)
+    assert not storage.video_dir(video.id).exists()
+    assert not (dirs / upload).parent.exists()
+    assert (dirs / other).exists()
+
+
+def test_migration_moves_files_and_rewrites_rows(dirs, db_session):
+    """Flat files move into shard directories; running it again changes nothing"""
+    storage = StorageService()
+    uploads, processed = dirs / "uploads", dirs / "processed"
+    uploads.mkdir()
+    upload_id = uuid.uuid4()
+    original = uploads / f"{upload_id}.mp4"
+    original.write_bytes(b"video")
+    logo = uploads / "logo.png"
+    logo.write_bytes(b"png")
+
+    video = Video(filename=original.name, original_filename="clip.mp4", file_path=str(original),
+                  file_size=5, duration=1, format="mp4", resolution="1280x720")
+    db_session.add(video)
+    db_session.commit()
+    (processed / str(video.id)).mkdir(parents=True)
+    rendition = processed / str(video.id) / "720p.mp4"
+    rendition.write_bytes(b"720p")
+    db_session.add(VideoQuality(video_id=video.id, quality="720p", file_path=str(rendition),
+                                file_size=4, resolution="1280x720"))
+    db_session.add(Job(video_id=video.id, job_type="overlay", status="completed",
+                       parameters={"overlay_path": str(logo)}, result_path=str(rendition)))
+    db_session.commit()
+
+    migration = StorageMigration(db_session, storage)
+    assert migration.run() == 1
+    db_session.expire_all()
+
+    video = db_session.query(Video).one()
+    assert video.file_path == str(storage.upload_path(upload_id, "x.mp4"))
+    assert open(video.file_path, "rb").read() == b"video"
+    quality = db_session.query(VideoQuality).one()
+    assert quality.file_path == str(storage.video_dir(video.id) / "720p.mp4")
+    job = db_session.query(Job).one()
+    assert job.result_path == quality.file_path
+    assert job.parameters["overlay_path"] == str(storage.upload_path("logo", "logo.png"))
+    assert not (processed / str(video.id)).exists()
+
+    again = StorageMigration(db_session, storage)
+    again.run()
+    assert again.moved == {} and again.missing == []
@@ -0,0 +1,115 @@
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+import pytest
+import app.config.database as database
+from app.config.celery_config import LANES
+from app.config.settings import settings
+from app.models.job import Job
+from app.services.storage_service import StorageService
+import app.services.cost_estimator as cost_estimator
+import app.tasks.routing as routing
+from tests.conftest import TestingSessionLocal, new_video
+
+TASKS = "app.tasks.video_tasks."
+TRIM = f"{TASKS}process_video_trim"
+QUALITY = f"{TASKS}process_video_quality"
+
+
+def video(**fields):
+    return new_video(**{"resolution": "1920x1080", "duration": 60.0, **fields})
+
+
+@pytest.fixture
+def subject(monkeypatch):
+    """Serve ``(job, video)`` for the routed task from memory"""
+    current = {}
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    monkeypatch.setattr(cost_estimator, "_calibration", {"at": 0.0, "rates": {}})
+    monkeypatch.setattr(routing, "load_task_subject", lambda name, args, db=None: (
+        (current.get("job"), current.get("video")) if args else (None, None)))
+    monkeypatch.setattr(routing, "queue_length", lambda queue: 0)
+    return current
+
+
+def queue(name, args, options=None):
+    return (routing.route_task(name, args, {}, options or {}) or {}).get("queue")
+
+
+def test_tasks_are_routed_by_cost(subject, monkeypatch):
+    monkeypatch.setattr(settings, "lane_light_max_cpu_seconds", 600.0)
+    subject["video"] = video()
+    assert queue(f"{TASKS}process_video_upload", ["id"]) == "probe"
+    assert queue(TRIM, ["id"]) == "remux"
+
+    # A minute of 1080p is ~124 megapixel-seconds; 480p H.264 is light, the full HEVC ladder heavy
+    subject["job"] = Job(job_type="quality", parameters={"qualities": ["480p"]})
+    assert queue(QUALITY, ["id"]) == "encode_light"
+    subject["job"] = Job(job_type="quality", parameters={
+        "qualities": ["1080p", "720p", "480p", "360p"], "codecs": ["h264", "hevc"]})
+    assert queue(QUALITY, ["id"]) == "encode_heavy"
+
+    # Explicit queues and other tasks keep the default routing
+    assert routing.route_task(TRIM, ["id"], {}, {"queue": "celery"}) is None
+    assert routing.route_task("celery.chord_unlock", ["id"], {}, {}) is None
+    monkeypatch.setattr(settings, "lane_routing_enabled", False)
+    assert queue(TRIM, ["id"]) is None
+
+
+def test_tasks_follow_their_source(subject, monkeypatch):
+    monkeypatch.setattr(settings, "affinity_routing_enabled", True)
+    subject["video"] = video(storage_node="node-a")
+    assert queue(TRIM, ["id"]) == "node.node-a.remux"
+    monkeypatch.setattr(settings, "lane_routing_enabled", False)
+    assert queue(TRIM, ["id"]) == "node.node-a"
+    # Unknown location keeps the default routing
+    assert queue(TRIM, []) is None
+
+
+def test_overloaded_node_falls_back_to_shared_queue(subject, monkeypatch):
+    monkeypatch.setattr(settings, "affinity_routing_enabled", True)
+    monkeypatch.setattr(routing, "queue_length", lambda queue: settings.node_queue_max_length)
+    subject["video"] = video(storage_node="node-a")
+    assert queue(TRIM, ["id"]) == "remux"
+
+
+def test_task_subject_is_looked_up_through_the_job(db_session, monkeypatch):
+    source = video(storage_node="node-b")
+    db_session.add(source)
+    db_session.commit()
+    job = Job(video_id=source.id, job_type="trim")
+    db_session.add(job)
+    db_session.commit()
+
+    monkeypatch.setattr(database, "SessionLocal", TestingSessionLocal)
+    loaded_job, loaded_video = routing.load_task_subject(TRIM, [str(job.id)])
+    assert loaded_job.job_type == "trim" and loaded_video.storage_node == "node-b"
+    assert routing.load_task_subject(f"{TASKS}process_video_upload", [str(source.id)])[1].storage_node == "node-b"
+
+
+def test_lane_workers_get_their_limits():
+    from start_worker import worker_command
+    cmd = worker_command("encode_heavy")
+    assert cmd[cmd.index("-Q") + 1] == "encode_heavy"
+    assert f"--time-limit={LANES['encode_heavy']['time_limit']}" in cmd
+    assert "-Q" not in worker_command()
+
+
+def test_missing_source_is_transferred_from_its_node(tmp_path, monkeypatch):
+    """The fallback worker pulls the file from the holding node's file server"""
+    remote, local = tmp_path / "node-a", tmp_path / "node-b"
+    monkeypatch.setattr(settings, "upload_dir", str(local / "uploads"))
+    storage = StorageService()
+    path = storage.upload_path("abc", "abc.mp4")
+    remote_copy = remote / storage.key_for(str(path))
+    remote_copy.parent.mkdir(parents=True)
+    remote_copy.write_bytes(b"video")
+
+    server = HTTPServer(("127.0.0.1", 0), partial(SimpleHTTPRequestHandler, directory=str(remote)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        monkeypatch.setattr(settings, "node_urls", {"node-a": f"http://127.0.0.1:{server.server_port}"})
+        assert storage.ensure_local(str(path), node="node-a") == str(path)
+    finally:
+        server.shutdown()
+    assert path.read_bytes() == b"video"
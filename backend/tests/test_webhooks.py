@@ -0,0 +1,242 @@
+import json
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import app.tasks.video_tasks as video_tasks
+from app.config.celery_config import celery_app
+from app.config.settings import settings
+from app.models.job import Job
+from app.models.webhook import WebhookDelivery
+from app.services.ffmpeg_service import FFmpegService, EncodeResult
+from app.services.webhooks import SIGNATURE_HEADER, TIMESTAMP_HEADER, WebhookDispatcher, sign
+from app.tasks import process_video_trim
+from app.tasks.webhooks import deliver_webhooks
+from tests.conftest import TestingSessionLocal, client
+
+METADATA = {"size": 7, "duration": 5.0, "format": "mp4", "resolution": "640x360", "fps": 30.0, "bitrate": 1}
+
+
+class Receiver:
+    """A local HTTP endpoint standing in for a client's callback server"""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = 0  # Requests still to answer with a 500
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                receiver.requests.append({"path": self.path, "headers": dict(self.headers), "body": body})
+                status = 200
+                if receiver.failures:
+                    receiver.failures -= 1
+                    status = 500
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path="/hook"):
+        return f"http://127.0.0.1:{self.server.server_port}{path}"
+
+    def events(self, index=-1):
+        return json.loads(self.requests[index]["body"])["events"]
+
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    receiver.thread.start()
+    yield receiver
+    receiver.server.shutdown()
+    receiver.server.server_close()
+
+
+@pytest.fixture
+def video(make_video, monkeypatch):
+    monkeypatch.setattr(celery_app, "send_task", lambda name, args, kwargs, **options: None)
+    monkeypatch.setattr(settings, "job_events_enabled", False)
+    monkeypatch.setattr(settings, "webhook_allowed_hosts", ["127.0.0.1"])
+    return make_video()
+
+
+def finished_job(db, video, url, status="completed"):
+    job = Job(video_id=video.id, job_type="trim", status=status, parameters={},
+              completed_at=datetime.now(timezone.utc))
+    job.callbacks.append(WebhookDelivery(url=url))
+    db.add(job)
+    db.commit()
+    return job
+
+
+def test_submission_registers_the_callback(db_session, video, receiver):
+    request = {"video_id": str(video.id), "start_time": 0, "end_time": 5, "callback_url": receiver.url()}
+    job_id = client.post("/trim", json=request).json()["id"]
+    # An identical request sharing the running job gets its own callback
+    assert client.post(f"/api/v1/videos/{video.id}/trim", json={**request, "callback_url": receiver.url("/other")}).json()["id"] == job_id
+
+    deliveries = db_session.query(WebhookDelivery).order_by(WebhookDelivery.id).all()
+    assert [(str(d.job_id), d.url, d.status) for d in deliveries] == [
+        (job_id, receiver.url(), "waiting"), (job_id, receiver.url("/other"), "waiting")
+    ]
+    # Nothing is sent before the job finishes
+    assert WebhookDispatcher(db_session).run() == 0
+    assert receiver.requests == []
+
+    response = client.post("/trim", json={**request, "callback_url": "ftp://example.com/hook"})
+    assert response.status_code == 400
+    assert "callback_url" in response.json()["error"]
+
+
+def test_callbacks_are_batched_per_endpoint_and_signed(db_session, video, receiver):
+    completed = finished_job(db_session, video, receiver.url())
+    cancelled = finished_job(db_session, video, receiver.url(), status="cancelled")
+    elsewhere = finished_job(db_session, video, receiver.url("/other"), status="failed")
+
+    assert WebhookDispatcher(db_session).run() == 3
+    assert len(receiver.requests) == 2
+    by_path = {r["path"]: r for r in receiver.requests}
+    events = json.loads(by_path["/hook"]["body"])["events"]
+    assert [(e["job_id"], e["event"]) for e in events] == [
+        (str(completed.id), "job.completed"), (str(cancelled.id), "job.cancelled")
+    ]
+    assert json.loads(by_path["/other"]["body"])["events"][0]["job_id"] == str(elsewhere.id)
+
+    for request in receiver.requests:
+        headers = request["headers"]
+        assert headers[SIGNATURE_HEADER] == f"sha256={sign(request['body'], headers[TIMESTAMP_HEADER])}"
+
+    assert {d.status for d in db_session.query(WebhookDelivery)} == {"delivered"}
+    assert WebhookDispatcher(db_session).run() == 0
+
+
+def test_batches_are_capped(db_session, video, receiver, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_batch_size", 2)
+    for _ in range(5):
+        finished_job(db_session, video, receiver.url())
+
+    assert WebhookDispatcher(db_session).run() == 5
+    assert sorted(len(json.loads(r["body"])["events"]) for r in receiver.requests) == [1, 2, 2]
+
+
+def test_failed_deliveries_back_off_then_give_up(db_session, video, receiver, monkeypatch):
+    monkeypatch.setattr(settings, "webhook_max_attempts", 3)
+    job = finished_job(db_session, video, receiver.url())
+    receiver.failures = 3
+    dispatcher = WebhookDispatcher(db_session)
+
+    before = datetime.now(timezone.utc)
+    assert dispatcher.run() == 1
+    delivery = db_session.query(WebhookDelivery).one()
+    assert (delivery.status, delivery.attempts, delivery.last_error) == ("waiting", 1, "HTTP 500")
+    wait = delivery.next_attempt_at.replace(tzinfo=timezone.utc) - before
+    assert timedelta(seconds=settings.webhook_retry_base_seconds - 1) < wait <= timedelta(seconds=settings.webhook_retry_base_seconds + 1)
+    assert dispatcher.backoff(3) == 4 * dispatcher.backoff(1)
+
+    # Not due yet
+    assert dispatcher.run() == 0
+    assert len(receiver.requests) == 1
+
+    def make_due():
+        delivery.next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+        db_session.commit()
+
+    make_due()
+    assert dispatcher.run() == 1
+    make_due()
+    assert dispatcher.run() == 1
+    assert (delivery.status, delivery.attempts) == ("failed", 3)
+    assert len(receiver.requests) == 3
+    assert {e["delivery_id"] for i in range(3) for e in receiver.events(i)} == {delivery.id}
+
+    # A delivery that recovers before the last attempt is sent
+    other = finished_job(db_session, video, receiver.url())
+    receiver.failures = 1
+    dispatcher.run()
+    other.callbacks[0].next_attempt_at = None
+    db_session.commit()
+    assert dispatcher.run() == 1
+    assert other.callbacks[0].status == "delivered"
+    assert receiver.events()[0]["job_id"] == str(other.id)
+    assert job.callbacks[0].status == "failed"
+
+
+def test_internal_addresses_are_refused(db_session, video, receiver, monkeypatch):
+    request = {"video_id": str(video.id), "start_time": 0, "end_time": 5}
+    for url in ("http://localhost/hook", "http://169.254.169.254/latest", "http://10.0.0.7/hook",
+                "http://[::ffff:192.168.1.1]/hook", "http://0.0.0.0:8000/hook"):
+        response = client.post("/trim", json={**request, "callback_url": url})
+        assert response.status_code == 400, url
+        assert "not a public address" in response.json()["error"]
+
+    # A callback registered while allowed is checked again before it is sent
+    finished_job(db_session, video, receiver.url())
+    monkeypatch.setattr(settings, "webhook_allowed_hosts", [])
+    assert WebhookDispatcher(db_session).run() == 1
+    delivery = db_session.query(WebhookDelivery).one()
+    assert delivery.attempts == 1 and delivery.last_error.startswith("ValueError")
+    assert receiver.requests == []
+
+
+def test_callbacks_are_leased_before_sending(db_session, video, receiver):
+    finished_job(db_session, video, receiver.url())
+    seen = []
+
+    def send(url, body):
+        # Another dispatcher, in its own transaction, finds nothing due while the POST is out
+        other = TestingSessionLocal()
+        try:
+            seen.append(len(WebhookDispatcher(other).due(10)))
+        finally:
+            other.close()
+        return None
+
+    assert WebhookDispatcher(db_session, send=send).run() == 1
+    assert seen == [0]
+    assert db_session.query(WebhookDelivery).one().status == "delivered"
+
+
+def test_unreachable_endpoints_are_retried(db_session, video, receiver):
+    receiver.server.shutdown()
+    receiver.server.server_close()
+    finished_job(db_session, video, receiver.url())
+
+    assert WebhookDispatcher(db_session).run() == 1
+    delivery = db_session.query(WebhookDelivery).one()
+    assert delivery.status == "waiting" and delivery.attempts == 1
+    assert delivery.last_error.startswith("ConnectError")
+
+
+def test_finished_trim_is_called_back(db_session, video, receiver, monkeypatch):
+    def trim_video(self, input_path, output_path, start_time, end_time):
+        with self.storage.staged_outputs(output_path) as (scratch,):
+            with open(scratch, "wb") as f:
+                f.write(b"trimmed")
+        return EncodeResult(path=output_path)
+
+    monkeypatch.setattr(FFmpegService, "trim_video", trim_video)
+    monkeypatch.setattr(video_tasks, "output_metadata", lambda ffmpeg, result: METADATA)
+    request = {"video_id": str(video.id), "start_time": 0, "end_time": 5, "callback_url": receiver.url()}
+    job_id = client.post("/trim", json=request).json()["id"]
+
+    assert deliver_webhooks() == 0
+    assert process_video_trim.run(uuid.UUID(job_id))["status"] == "completed"
+    assert deliver_webhooks() == 1
+
+    (event,) = receiver.events()
+    assert (event["job_id"], event["event"], event["video_id"]) == (job_id, "job.completed", str(video.id))
+    assert event["result_path"].endswith(".mp4") and event["completed_at"]
+
+    # A request answered from the finished job's output is called back at once
+    request["callback_url"] = receiver.url("/cached")
+    assert client.post("/trim", json=request).json()["status"] == "completed"
+    assert deliver_webhooks() == 1
+    assert receiver.requests[-1]["path"] == "/cached"